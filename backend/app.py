@@ -3,24 +3,45 @@ eventlet.monkey_patch()
 
 from flask import Flask, jsonify, request
 from flask_cors import CORS
-from socketio_instance import socketio
+from socketio_instance import socketio, message_queue_options
 import os
+from config import DATABASE_URL, SOCKETIO_MESSAGE_QUEUE, MODEL_WARMUP, STORAGE_SWEEP_INTERVAL
 from routes.items import items_bp
 from routes.auth import auth_bp
-from routes.detection import detection_bp
+from routes.detection import detection_bp, resume_video_jobs, model, storage_manager
+from routes.jobs import jobs_bp
+from routes.metrics import metrics_bp
+from routes.streams import streams_bp
+from routes.detections import detections_bp
+from routes.uploads import uploads_bp
+from routes.storage import storage_bp
 from models import db
+from models.video_job import VideoJob, JobClaim, JobOwner
+from models.detection import Detection, Track
+from models.upload import UploadSession
 
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///users.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URL
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db.init_app(app)
 CORS(app)  # Enable CORS for all routes
-socketio.init_app(app)
+# With a message queue, events emitted by detection workers reach clients connected to any web process
+socketio.init_app(app, **message_queue_options(SOCKETIO_MESSAGE_QUEUE))
 
 # Register blueprints
 app.register_blueprint(items_bp, url_prefix='/api/items')
 app.register_blueprint(auth_bp, url_prefix='/api/auth')
 app.register_blueprint(detection_bp, url_prefix='/api/detect')
+app.register_blueprint(jobs_bp, url_prefix='/api/jobs')
+app.register_blueprint(streams_bp, url_prefix='/api/streams')
+app.register_blueprint(detections_bp, url_prefix='/api/detections')
+app.register_blueprint(uploads_bp, url_prefix='/api/uploads')
+app.register_blueprint(storage_bp, url_prefix='/api/storage')
+app.register_blueprint(metrics_bp)  # GET /metrics for Prometheus
+
+# Create any missing tables (e.g. video_jobs, job_claims, detections) in the existing database
+with app.app_context():
+    db.create_all()
 
 # Sample routes are now handled by blueprints
 
@@ -44,12 +65,53 @@ def index():
                 "GET /api/auth/users/<id>": "Get a specific user"
             },
             "Weapon Detection": {
+                "Authorization": "POST endpoints under /api/detect, /api/uploads and /api/streams need 'Authorization: Bearer <token from /api/auth/login>'; 429 or 503 responses carry Retry-After",
                 "POST /api/detect/image": "Detect weapons in an image",
-                "POST /api/detect/video": "Detect weapons in a video"
+                "GET /api/detect/image/cache": "Image detection cache hit/miss counters",
+                "POST /api/detect/video": "Detect weapons in a video",
+                "GET /api/detect/ready": "Readiness: 200 once the detection model is loaded and warmed up, 503 before"
+            },
+            "Chunked Uploads": {
+                "POST /api/uploads": "Start a resumable video upload (filename, size, session_id)",
+                "PATCH /api/uploads/<id>": "Append a chunk at the Upload-Offset header; processing can start before the last chunk",
+                "GET /api/uploads/<id>": "Get an upload's offset to resume from",
+                "DELETE /api/uploads/<id>": "Abort an upload"
+            },
+            "Video Jobs": {
+                "GET /api/jobs": "List video jobs (optional ?state=)",
+                "GET /api/jobs/<id>": "Get a specific video job",
+                "POST /api/jobs/<id>/cancel": "Cancel a queued or running job",
+                "PATCH /api/jobs/<id>": "Change a job's priority"
+            },
+            "Live Streams": {
+                "GET /api/streams": "List live stream sessions",
+                "POST /api/streams": "Start detection on an RTSP/HTTP URL, a device index or an uploaded file",
+                "GET /api/streams/<id>": "Get a stream's status, latency and frame counters",
+                "POST /api/streams/<id>/stop": "Stop a live stream"
+            },
+            "Detections": {
+                "GET /api/detections": "Query stored detections by job_id, source, class, min/max_confidence, track_id, start/end time (paginated)",
+                "GET /api/detections/tracks": "Query video track summaries with the same filters (paginated)"
+            },
+            "Storage": {
+                "GET /api/storage": "Disk used by uploads and results, limits, upload deduplication savings and the last sweep",
+                "POST /api/storage/sweep": "Delete expired and least recently used uploads/results now (never files in use)"
+            },
+            "Monitoring": {
+                "GET /metrics": "Prometheus metrics: per-stage timings, frame/detection counters, job and memory gauges"
             }
         }
     })
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
-    socketio.run(app, debug=True, host='0.0.0.0', port=port, log_output=False)
+    debug = True
+    # With the reloader, only the serving child process (not the file watcher) resumes jobs and sweeps storage
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        if MODEL_WARMUP:
+            # Load the model (or start the inference workers) in the background instead of on the first request
+            model.start_warmup()
+        resume_video_jobs(app)
+        if STORAGE_SWEEP_INTERVAL > 0:
+            storage_manager.start_sweeper(app, socketio, STORAGE_SWEEP_INTERVAL)
+    socketio.run(app, debug=debug, host='0.0.0.0', port=port, log_output=False)
@@ -0,0 +1,391 @@
+"""
+Offline throughput / latency benchmark for the detection endpoints.
+
+Generates synthetic images and videos, drives the Flask app through its test client
+and a local Socket.IO test client (no frontend, no network), and writes a JSON report
+so runs can be compared across commits and settings.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_detection
+    python -m benchmarks.bench_detection --image-sizes 640x480,1920x1080 --image-requests 50 \
+        --video-sizes 1280x720 --video-seconds 10 --video-fps 15,30
+    python -m benchmarks.bench_detection --compare benchmarks/results/<earlier run>.json
+"""
+import io
+import os
+import sys
+import json
+import time
+import uuid
+import shutil
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+# The benchmark drives the endpoints anonymously, so it measures detection rather than admission control
+os.environ.setdefault('DETECTION_AUTH_REQUIRED', 'false')
+
+# Importing the app monkey-patches eventlet and loads the model, exactly as in production
+import app as app_module  # noqa: E402
+import cv2  # noqa: E402
+import numpy as np  # noqa: E402
+import config  # noqa: E402
+from socketio_instance import socketio  # noqa: E402
+from models import db  # noqa: E402
+from models.video_job import VideoJob  # noqa: E402
+from routes import detection  # noqa: E402
+
+DEFAULT_OUTPUT_DIR = os.path.join(BACKEND_DIR, 'benchmarks', 'results')
+
+
+def parse_sizes(value):
+    """Parse '640x480,1280x720' into [(640, 480), (1280, 720)]."""
+    sizes = []
+    for item in value.split(','):
+        if item.strip():
+            width, height = item.lower().split('x')
+            sizes.append((int(width), int(height)))
+    return sizes
+
+
+def parse_numbers(value, cast=float):
+    return [cast(item) for item in value.split(',') if item.strip()]
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers (None for an empty list)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def latency_summary(seconds):
+    """p50/p95/p99/mean/max of a list of latencies, in milliseconds."""
+    millis = [s * 1000 for s in seconds]
+    return {
+        'count': len(millis),
+        'p50_ms': round(percentile(millis, 50), 2) if millis else None,
+        'p95_ms': round(percentile(millis, 95), 2) if millis else None,
+        'p99_ms': round(percentile(millis, 99), 2) if millis else None,
+        'mean_ms': round(sum(millis) / len(millis), 2) if millis else None,
+        'max_ms': round(max(millis), 2) if millis else None
+    }
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def synthetic_frame(width, height, index=0, seed=0, scene='moving'):
+    """
+    A textured frame with a few shapes, so the model and the encoders do real work.
+
+    'moving' shifts every shape on every frame; 'static' is a fixed CCTV-like scene in which
+    one shape only moves during the middle fifth of the video (index as a fraction of 1000).
+    """
+    rng = np.random.default_rng(seed)
+    frame = rng.integers(0, 60, (height, width, 3), dtype=np.uint8)
+    frame[:, :, 1] = np.linspace(40, 200, width, dtype=np.uint8)[None, :]
+    for shape in range(4):
+        step = index
+        if scene == 'static':
+            step = max(0, min(index, 600) - 400) if shape == 0 else 0
+        x = int((width * (shape + 1) / 5 + step * (shape + 2) * 3) % width)
+        y = int((height * (shape + 1) / 5 + step * 2) % height)
+        size = max(8, min(width, height) // (6 + shape))
+        color = tuple(int(c) for c in rng.integers(80, 255, 3))
+        if shape % 2:
+            cv2.circle(frame, (x, y), size // 2, color, -1)
+        else:
+            cv2.rectangle(frame, (x, y), (x + size, y + size // 2), color, -1)
+    return frame
+
+
+def synthetic_image(width, height, seed):
+    ok, buffer = cv2.imencode('.jpg', synthetic_frame(width, height, seed=seed), [cv2.IMWRITE_JPEG_QUALITY, 90])
+    if not ok:
+        raise RuntimeError('Could not encode synthetic image')
+    return buffer.tobytes()
+
+
+def synthetic_video(path, width, height, frames, fps, scene='moving'):
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    if not writer.isOpened():
+        raise RuntimeError(f'Could not open a video writer for {path}')
+    for index in range(frames):
+        position = index if scene == 'moving' else int(index * 1000 / frames)
+        writer.write(synthetic_frame(width, height, index=position, seed=1, scene=scene))
+    writer.release()
+
+
+def bench_images(client, sizes, requests_per_size, warmup, use_cache):
+    """POST synthetic images to /api/detect/image and time each request."""
+    scenarios = []
+    for width, height in sizes:
+        # Distinct images per request so the content-hash cache only hits when asked to
+        images = [synthetic_image(width, height, seed) for seed in range(requests_per_size + warmup)]
+        latencies = []
+        errors = 0
+        started = time.perf_counter()
+        for index, image_bytes in enumerate(images):
+            if use_cache:
+                image_bytes = images[0]
+            request_started = time.perf_counter()
+            response = client.post('/api/detect/image', data={
+                'image': (io.BytesIO(image_bytes), f'bench_{width}x{height}.jpg'),
+                'persist_upload': 'false',
+                'persist_result': 'false',
+                'use_cache': 'true' if use_cache else 'false'
+            }, content_type='multipart/form-data')
+            elapsed = time.perf_counter() - request_started
+            if response.status_code != 200:
+                errors += 1
+                continue
+            if index >= warmup:
+                latencies.append(elapsed)
+        total = time.perf_counter() - started
+        scenario = {
+            'resolution': f'{width}x{height}',
+            'requests': requests_per_size,
+            'warmup': warmup,
+            'errors': errors,
+            'latency': latency_summary(latencies),
+            'requests_per_s': round(len(images) / total, 2) if total else None,
+            'peak_rss_mb': peak_rss_mb()
+        }
+        print(f"image {scenario['resolution']}: p50 {scenario['latency']['p50_ms']} ms, "
+              f"p95 {scenario['latency']['p95_ms']} ms, p99 {scenario['latency']['p99_ms']} ms")
+        scenarios.append(scenario)
+    return scenarios
+
+
+def bench_videos(app, client, sizes, seconds_list, fps_list, scenes, timeout, workdir):
+    """Upload synthetic videos to /api/detect/video and follow the job over Socket.IO."""
+    scenarios = []
+    for width, height in sizes:
+        for seconds in seconds_list:
+            for fps in fps_list:
+                for scene in scenes:
+                    path = os.path.join(workdir, f'bench_{width}x{height}_{seconds:g}s_{fps:g}fps_{scene}.mp4')
+                    source_frames = int(seconds * fps)
+                    synthetic_video(path, width, height, source_frames, fps, scene)
+                    scenario = run_video_scenario(app, client, path, source_frames, timeout)
+                    scenario.update({
+                        'resolution': f'{width}x{height}',
+                        'seconds': seconds,
+                        'fps': fps,
+                        'scene': scene,
+                        'source_frames': source_frames,
+                        'peak_rss_mb': peak_rss_mb()
+                    })
+                    gate = (scenario['server'] or {}).get('motionGate') or {}
+                    print(f"video {scenario['resolution']} {seconds:g}s@{fps:g}fps {scene}: "
+                          f"{scenario['frames_per_s']} frames/s, first frame {scenario['time_to_first_frame_ms']} ms, "
+                          f"gated {gate.get('gatedFraction')}, {scenario['status']}")
+                    scenarios.append(scenario)
+    return scenarios
+
+
+def run_video_scenario(app, client, path, source_frames, timeout):
+    session_id = f'bench-{uuid.uuid4()}'
+    sio = socketio.test_client(app)
+    sio.emit('join', {'room': session_id})
+    # No preview frames: the test client never acks them and they are not what is measured here
+    sio.emit('preview_settings', {'room': session_id, 'fps': 0})
+    sio.get_received()
+
+    with open(path, 'rb') as video_file:
+        started = time.perf_counter()
+        response = client.post('/api/detect/video', data={
+            'video': (video_file, os.path.basename(path)),
+            'session_id': session_id
+        }, content_type='multipart/form-data')
+    upload_s = time.perf_counter() - started
+    if response.status_code != 200:
+        sio.disconnect()
+        return {'status': f'upload failed ({response.status_code})', 'frames_per_s': None,
+                'time_to_first_frame_ms': None}
+    job_id = response.get_json()['job_id']
+
+    first_frame = None
+    frame_events = 0
+    complete = None
+    status = 'timeout'
+    deadline = started + timeout
+    while time.perf_counter() < deadline:
+        for event in sio.get_received():
+            if event['name'] == 'frame_detection':
+                frame_events += 1
+                if first_frame is None:
+                    first_frame = time.perf_counter() - started
+            elif event['name'] == 'video_processing_complete':
+                complete = event['args'][0]
+                status = 'completed'
+            elif event['name'] in ('video_processing_error', 'video_processing_cancelled'):
+                status = event['name'][len('video_processing_'):]
+        if status != 'timeout':
+            break
+        socketio.sleep(0.05)
+    elapsed = time.perf_counter() - started
+
+    if status == 'timeout':
+        detection.video_scheduler.cancel(job_id)
+    # Wait for the job to leave the scheduler before removing its files
+    while detection.video_scheduler.position(job_id) is not None and time.perf_counter() < deadline + 30:
+        socketio.sleep(0.05)
+    sio.disconnect()
+    cleanup_video_job(app, job_id)
+
+    return {
+        'status': status,
+        'upload_ms': round(upload_s * 1000, 1),
+        'wall_s': round(elapsed, 3),
+        # Source frames covered per second of wall-clock time, from upload to completion
+        'frames_per_s': round(source_frames / elapsed, 2) if status == 'completed' and elapsed else None,
+        'frame_events': frame_events,
+        'frame_events_per_s': round(frame_events / elapsed, 2) if elapsed else None,
+        'time_to_first_frame_ms': round(first_frame * 1000, 1) if first_frame is not None else None,
+        'server': {key: complete.get(key) for key in (
+            'uniqueTracks', 'processingFps', 'inferenceFps', 'batchSize', 'stageTimings', 'adaptiveSkip',
+            'tiling', 'motionGate'
+        )} if complete else None
+    }
+
+
+def cleanup_video_job(app, job_id):
+    """Remove the benchmark job's upload, results and database row."""
+    with app.app_context():
+        job = db.session.get(VideoJob, job_id)
+        if job is None:
+            return
+        try:
+            os.remove(job.file_path)
+        except OSError:
+            pass
+        shutil.rmtree(job.result_dir, ignore_errors=True)
+        db.session.delete(job)
+        db.session.commit()
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=BACKEND_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def run_metadata():
+    """Commit and settings a run was made with, so reports can be compared meaningfully."""
+    return {
+        'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'settings': {
+            'model_weights': config.MODEL_WEIGHTS,
+            'inference_backend': config.INFERENCE_BACKEND,
+            'inference_precision': config.INFERENCE_PRECISION,
+            'image_inference_args': config.IMAGE_INFERENCE_ARGS,
+            'video_inference_batch_size': config.VIDEO_INFERENCE_BATCH_SIZE,
+            'video_pipeline_queue_size': config.VIDEO_PIPELINE_QUEUE_SIZE,
+            'video_target_speed': config.VIDEO_TARGET_SPEED,
+            'video_frame_skip': [config.VIDEO_MIN_FRAME_SKIP, config.VIDEO_MAX_FRAME_SKIP],
+            'video_inference_sizes': config.VIDEO_INFERENCE_SIZES,
+            'max_concurrent_video_jobs': config.MAX_CONCURRENT_VIDEO_JOBS,
+            'tiled_inference': config.TILED_INFERENCE,
+            'motion_gate': config.MOTION_GATE_ENABLED
+        }
+    }
+
+
+def compare(current, baseline):
+    """Print per-scenario changes of the headline numbers against an earlier report."""
+    print(f"\nCompared with {baseline['meta'].get('git_commit')} ({baseline['meta'].get('created_at')}):")
+    base_images = {s['resolution']: s for s in baseline.get('images', [])}
+    for scenario in current.get('images', []):
+        base = base_images.get(scenario['resolution'])
+        if base:
+            for key in ('p50_ms', 'p95_ms', 'p99_ms'):
+                _print_delta(f"image {scenario['resolution']} {key}", base['latency'][key], scenario['latency'][key])
+    base_videos = {(s['resolution'], s['seconds'], s['fps'], s.get('scene', 'moving')): s
+                   for s in baseline.get('videos', [])}
+    for scenario in current.get('videos', []):
+        base = base_videos.get((scenario['resolution'], scenario['seconds'], scenario['fps'], scenario['scene']))
+        if base:
+            name = f"video {scenario['resolution']} {scenario['seconds']:g}s@{scenario['fps']:g}fps {scenario['scene']}"
+            _print_delta(f"{name} frames/s", base['frames_per_s'], scenario['frames_per_s'])
+            _print_delta(f"{name} first frame ms", base['time_to_first_frame_ms'], scenario['time_to_first_frame_ms'])
+    _print_delta('peak RSS MB', baseline.get('peak_rss_mb'), current.get('peak_rss_mb'))
+
+
+def _print_delta(label, before, after):
+    if before is None or after is None:
+        return
+    change = f"{(after - before) / before * 100:+.1f}%" if before else 'n/a'
+    print(f"  {label}: {before} -> {after} ({change})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the image and video detection endpoints offline.')
+    parser.add_argument('--image-sizes', default='640x480,1280x720,1920x1080', help='Comma-separated WxH list')
+    parser.add_argument('--image-requests', type=int, default=20, help='Timed requests per image size')
+    parser.add_argument('--image-warmup', type=int, default=2, help='Untimed requests per image size')
+    parser.add_argument('--image-cache', action='store_true', help='Repeat the same image with the result cache on')
+    parser.add_argument('--video-sizes', default='640x360,1280x720', help='Comma-separated WxH list')
+    parser.add_argument('--video-seconds', default='5', help='Comma-separated video lengths in seconds')
+    parser.add_argument('--video-fps', default='25', help='Comma-separated source frame rates')
+    parser.add_argument('--video-scenes', default='moving,static',
+                        help="Comma-separated scenes: 'moving' (everything moves) and/or 'static' (CCTV-like)")
+    parser.add_argument('--video-timeout', type=float, default=600, help='Seconds to wait for each video job')
+    parser.add_argument('--skip-images', action='store_true')
+    parser.add_argument('--skip-videos', action='store_true')
+    parser.add_argument('--output', help='Report path (default: benchmarks/results/<timestamp>.json)')
+    parser.add_argument('--compare', help='Earlier report to compare this run against')
+    args = parser.parse_args(argv)
+
+    app = app_module.app
+    client = app.test_client()
+    report = {'meta': run_metadata(), 'images': [], 'videos': []}
+
+    if not args.skip_images:
+        report['images'] = bench_images(client, parse_sizes(args.image_sizes), args.image_requests,
+                                        args.image_warmup, args.image_cache)
+    if not args.skip_videos:
+        workdir = tempfile.mkdtemp(prefix='bench_videos_')
+        try:
+            report['videos'] = bench_videos(app, client, parse_sizes(args.video_sizes),
+                                            parse_numbers(args.video_seconds), parse_numbers(args.video_fps),
+                                            [scene.strip() for scene in args.video_scenes.split(',') if scene.strip()],
+                                            args.video_timeout, workdir)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+    report['peak_rss_mb'] = peak_rss_mb()
+
+    output = args.output or os.path.join(
+        DEFAULT_OUTPUT_DIR, f"{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nPeak RSS {report['peak_rss_mb']} MB. Report written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
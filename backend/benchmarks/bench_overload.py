@@ -0,0 +1,105 @@
+"""
+Overload benchmark for POST /api/detect/image: latency of admitted requests with and without load shedding.
+
+Runs `--clients` concurrent clients (green threads driving the Flask test client), each sending image
+requests back to back for `--seconds`, twice: once with shedding off and once with the configured
+SHED_* thresholds. Reports, per run, how many requests were served and shed and the latency
+percentiles of the served ones. Requests are anonymous (DETECTION_AUTH_REQUIRED=false), so
+per-user rate limits do not interfere.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_overload
+    python -m benchmarks.bench_overload --clients 16 --seconds 20 --max-inflight 4 --latency-ms 1500
+"""
+import io
+import os
+import sys
+import time
+import argparse
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def run(client, socketio, images, clients, seconds):
+    """Send requests from `clients` green threads for `seconds`; returns (served latencies, status counts)."""
+    latencies = []
+    statuses = {}
+    finished = []
+    deadline = time.perf_counter() + seconds
+
+    def client_loop(index):
+        sent = 0
+        while time.perf_counter() < deadline:
+            image_bytes = images[(index + sent * clients) % len(images)]
+            sent += 1
+            started = time.perf_counter()
+            response = client.post('/api/detect/image', data={
+                'image': (io.BytesIO(image_bytes), 'overload.jpg'),
+                'persist_upload': 'false',
+                'persist_result': 'false',
+                'use_cache': 'false'
+            }, content_type='multipart/form-data')
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            if response.status_code == 200:
+                latencies.append(time.perf_counter() - started)
+            else:
+                # A refused client waits as asked (capped, so the run still ends on time)
+                socketio.sleep(min(float(response.headers.get('Retry-After', 1)), 1.0))
+        finished.append(index)
+
+    for index in range(clients):
+        socketio.start_background_task(client_loop, index)
+    while len(finished) < clients:
+        socketio.sleep(0.1)
+    return latencies, statuses
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure image latency under overload, with and without load shedding.')
+    parser.add_argument('--clients', type=int, default=12, help='Concurrent clients')
+    parser.add_argument('--seconds', type=float, default=15, help='Duration of each run')
+    parser.add_argument('--image-size', default='640x480', help='WxH of the synthetic images')
+    parser.add_argument('--max-inflight', type=int, help='Override SHED_MAX_INFLIGHT_IMAGES')
+    parser.add_argument('--latency-ms', type=float, help='Override SHED_IMAGE_LATENCY_MS')
+    parser.add_argument('--inference-workers', type=int, default=1, help='INFERENCE_WORKERS (inference off the hub)')
+    args = parser.parse_args(argv)
+
+    os.environ.update(DETECTION_AUTH_REQUIRED='false', INFERENCE_WORKERS=str(args.inference_workers))
+    if args.max_inflight is not None:
+        os.environ['SHED_MAX_INFLIGHT_IMAGES'] = str(args.max_inflight)
+    if args.latency_ms is not None:
+        os.environ['SHED_IMAGE_LATENCY_MS'] = str(args.latency_ms)
+
+    # Imported only now, so config picks up the environment above
+    import app as app_module
+    from socketio_instance import socketio
+    from routes import detection
+    from benchmarks.bench_detection import synthetic_image, latency_summary
+
+    width, height = (int(value) for value in args.image_size.lower().split('x'))
+    images = [synthetic_image(width, height, seed) for seed in range(32)]
+    client = app_module.app.test_client()
+    detection.model.warm_up()
+
+    shedding = (detection.image_load.max_inflight, detection.image_load.max_latency)
+    try:
+        for name, (max_inflight, max_latency) in (('no_shedding', (0, 0)), ('shedding', shedding)):
+            detection.image_load.max_inflight, detection.image_load.max_latency = max_inflight, max_latency
+            latencies, statuses = run(client, socketio, images, args.clients, args.seconds)
+            summary = latency_summary(latencies)
+            print(f"{name} (max in flight {max_inflight or '-'}, max p90 {max_latency * 1000 if max_latency else '-'} ms): "
+                  f"served {len(latencies)} ({len(latencies) / args.seconds:.1f}/s), responses {statuses}, "
+                  f"p50 {summary['p50_ms']} ms, p95 {summary['p95_ms']} ms, p99 {summary['p99_ms']} ms, "
+                  f"max {summary['max_ms']} ms")
+            # Let the previous run's latency window expire before the next one
+            socketio.sleep(detection.image_load.window)
+    finally:
+        if detection.inference_workers is not None:
+            detection.inference_workers.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,115 @@
+"""
+Cold-start benchmark: how long a fresh process takes to serve its first requests.
+
+Each run starts a new interpreter that imports the app and drives it through the Flask test
+client, timing:
+
+  - import_s: importing app.py (blueprints, config, and whatever they load eagerly)
+  - first_light_request_ms: GET /api/items right after the import
+  - first_detect_ms / second_detect_ms: the first two POST /api/detect/image requests
+  - ready_s (warm-up mode): from the import until GET /api/detect/ready returns 200
+
+'cold' sends the first detection without any warm-up; 'warmup' starts the background warm-up
+right after the import (as `python app.py` does) and waits for readiness first. Pass
+--backend-dir to measure another checkout of the backend, e.g. an older commit, the same way.
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --runs 3 --inference-workers 0 --backend-dir /path/to/old/backend
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child interpreter, with the backend directory as working directory
+DRIVER = r'''
+import sys, time, json
+started = time.perf_counter()
+import app as app_module
+import_s = time.perf_counter() - started
+import io
+import cv2
+import numpy as np
+
+mode = sys.argv[1]
+client = app_module.app.test_client()
+report = {'import_s': round(import_s, 3)}
+
+t = time.perf_counter()
+client.get('/api/items/')
+report['first_light_request_ms'] = round((time.perf_counter() - t) * 1000, 1)
+
+if mode == 'warmup':
+    from routes import detection
+    if not hasattr(detection.model, 'start_warmup'):
+        print(json.dumps({'error': 'this backend has no background warm-up'}))
+        sys.exit(0)
+    detection.model.start_warmup()
+    while client.get('/api/detect/ready').status_code != 200:
+        if detection.model.state == 'failed':
+            print(json.dumps({'error': detection.model.error}))
+            sys.exit(0)
+        app_module.socketio.sleep(0.05)
+    report['ready_s'] = round(time.perf_counter() - started, 3)
+
+for name in ('first_detect_ms', 'second_detect_ms'):
+    # A new image each time, so the result cache never answers
+    image = np.random.default_rng().integers(0, 255, (480, 640, 3), dtype=np.uint8)
+    jpeg = cv2.imencode('.jpg', image)[1].tobytes()
+    t = time.perf_counter()
+    response = client.post('/api/detect/image', data={'image': (io.BytesIO(jpeg), 'bench.jpg'), 'persist_upload': 'false',
+                           'persist_result': 'false'}, content_type='multipart/form-data')
+    report[name] = round((time.perf_counter() - t) * 1000, 1)
+    if response.status_code != 200:
+        report['error'] = f'detect returned {response.status_code}'
+report['total_s'] = round(time.perf_counter() - started, 3)
+print(json.dumps(report))
+'''
+
+
+def run_once(backend_dir, mode, env):
+    completed = subprocess.run([sys.executable, '-c', DRIVER, mode], cwd=backend_dir, env=env,
+                               capture_output=True, text=True)
+    for line in reversed(completed.stdout.splitlines()):
+        if line.startswith('{'):
+            return json.loads(line)
+    return {'error': (completed.stderr or completed.stdout).strip().splitlines()[-1:]}
+
+
+def summarize(runs):
+    """Median of each timing over the runs that did not fail."""
+    ok = [run for run in runs if 'error' not in run]
+    if not ok:
+        return {'error': runs[0].get('error') if runs else 'no runs'}
+    return {key: round(statistics.median(run[key] for run in ok), 3) for key in ok[0]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure cold-start and first-request latency of the backend.')
+    parser.add_argument('--backend-dir', default=BACKEND_DIR, help='Backend checkout to measure')
+    parser.add_argument('--runs', type=int, default=3, help='Fresh processes per mode (the median is reported)')
+    parser.add_argument('--modes', default='cold,warmup', help="Comma-separated: 'cold' and/or 'warmup'")
+    parser.add_argument('--inference-workers', type=int, help='Override INFERENCE_WORKERS')
+    parser.add_argument('--output', help='Also write the report to this JSON file')
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ, IMAGE_CACHE_ENABLED='false', DETECTION_STORE_ENABLED='false', DETECTION_AUTH_REQUIRED='false')
+    if args.inference_workers is not None:
+        env['INFERENCE_WORKERS'] = str(args.inference_workers)
+    report = {'backend_dir': os.path.abspath(args.backend_dir), 'inference_workers': env.get('INFERENCE_WORKERS')}
+    for mode in [mode.strip() for mode in args.modes.split(',') if mode.strip()]:
+        runs = [run_once(args.backend_dir, mode, env) for _ in range(args.runs)]
+        report[mode] = summarize(runs)
+        print(f"{mode}: {json.dumps(report[mode])}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,163 @@
+"""
+Two detection workers draining one job queue, on a single machine.
+
+Points the app at a throwaway SQLite database (the job broker), a SQLite Socket.IO message
+queue and a temporary storage root, serves the app from this process, queues a few synthetic
+videos through POST /api/detect/video with JOB_BROKER=database, starts two `worker.py` processes
+and checks, from a Socket.IO client connected to this (web) process, that:
+
+  - every job completed exactly once (one video_processing_complete per job, none failed),
+  - both workers took jobs, and no job was claimed by two of them,
+  - the workers' events reached the client's room through the message queue.
+
+Run from the backend directory:
+
+    python -m benchmarks.check_worker_drain
+    python -m benchmarks.check_worker_drain --jobs 6 --video-seconds 4 --inference-workers 1
+"""
+import os
+import sys
+import time
+import uuid
+import shutil
+import argparse
+import tempfile
+import subprocess
+from collections import Counter
+import socketio as socketio_client
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def configure(workdir, inference_workers):
+    """Environment shared by this process and the workers; must be set before the app is imported."""
+    env = {
+        'JOB_BROKER': 'database',
+        'STORAGE_ROOT': os.path.join(workdir, 'storage'),
+        'DATABASE_URL': f"sqlite:///{os.path.join(workdir, 'jobs.db')}",
+        'SOCKETIO_MESSAGE_QUEUE': f"sqlite:///{os.path.join(workdir, 'socketio.db')}",
+        'INFERENCE_WORKERS': str(inference_workers),
+        'WORKER_POLL_INTERVAL': '0.2',
+        'WORKER_HEARTBEAT_INTERVAL': '1',
+        'DETECTION_AUTH_REQUIRED': 'false'
+    }
+    os.environ.update(env)
+    return env
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check that two detection workers drain one job queue.')
+    parser.add_argument('--jobs', type=int, default=4, help='Videos to queue')
+    parser.add_argument('--video-seconds', type=float, default=2, help='Length of each synthetic video')
+    parser.add_argument('--video-size', default='320x240', help='WxH of the synthetic videos')
+    parser.add_argument('--inference-workers', type=int, default=0,
+                        help='INFERENCE_WORKERS of each detection worker (0 loads the model in the worker itself)')
+    parser.add_argument('--timeout', type=float, default=600, help='Seconds to wait for the queue to drain')
+    parser.add_argument('--port', type=int, default=5099, help='Port the web process listens on')
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='worker_drain_')
+    env = configure(workdir, args.inference_workers)
+
+    # Imported only now, so config picks up the environment above
+    import app as app_module
+    from socketio_instance import socketio
+    from models import db
+    from models.video_job import VideoJob
+    from benchmarks.bench_detection import synthetic_video
+
+    app = app_module.app
+    client = app.test_client()
+    # Flask-SocketIO's test client refuses message queues, so serve the app and connect a real client
+    socketio.start_background_task(socketio.run, app, host='127.0.0.1', port=args.port, log_output=False)
+    socketio.sleep(1)
+    events = []
+    sio = socketio_client.Client()
+    sio.on('*', lambda name, *event_args: events.append({'name': name, 'args': list(event_args)}))
+    sio.connect(f'http://127.0.0.1:{args.port}', transports=['polling'])
+    session_id = f'drain-{uuid.uuid4()}'
+    sio.emit('join', {'room': session_id})
+    socketio.sleep(0.5)
+
+    width, height = (int(value) for value in args.video_size.lower().split('x'))
+    job_ids = []
+    for index in range(args.jobs):
+        path = os.path.join(workdir, f'drain_{index}.mp4')
+        synthetic_video(path, width, height, int(args.video_seconds * 25), 25)
+        with open(path, 'rb') as video_file:
+            response = client.post('/api/detect/video', data={
+                'video': (video_file, os.path.basename(path)),
+                'session_id': session_id
+            }, content_type='multipart/form-data')
+        if response.status_code != 200:
+            print(f"Upload {index} failed: {response.status_code} {response.get_json()}")
+            return 1
+        job_ids.append(response.get_json()['job_id'])
+    print(f"Queued {len(job_ids)} jobs; starting 2 workers")
+
+    workers = [
+        subprocess.Popen(
+            [sys.executable, 'worker.py', '--worker-id', f'worker-{index}', '--exit-when-idle', '3'],
+            cwd=BACKEND_DIR, env=dict(os.environ, **env)
+        )
+        for index in range(2)
+    ]
+    started = time.perf_counter()
+    try:
+        while any(worker.poll() is None for worker in workers):
+            if time.perf_counter() - started > args.timeout:
+                print(f"Timed out after {args.timeout:.0f}s")
+                return 1
+            socketio.sleep(0.1)
+        # Let the listener deliver the last messages the workers published
+        socketio.sleep(2)
+    finally:
+        for worker in workers:
+            if worker.poll() is None:
+                worker.kill()
+        sio.disconnect()
+    elapsed = time.perf_counter() - started
+
+    by_name = Counter(event['name'] for event in events)
+    complete = Counter(event['args'][0]['filename'] for event in events if event['name'] == 'video_processing_complete')
+    claims = Counter(event['args'][0]['job_id'] for event in events
+                     if event['name'] == 'video_queue_position' and event['args'][0].get('worker_id'))
+    claimed_by = {}
+    for event in events:
+        if event['name'] == 'video_queue_position' and event['args'][0].get('worker_id'):
+            claimed_by[event['args'][0]['job_id']] = event['args'][0]['worker_id']
+    with app.app_context():
+        jobs = [db.session.get(VideoJob, job_id) for job_id in job_ids]
+        states = Counter(job.state for job in jobs)
+        filenames = [job.filename for job in jobs]
+
+    print(f"Drained in {elapsed:.1f}s; job states {dict(states)}")
+    print(f"Events received through the message queue: {dict(by_name)}")
+    print(f"Jobs per worker: {dict(Counter(claimed_by.values()))}")
+    failures = []
+    if states.get('completed', 0) != len(job_ids):
+        failures.append(f"not every job completed: {dict(states)}")
+    if any(complete[filename] != 1 for filename in filenames):
+        failures.append(f"completion events per job are not all 1: {dict(complete)}")
+    if any(count != 1 for count in claims.values()) or len(claims) != len(job_ids):
+        failures.append(f"claims per job are not all 1: {dict(claims)}")
+    if len(set(claimed_by.values())) != 2:
+        failures.append("the jobs were not shared by both workers")
+    if by_name.get('video_processing_started') != len(job_ids):
+        failures.append("the web process's own events did not all reach the client")
+    if not by_name.get('frame_detection'):
+        failures.append("no frame_detection events reached the client")
+    if any(worker.returncode != 0 for worker in workers):
+        failures.append(f"worker exit codes {[worker.returncode for worker in workers]}")
+
+    shutil.rmtree(workdir, ignore_errors=True)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if not failures:
+        print("OK")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
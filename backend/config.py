@@ -4,9 +4,11 @@ from dotenv import load_dotenv
 # Load environment variables from .env file if it exists
 load_dotenv()
 
-# Define paths for uploads and results
-UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
-RESULT_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+# Define paths for uploads and results. With detection workers on other nodes, STORAGE_ROOT must be
+# shared storage mounted at the same path everywhere, since jobs record absolute file paths
+STORAGE_ROOT = os.environ.get('STORAGE_ROOT', os.path.dirname(os.path.abspath(__file__)))
+UPLOAD_FOLDER = os.path.join(STORAGE_ROOT, 'uploads')
+RESULT_FOLDER = os.path.join(STORAGE_ROOT, 'results')
 IMAGE_UPLOAD_FOLDER = os.path.join(UPLOAD_FOLDER, 'images')
 VIDEO_UPLOAD_FOLDER = os.path.join(UPLOAD_FOLDER, 'videos')
 IMAGE_RESULT_FOLDER = os.path.join(RESULT_FOLDER, 'images')
@@ -16,10 +18,209 @@ VIDEO_RESULT_FOLDER = os.path.join(RESULT_FOLDER, 'videos')
 for directory in [IMAGE_UPLOAD_FOLDER, VIDEO_UPLOAD_FOLDER, IMAGE_RESULT_FOLDER, VIDEO_RESULT_FOLDER]:
     os.makedirs(directory, exist_ok=True)
 
+# Storage limits, applied by a sweep every STORAGE_SWEEP_INTERVAL seconds (0 = never) in the web process:
+# entries of uploads/ and results/ unused for longer than the max age are deleted, then the least recently
+# used ones until each fits its max size (0 = no limit). Files of active jobs, uploads and streams and
+# files being downloaded are never deleted. results/cache has its own limit (IMAGE_CACHE_DISK_MAX_MB)
+STORAGE_UPLOADS_MAX_BYTES = int(os.environ.get('STORAGE_UPLOADS_MAX_MB', 10240)) * 1024 * 1024
+STORAGE_UPLOADS_MAX_AGE = float(os.environ.get('STORAGE_UPLOADS_MAX_AGE_HOURS', 168)) * 3600
+STORAGE_RESULTS_MAX_BYTES = int(os.environ.get('STORAGE_RESULTS_MAX_MB', 10240)) * 1024 * 1024
+STORAGE_RESULTS_MAX_AGE = float(os.environ.get('STORAGE_RESULTS_MAX_AGE_HOURS', 720)) * 3600
+STORAGE_SWEEP_INTERVAL = float(os.environ.get('STORAGE_SWEEP_INTERVAL', 300))
+# Store identical uploads once (hard links to a content-addressed blob under uploads/blobs)
+STORAGE_DEDUPE_UPLOADS = os.environ.get('STORAGE_DEDUPE_UPLOADS', 'true').lower() in ('1', 'true', 'yes')
+
 # Allowed file extensions
 ALLOWED_IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 ALLOWED_VIDEO_EXTENSIONS = {'mp4', 'avi', 'mov', 'mkv'}
 
+# Whether POST /api/detect/image writes the upload / annotated result to disk by default
+# (clients can override per request with the persist_upload / persist_result form fields)
+PERSIST_IMAGE_UPLOADS = os.environ.get('PERSIST_IMAGE_UPLOADS', 'true').lower() in ('1', 'true', 'yes')
+PERSIST_IMAGE_RESULTS = os.environ.get('PERSIST_IMAGE_RESULTS', 'true').lower() in ('1', 'true', 'yes')
+
+# YOLO weights used for detection
+MODEL_WEIGHTS = os.environ.get('MODEL_WEIGHTS', 'july29_5th_train.pt')
+
+# Inference backend: 'torch' (the .pt weights), 'onnx' or 'openvino' (exported from the same weights),
+# at 'fp32' or 'int8' precision. Exports are cached under EXPORT_FOLDER.
+INFERENCE_BACKEND = os.environ.get('INFERENCE_BACKEND', 'torch').lower()
+INFERENCE_PRECISION = os.environ.get('INFERENCE_PRECISION', 'fp32').lower()
+EXPORT_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'exports')
+# Dataset yaml used to calibrate OpenVINO INT8 exports
+INT8_CALIBRATION_DATA = os.environ.get('INT8_CALIBRATION_DATA')
+
+# Number of worker processes that load the model and run inference for video jobs, streams and image
+# requests, so the eventlet hub never runs a forward pass; 0 runs the models inside the web process
+INFERENCE_WORKERS = int(os.environ.get('INFERENCE_WORKERS', 2))
+
+# Load the model and run a dummy forward pass in the background when the server starts, so the first request
+# does not wait for them; when off, the model loads on the first detection request. GET /api/detect/ready
+# reports when it is done
+MODEL_WARMUP = os.environ.get('MODEL_WARMUP', 'true').lower() in ('1', 'true', 'yes')
+
+# Inference parameters for POST /api/detect/image (ultralytics defaults); part of the cache key
+IMAGE_INFERENCE_ARGS = {'conf': 0.25, 'iou': 0.7, 'imgsz': 640}
+
+# Tiled (sliced) inference for small objects in high-resolution frames. Off by default; image
+# requests and video uploads can turn it on per request with the "tiled" form field.
+TILED_INFERENCE = os.environ.get('TILED_INFERENCE', 'false').lower() in ('1', 'true', 'yes')
+TILE_SIZE = int(os.environ.get('TILE_SIZE', 640))
+TILE_OVERLAP = float(os.environ.get('TILE_OVERLAP', 0.2))
+# Also run one downscaled full-frame pass so objects larger than a tile are still found
+TILE_FULL_FRAME = os.environ.get('TILE_FULL_FRAME', 'true').lower() in ('1', 'true', 'yes')
+# Tiles whose grayscale standard deviation is below this are treated as empty and skipped
+TILE_MIN_CONTENT_STD = float(os.environ.get('TILE_MIN_CONTENT_STD', 4.0))
+# In video, tiles whose mean absolute difference from the last processed frame is below this reuse
+# their previous boxes, but still go through the model at least every TILE_REFRESH_INTERVAL frames
+TILE_MOTION_THRESHOLD = float(os.environ.get('TILE_MOTION_THRESHOLD', 2.0))
+TILE_REFRESH_INTERVAL = int(os.environ.get('TILE_REFRESH_INTERVAL', 15))
+
+# Content-hash cache of image detection results, stored under results/cache
+IMAGE_CACHE_ENABLED = os.environ.get('IMAGE_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+IMAGE_CACHE_MEMORY_ENTRIES = int(os.environ.get('IMAGE_CACHE_MEMORY_ENTRIES', 256))
+IMAGE_CACHE_DISK_MAX_BYTES = int(os.environ.get('IMAGE_CACHE_DISK_MAX_MB', 512)) * 1024 * 1024
+
+# Store every image/video detection (and video track summaries) in the database for GET /api/detections;
+# video detections are inserted DETECTION_STORE_BATCH_SIZE rows at a time
+DETECTION_STORE_ENABLED = os.environ.get('DETECTION_STORE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+DETECTION_STORE_BATCH_SIZE = int(os.environ.get('DETECTION_STORE_BATCH_SIZE', 500))
+
+# Chunked, resumable uploads (POST /api/uploads): clients send UPLOAD_CHUNK_SIZE-byte chunks of a file of at
+# most UPLOAD_MAX_BYTES. Fast-start/fragmented MP4/MOV and Matroska files start processing once
+# UPLOAD_EARLY_START_BYTES have arrived and are decoded while they grow; a job whose upload receives no data
+# for UPLOAD_STALL_TIMEOUT seconds fails (and starts over once the upload completes)
+UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE_MB', 8)) * 1024 * 1024
+UPLOAD_MAX_BYTES = int(os.environ.get('UPLOAD_MAX_GB', 20)) * 1024 * 1024 * 1024
+UPLOAD_EARLY_START = os.environ.get('UPLOAD_EARLY_START', 'true').lower() in ('1', 'true', 'yes')
+UPLOAD_EARLY_START_BYTES = int(os.environ.get('UPLOAD_EARLY_START_MB', 4)) * 1024 * 1024
+UPLOAD_STALL_TIMEOUT = float(os.environ.get('UPLOAD_STALL_TIMEOUT', 600))
+
+# Maximum number of video jobs processed at the same time; further uploads wait in a queue
+MAX_CONCURRENT_VIDEO_JOBS = int(os.environ.get('MAX_CONCURRENT_VIDEO_JOBS', 2))
+
+# Database shared by the web process and detection workers (relative sqlite paths are under instance/)
+DATABASE_URL = os.environ.get('DATABASE_URL', 'sqlite:///users.db')
+
+# Where video jobs run: 'local' runs them inside the web process (up to MAX_CONCURRENT_VIDEO_JOBS at a time),
+# 'database' only queues them in the database, for `python worker.py` processes on any node to claim
+JOB_BROKER = os.environ.get('JOB_BROKER', 'local').lower()
+# Jobs each worker process runs at the same time, and how often an idle worker looks for a new one
+WORKER_CONCURRENCY = int(os.environ.get('WORKER_CONCURRENCY', 1))
+WORKER_POLL_INTERVAL = float(os.environ.get('WORKER_POLL_INTERVAL', 1.0))
+# Workers renew the claims of their running jobs every WORKER_HEARTBEAT_INTERVAL seconds; a job whose
+# claim is older than JOB_LEASE_TIMEOUT (its worker died) is claimed again and resumes from its checkpoint
+WORKER_HEARTBEAT_INTERVAL = float(os.environ.get('WORKER_HEARTBEAT_INTERVAL', 5.0))
+JOB_LEASE_TIMEOUT = float(os.environ.get('JOB_LEASE_TIMEOUT', 60.0))
+
+# Socket.IO message queue through which every process emits to the client rooms: a redis://, amqp:// or
+# kafka:// URL, or sqlite:///<path> for a SQLite file (single machine); unset with a single web process
+SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE')
+
+# Detection endpoints (/api/detect, /api/uploads, /api/streams) require the JWT from /api/auth/login as an
+# "Authorization: Bearer" header. When off, requests without a token are let through anonymously and are only
+# subject to load shedding. Decoded tokens are cached (up to AUTH_TOKEN_CACHE_SIZE) until they expire
+DETECTION_AUTH_REQUIRED = os.environ.get('DETECTION_AUTH_REQUIRED', 'true').lower() in ('1', 'true', 'yes')
+AUTH_TOKEN_CACHE_SIZE = int(os.environ.get('AUTH_TOKEN_CACHE_SIZE', 1024))
+
+# Per-user token buckets: a user may send RATE_LIMIT_BURST requests at once, refilled at the per-minute rate
+# (0 = unlimited). Buckets are kept per web process
+RATE_LIMIT_IMAGE_PER_MINUTE = float(os.environ.get('RATE_LIMIT_IMAGE_PER_MINUTE', 60))
+RATE_LIMIT_IMAGE_BURST = int(os.environ.get('RATE_LIMIT_IMAGE_BURST', 10))
+RATE_LIMIT_VIDEO_PER_MINUTE = float(os.environ.get('RATE_LIMIT_VIDEO_PER_MINUTE', 6))
+RATE_LIMIT_VIDEO_BURST = int(os.environ.get('RATE_LIMIT_VIDEO_BURST', 3))
+# Video jobs (queued or running) and unfinished chunked uploads a user may have at the same time (0 = unlimited)
+MAX_ACTIVE_JOBS_PER_USER = int(os.environ.get('MAX_ACTIVE_JOBS_PER_USER', 2))
+# Highest priority a client may give a video job; requested priorities are clamped to 0..VIDEO_MAX_USER_PRIORITY
+VIDEO_MAX_USER_PRIORITY = int(os.environ.get('VIDEO_MAX_USER_PRIORITY', 10))
+
+# Load shedding: image requests are refused with 503 while SHED_MAX_INFLIGHT_IMAGES are already being
+# processed, or while the 90th percentile latency of the image requests that finished in the last
+# SHED_LATENCY_WINDOW seconds is above SHED_IMAGE_LATENCY_MS; new videos are refused while
+# SHED_MAX_QUEUED_VIDEO_JOBS wait for a slot (0 disables a check). Refusals carry Retry-After
+SHED_MAX_INFLIGHT_IMAGES = int(os.environ.get('SHED_MAX_INFLIGHT_IMAGES', 16))
+SHED_IMAGE_LATENCY_MS = float(os.environ.get('SHED_IMAGE_LATENCY_MS', 5000))
+SHED_LATENCY_WINDOW = float(os.environ.get('SHED_LATENCY_WINDOW', 10.0))
+SHED_MAX_QUEUED_VIDEO_JOBS = int(os.environ.get('SHED_MAX_QUEUED_VIDEO_JOBS', 20))
+SHED_RETRY_AFTER = int(os.environ.get('SHED_RETRY_AFTER', 5))
+
+# Live stream sessions (RTSP/HTTP URLs, capture devices or an uploaded file played back as a camera)
+MAX_LIVE_STREAMS = int(os.environ.get('MAX_LIVE_STREAMS', 2))
+# Frames older than this (seconds since capture) are dropped instead of being processed late
+STREAM_MAX_LATENCY = float(os.environ.get('STREAM_MAX_LATENCY', 1.0))
+STREAM_INFERENCE_SIZE = int(os.environ.get('STREAM_INFERENCE_SIZE', 640))
+# Reconnect backoff for failed sources: starts at STREAM_RECONNECT_DELAY seconds, doubles up to the max;
+# STREAM_MAX_RECONNECTS consecutive failures end the stream (0 = retry until stopped)
+STREAM_RECONNECT_DELAY = float(os.environ.get('STREAM_RECONNECT_DELAY', 1.0))
+STREAM_MAX_RECONNECT_DELAY = float(os.environ.get('STREAM_MAX_RECONNECT_DELAY', 30.0))
+STREAM_MAX_RECONNECTS = int(os.environ.get('STREAM_MAX_RECONNECTS', 0))
+
+# Video jobs save a resumable checkpoint every this many source frames
+VIDEO_CHECKPOINT_INTERVAL = int(os.environ.get('VIDEO_CHECKPOINT_INTERVAL', 150))
+
+# Number of frames sent through the model in one batched forward pass during video processing
+VIDEO_INFERENCE_BATCH_SIZE = int(os.environ.get('VIDEO_INFERENCE_BATCH_SIZE', 4))
+# Capacity of each bounded queue between the decode / inference / annotate / emit stages
+VIDEO_PIPELINE_QUEUE_SIZE = int(os.environ.get('VIDEO_PIPELINE_QUEUE_SIZE', 4))
+
+# Adaptive frame skipping: process at least VIDEO_TARGET_SPEED x real-time (1.0 = real-time)
+VIDEO_TARGET_SPEED = float(os.environ.get('VIDEO_TARGET_SPEED', 1.0))
+# Slowest speed accepted while a weapon track is active, so it is sampled more densely
+VIDEO_ACTIVE_TARGET_SPEED = float(os.environ.get('VIDEO_ACTIVE_TARGET_SPEED', 0.5))
+VIDEO_MIN_FRAME_SKIP = int(os.environ.get('VIDEO_MIN_FRAME_SKIP', 1))
+VIDEO_MAX_FRAME_SKIP = int(os.environ.get('VIDEO_MAX_FRAME_SKIP', 8))
+# Inference sizes the controller may step down through when max skip is not enough, largest first
+VIDEO_INFERENCE_SIZES = [int(size) for size in os.environ.get('VIDEO_INFERENCE_SIZES', '480').split(',') if size.strip()]
+
+# Motion gate: a processed frame where fewer than MOTION_GATE_MIN_CHANGED_FRACTION of the (downscaled)
+# pixels changed by more than MOTION_GATE_PIXEL_DELTA grey levels since the last inferred frame reuses
+# that frame's detections; at most MOTION_GATE_MAX_GATED frames in a row are gated
+MOTION_GATE_ENABLED = os.environ.get('MOTION_GATE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+MOTION_GATE_MIN_CHANGED_FRACTION = float(os.environ.get('MOTION_GATE_MIN_CHANGED_FRACTION', 0.002))
+MOTION_GATE_PIXEL_DELTA = int(os.environ.get('MOTION_GATE_PIXEL_DELTA', 25))
+MOTION_GATE_MAX_GATED = int(os.environ.get('MOTION_GATE_MAX_GATED', 10))
+
+# Annotated result video encoder: 'opencv' (cv2.VideoWriter, VP9 .webm by default), 'ffmpeg' (frames piped
+# to an ffmpeg process; libx264 -> fragmented .mp4, libvpx-vp9 -> .webm) or 'none' (detections only, no video)
+VIDEO_ENCODER = os.environ.get('VIDEO_ENCODER', 'opencv').lower()
+# OpenCV fourcc or ffmpeg encoder name
+VIDEO_ENCODER_CODEC = os.environ.get('VIDEO_ENCODER_CODEC', 'libx264' if VIDEO_ENCODER == 'ffmpeg' else 'VP90')
+# ffmpeg only: x264 preset (mapped to -cpu-used for VP9), constant quality and encoder threads (0 = auto)
+VIDEO_ENCODER_PRESET = os.environ.get('VIDEO_ENCODER_PRESET', 'ultrafast')
+VIDEO_ENCODER_CRF = int(os.environ.get('VIDEO_ENCODER_CRF', 23))
+VIDEO_ENCODER_THREADS = int(os.environ.get('VIDEO_ENCODER_THREADS', 0))
+FFMPEG_BINARY = os.environ.get('FFMPEG_BINARY', 'ffmpeg')
+# Result videos are written at this fraction of the source resolution (detections keep full-size coordinates)
+VIDEO_OUTPUT_SCALE = float(os.environ.get('VIDEO_OUTPUT_SCALE', 1.0))
+# Progressive output: write the result as VIDEO_SEGMENT_SECONDS segments plus a growing HLS playlist
+# (results/videos/<name>/index.m3u8) that can be played while the job runs, instead of one file.
+# Needs VIDEO_ENCODER=ffmpeg with an H.264/H.265 codec (MPEG-TS segments); other encoders write one file
+VIDEO_SEGMENTED_OUTPUT = os.environ.get('VIDEO_SEGMENTED_OUTPUT', 'false').lower() in ('1', 'true', 'yes')
+VIDEO_SEGMENT_SECONDS = float(os.environ.get('VIDEO_SEGMENT_SECONDS', 4.0))
+
+# Live preview defaults; clients can override them per room with the "preview_settings" event
+PREVIEW_DEFAULT_MAX_WIDTH = int(os.environ.get('PREVIEW_DEFAULT_MAX_WIDTH', 640))
+PREVIEW_DEFAULT_QUALITY = int(os.environ.get('PREVIEW_DEFAULT_QUALITY', 70))
+PREVIEW_DEFAULT_FPS = float(os.environ.get('PREVIEW_DEFAULT_FPS', 5))
+# Seconds to wait for a client's preview ack before sending it another frame anyway
+PREVIEW_ACK_TIMEOUT = float(os.environ.get('PREVIEW_ACK_TIMEOUT', 2.0))
+
+# Weapon alerts: a weapon track is confirmed once ALERT_CONFIRM_FRAMES of its last ALERT_WINDOW_FRAMES
+# observations reached ALERT_MIN_CONFIDENCE; the alert closes when the track is gone for ALERT_CLOSE_AFTER
+# seconds. After an alert, a session gets no new one for ALERT_COOLDOWN_SECONDS; weapons confirmed meanwhile
+# alert when it is over, if they are still in view.
+ALERT_CONFIRM_FRAMES = int(os.environ.get('ALERT_CONFIRM_FRAMES', 3))
+ALERT_WINDOW_FRAMES = int(os.environ.get('ALERT_WINDOW_FRAMES', 5))
+ALERT_MIN_CONFIDENCE = float(os.environ.get('ALERT_MIN_CONFIDENCE', 0.7))
+ALERT_CLOSE_AFTER = float(os.environ.get('ALERT_CLOSE_AFTER', 2.0))
+ALERT_COOLDOWN_SECONDS = float(os.environ.get('ALERT_COOLDOWN_SECONDS', 10.0))
+# Longest side of the JPEG crop sent with weapon_alert
+ALERT_CROP_MAX_SIZE = int(os.environ.get('ALERT_CROP_MAX_SIZE', 256))
+
+# Class names containing one of these keywords count as weapons
+WEAPON_CLASS_KEYWORDS = [name.strip().lower() for name in os.environ.get(
+    'WEAPON_CLASS_KEYWORDS', 'gun,pistol,rifle,handgun,knife,weapon').split(',') if name.strip()]
+
 class Config:
     """Base configuration."""
     SECRET_KEY = os.environ.get('SECRET_KEY', 'dev-key-please-change-in-production')
@@ -0,0 +1,83 @@
+import datetime
+from . import db
+
+class Detection(db.Model):
+    """One detected box. job_id is the video job id, or the job_id returned by POST /api/detect/image."""
+    __tablename__ = 'detections'
+    __table_args__ = (
+        # Every query is scoped to a job, then narrowed by time, class/confidence or track
+        db.Index('ix_detections_job_time', 'job_id', 'seconds'),
+        db.Index('ix_detections_job_class_conf', 'job_id', 'class_name', 'confidence'),
+        db.Index('ix_detections_job_track', 'job_id', 'track_id'),
+        db.Index('ix_detections_class_conf', 'class_name', 'confidence'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.String(36), nullable=False)
+    source = db.Column(db.String(10), nullable=False, default='video')  # 'video' or 'image'
+    frame = db.Column(db.Integer, nullable=False, default=0)
+    seconds = db.Column(db.Float, nullable=False, default=0.0)
+    class_name = db.Column(db.String(64), nullable=False)
+    confidence = db.Column(db.Float, nullable=False)
+    x1 = db.Column(db.Integer, nullable=False)
+    y1 = db.Column(db.Integer, nullable=False)
+    x2 = db.Column(db.Integer, nullable=False)
+    y2 = db.Column(db.Integer, nullable=False)
+    track_id = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+
+    def to_dict(self):
+        """Convert the model instance to a dictionary."""
+        return {
+            'id': self.id,
+            'job_id': self.job_id,
+            'source': self.source,
+            'frame': self.frame,
+            'seconds': round(self.seconds, 3),
+            'timestamp': format_seconds(self.seconds),
+            'class': self.class_name,
+            'confidence': round(self.confidence, 2),
+            'bbox': [self.x1, self.y1, self.x2, self.y2],
+            'track_id': self.track_id
+        }
+
+class Track(db.Model):
+    """Summary of one tracked object in a video job."""
+    __tablename__ = 'tracks'
+    __table_args__ = (
+        db.UniqueConstraint('job_id', 'track_id', name='uq_tracks_job_track'),
+        db.Index('ix_tracks_job_class', 'job_id', 'class_name'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.String(36), nullable=False)
+    track_id = db.Column(db.Integer, nullable=False)
+    class_name = db.Column(db.String(64), nullable=False)
+    first_frame = db.Column(db.Integer, nullable=False)
+    last_frame = db.Column(db.Integer, nullable=False)
+    first_seconds = db.Column(db.Float, nullable=False)
+    last_seconds = db.Column(db.Float, nullable=False)
+    max_confidence = db.Column(db.Float, nullable=False)
+    detection_count = db.Column(db.Integer, nullable=False)
+
+    def to_dict(self):
+        """Convert the model instance to a dictionary."""
+        return {
+            'job_id': self.job_id,
+            'track_id': self.track_id,
+            'class': self.class_name,
+            'first_frame': self.first_frame,
+            'last_frame': self.last_frame,
+            'first_seen': format_seconds(self.first_seconds),
+            'last_seen': format_seconds(self.last_seconds),
+            'first_seconds': round(self.first_seconds, 3),
+            'last_seconds': round(self.last_seconds, 3),
+            'max_confidence': round(self.max_confidence, 2),
+            'detection_count': self.detection_count
+        }
+
+def format_seconds(seconds):
+    """Format a video position as HH:MM:SS.mmm."""
+    minutes, secs = divmod(seconds, 60)
+    hours, minutes = divmod(int(minutes), 60)
+    return f"{hours:02d}:{minutes:02d}:{secs:06.3f}"
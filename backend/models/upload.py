@@ -0,0 +1,43 @@
+import datetime
+from . import db
+
+class UploadSession(db.Model):
+    """A chunked, resumable video upload; `received` is the offset the next chunk must start at."""
+    __tablename__ = 'uploads'
+
+    id = db.Column(db.String(36), primary_key=True)
+    session_id = db.Column(db.String(120), nullable=False)
+    filename = db.Column(db.String(255), nullable=False)
+    unique_filename = db.Column(db.String(255), nullable=False)
+    file_path = db.Column(db.String(1024), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    received = db.Column(db.BigInteger, nullable=False, default=0)
+    state = db.Column(db.String(20), nullable=False, default='uploading', index=True)
+    priority = db.Column(db.Integer, nullable=False, default=0)
+    tiled = db.Column(db.Boolean, nullable=True)
+    # Whether the container can be decoded before it is complete (None until the header has arrived)
+    streamable = db.Column(db.Boolean, nullable=True)
+    job_id = db.Column(db.String(36), nullable=True, index=True)
+    early_start = db.Column(db.Boolean, nullable=False, default=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow,
+                           onupdate=datetime.datetime.utcnow)
+
+    # 'uploading' -> 'complete', or 'uploading' -> 'aborted'
+    FINAL_STATES = ('complete', 'aborted')
+
+    def to_dict(self):
+        """Convert the model instance to a dictionary."""
+        return {
+            'upload_id': self.id,
+            'session_id': self.session_id,
+            'filename': self.unique_filename,
+            'size': self.size,
+            'offset': self.received,
+            'state': self.state,
+            'streamable': self.streamable,
+            'job_id': self.job_id,
+            'early_start': self.early_start,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
@@ -0,0 +1,107 @@
+import os
+import json
+import datetime
+from . import db
+from config import VIDEO_ENCODER, VIDEO_ENCODER_CODEC, VIDEO_SEGMENTED_OUTPUT
+from utils.video_encoder import find_video_output, result_video_name, PLAYLIST_NAME
+
+class VideoJob(db.Model):
+    __tablename__ = 'video_jobs'
+
+    id = db.Column(db.String(36), primary_key=True)
+    session_id = db.Column(db.String(120), nullable=False)
+    filename = db.Column(db.String(255), nullable=False)
+    file_path = db.Column(db.String(1024), nullable=False)
+    result_filename = db.Column(db.String(255), nullable=False)
+    result_dir = db.Column(db.String(1024), nullable=False)
+    state = db.Column(db.String(20), nullable=False, default='queued', index=True)
+    priority = db.Column(db.Integer, nullable=False, default=0)
+    last_frame = db.Column(db.Integer, nullable=False, default=0)
+    processed_frames = db.Column(db.Integer, nullable=False, default=0)
+    track_summary = db.Column(db.Text, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow,
+                           onupdate=datetime.datetime.utcnow)
+
+    # Jobs in these states are picked up again when the server restarts
+    RESUMABLE_STATES = ('queued', 'running')
+    FINAL_STATES = ('completed', 'failed', 'cancelled')
+
+    def get_tracks(self):
+        """Return the checkpointed track summary keyed by integer track ID."""
+        if not self.track_summary:
+            return {}
+        try:
+            return {int(track_id): track for track_id, track in json.loads(self.track_summary).items()}
+        except (ValueError, TypeError):
+            return {}
+
+    def set_tracks(self, tracks):
+        """Store the track summary as JSON."""
+        self.track_summary = json.dumps(tracks)
+
+    def output_filename(self):
+        """Name of the annotated video: the one on disk if written, else what the configured encoder will produce."""
+        name = self.result_filename.split('.')[0]
+        existing = find_video_output(self.result_dir, name)
+        if existing:
+            return os.path.basename(existing)
+        if os.path.exists(os.path.join(self.result_dir, PLAYLIST_NAME)):
+            return f"{name}/{PLAYLIST_NAME}"
+        return result_video_name(name, VIDEO_ENCODER, VIDEO_ENCODER_CODEC, VIDEO_SEGMENTED_OUTPUT)
+
+    def to_dict(self):
+        """Convert the model instance to a dictionary."""
+        return {
+            'id': self.id,
+            'session_id': self.session_id,
+            'filename': self.filename,
+            'result_filename': self.output_filename(),
+            'state': self.state,
+            'priority': self.priority,
+            'last_frame': self.last_frame,
+            'processed_frames': self.processed_frames,
+            'unique_tracks': len(self.get_tracks()),
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+
+class JobClaim(db.Model):
+    """
+    A detection worker's hold on a video job (JOB_BROKER=database).
+
+    The primary key makes claiming atomic: of several workers inserting a claim for the same
+    job, exactly one succeeds. A claim whose heartbeat is older than the lease timeout belongs
+    to a dead worker and may be replaced. A claim without a worker blocks a queued job that
+    was cancelled; cancel_requested asks the holding worker to stop.
+    """
+    __tablename__ = 'job_claims'
+
+    job_id = db.Column(db.String(36), primary_key=True)
+    worker_id = db.Column(db.String(120), nullable=True, index=True)
+    cancel_requested = db.Column(db.Boolean, nullable=False, default=False)
+    claimed_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        """Convert the model instance to a dictionary."""
+        return {
+            'job_id': self.job_id,
+            'worker_id': self.worker_id,
+            'cancel_requested': self.cancel_requested,
+            'claimed_at': self.claimed_at.isoformat() if self.claimed_at else None,
+            'heartbeat_at': self.heartbeat_at.isoformat() if self.heartbeat_at else None
+        }
+
+
+class JobOwner(db.Model):
+    """The user who submitted a video job, an image request or a chunked upload, for quotas and access checks."""
+    __tablename__ = 'job_owners'
+
+    # A VideoJob or UploadSession ID, or the job_id of a stored image request
+    id = db.Column(db.String(36), primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
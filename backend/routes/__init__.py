@@ -2,5 +2,11 @@
 from .items import items_bp
 from .auth import auth_bp
 from .detection import detection_bp
+from .jobs import jobs_bp
+from .metrics import metrics_bp
+from .streams import streams_bp
+from .detections import detections_bp
+from .uploads import uploads_bp
+from .storage import storage_bp
 
-__all__ = ['items_bp', 'auth_bp', 'detection_bp']
+__all__ = ['items_bp', 'auth_bp', 'detection_bp', 'jobs_bp', 'metrics_bp', 'streams_bp', 'detections_bp', 'uploads_bp', 'storage_bp']
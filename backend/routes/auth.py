@@ -1,7 +1,8 @@
-from flask import Blueprint, jsonify, request, current_app
+from flask import Blueprint, jsonify, request
 from models.user import User
 from models import db
 from utils.helpers import validate_request_data
+from utils.jwt_utils import signing_key
 import jwt
 import datetime
 
@@ -54,7 +55,7 @@ def login():
         return jsonify({"error": "Invalid username or password"}), 401
 
     # Generate JWT token
-    secret = str(current_app.config.get("SECRET_KEY", "supersecretkey"))
+    secret = signing_key()
     exp = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
     token = jwt.encode(
         {"user_id": user.id, "exp": int(exp.timestamp())},
@@ -1,4 +1,4 @@
-from flask import Blueprint, jsonify, request, send_file, url_for
+from flask import Blueprint, jsonify, request, url_for, current_app, g
 from werkzeug.utils import secure_filename
 import os
 import time
@@ -6,19 +6,70 @@ import uuid
 import cv2
 import numpy as np
 import time
-from ultralytics import YOLO
 from PIL import Image
 import io
-import torch
-import requests
 import base64
+import json
 import threading
+import math
+import functools
+from jwt import ExpiredSignatureError, InvalidTokenError
 from config import (
-    IMAGE_UPLOAD_FOLDER, VIDEO_UPLOAD_FOLDER,
+    UPLOAD_FOLDER, IMAGE_UPLOAD_FOLDER, VIDEO_UPLOAD_FOLDER,
     IMAGE_RESULT_FOLDER, VIDEO_RESULT_FOLDER,
-    ALLOWED_IMAGE_EXTENSIONS, ALLOWED_VIDEO_EXTENSIONS
+    ALLOWED_IMAGE_EXTENSIONS, ALLOWED_VIDEO_EXTENSIONS,
+    VIDEO_INFERENCE_BATCH_SIZE, VIDEO_PIPELINE_QUEUE_SIZE,
+    VIDEO_TARGET_SPEED, VIDEO_ACTIVE_TARGET_SPEED, VIDEO_MIN_FRAME_SKIP,
+    VIDEO_MAX_FRAME_SKIP, VIDEO_INFERENCE_SIZES, WEAPON_CLASS_KEYWORDS,
+    MODEL_WEIGHTS, MAX_CONCURRENT_VIDEO_JOBS, VIDEO_CHECKPOINT_INTERVAL,
+    PERSIST_IMAGE_UPLOADS, PERSIST_IMAGE_RESULTS, RESULT_FOLDER, IMAGE_INFERENCE_ARGS,
+    IMAGE_CACHE_ENABLED, IMAGE_CACHE_MEMORY_ENTRIES, IMAGE_CACHE_DISK_MAX_BYTES,
+    INFERENCE_BACKEND, INFERENCE_PRECISION, EXPORT_FOLDER, INT8_CALIBRATION_DATA, INFERENCE_WORKERS,
+    TILED_INFERENCE, TILE_SIZE, TILE_OVERLAP, TILE_FULL_FRAME, TILE_MIN_CONTENT_STD,
+    TILE_MOTION_THRESHOLD, TILE_REFRESH_INTERVAL,
+    MOTION_GATE_ENABLED, MOTION_GATE_MIN_CHANGED_FRACTION, MOTION_GATE_PIXEL_DELTA, MOTION_GATE_MAX_GATED,
+    VIDEO_ENCODER, VIDEO_ENCODER_CODEC, VIDEO_ENCODER_PRESET, VIDEO_ENCODER_CRF, VIDEO_ENCODER_THREADS,
+    VIDEO_OUTPUT_SCALE, FFMPEG_BINARY, VIDEO_SEGMENTED_OUTPUT, VIDEO_SEGMENT_SECONDS,
+    DETECTION_STORE_ENABLED, DETECTION_STORE_BATCH_SIZE,
+    ALERT_CONFIRM_FRAMES, ALERT_WINDOW_FRAMES, ALERT_MIN_CONFIDENCE, ALERT_CLOSE_AFTER,
+    ALERT_COOLDOWN_SECONDS, ALERT_CROP_MAX_SIZE, UPLOAD_STALL_TIMEOUT, JOB_BROKER, JOB_LEASE_TIMEOUT,
+    DETECTION_AUTH_REQUIRED, AUTH_TOKEN_CACHE_SIZE, RATE_LIMIT_IMAGE_PER_MINUTE, RATE_LIMIT_IMAGE_BURST,
+    RATE_LIMIT_VIDEO_PER_MINUTE, RATE_LIMIT_VIDEO_BURST, MAX_ACTIVE_JOBS_PER_USER, VIDEO_MAX_USER_PRIORITY,
+    SHED_MAX_INFLIGHT_IMAGES, SHED_IMAGE_LATENCY_MS, SHED_LATENCY_WINDOW, SHED_MAX_QUEUED_VIDEO_JOBS, SHED_RETRY_AFTER,
+    STORAGE_UPLOADS_MAX_BYTES, STORAGE_UPLOADS_MAX_AGE, STORAGE_RESULTS_MAX_BYTES, STORAGE_RESULTS_MAX_AGE,
+    STORAGE_DEDUPE_UPLOADS
 )
 from socketio_instance import socketio
+from models import db
+from models.video_job import VideoJob, JobOwner
+from models.upload import UploadSession
+from utils.helpers import parse_bool
+from utils.admission import TokenCache, RateLimiter, LoadShedder
+from utils.video_pipeline import VideoPipeline
+from utils.frame_skip import AdaptiveFrameSkipController
+from utils.job_scheduler import ModelPool, VideoJobScheduler
+from utils.job_broker import DatabaseJobQueue
+from utils.tracking import JobTracker
+from utils.model_loader import LazyModel
+from utils.preview_stream import PreviewEncoder, PreviewChannel
+from utils.result_cache import DetectionResultCache
+from utils.storage import StorageArea, StorageManager
+from utils.inference_backend import load_detection_model, model_memory_bytes
+from utils.inference_workers import InferenceWorkerPool
+from utils.tiling import TiledDetector
+from utils.motion_gate import MotionGate
+from utils.detection_store import DetectionWriter
+from utils.track_store import TrackStore, result_arrays
+from utils.alert_engine import AlertEngine, AlertCooldowns
+from utils.chunked_upload import UploadRegistry, GrowingVideoReader
+from utils.video_encoder import (
+    create_video_writer, find_video_output, result_video_name, segmented_output, SegmentedVideoWriter, listed_segments,
+    VIDEO_MIMETYPES, SEGMENT_MIMETYPES, PLAYLIST_NAME
+)
+from utils.metrics import (
+    STAGE_SECONDS, FRAMES, DROPPED_FRAMES, DETECTIONS, REQUESTS, ALERTS,
+    VIDEO_JOBS_QUEUED, VIDEO_JOBS_ACTIVE, MODEL_MEMORY_BYTES, INFERENCE_WORKERS_BUSY, IMAGE_REQUESTS_INFLIGHT
+)
 
 # Create a Blueprint for detection
 detection_bp = Blueprint('detection', __name__)
@@ -29,7 +80,7 @@ detection_bp = Blueprint('detection', __name__)
 def serve_image_result(filename):
     """Serve a processed image result"""
     try:
-        return send_file(os.path.join(IMAGE_RESULT_FOLDER, filename), mimetype='image/jpeg', conditional=True)
+        return storage_manager.send_file(os.path.join(IMAGE_RESULT_FOLDER, filename), mimetype='image/jpeg', conditional=True)
     except Exception as e:
         return jsonify({"error": f"Error serving image: {str(e)}"}), 404
 
@@ -37,40 +88,248 @@ def serve_image_result(filename):
 def serve_video_result(filename):
     """Serve a processed video result"""
     try:
-        # Get the actual path to the processed video
-        # YOLOv8 saves videos in a subdirectory with the name specified
+        # Results live in a subdirectory named after the video; the container depends on the
+        # encoder that produced it (.webm from OpenCV/VP9, .mp4 from ffmpeg/H.264)
         video_name = filename.split('.')[0]
-
-        # Check for WebM file first (new format)
-        webm_filename = f"{video_name}.webm"
-        webm_path = os.path.join(VIDEO_RESULT_FOLDER, video_name, webm_filename)
-
-        # If WebM doesn't exist, try the original filename
-        if not os.path.exists(webm_path):
+        video_path = find_video_output(os.path.join(VIDEO_RESULT_FOLDER, video_name), video_name)
+        if video_path is None:
             video_path = os.path.join(VIDEO_RESULT_FOLDER, video_name, filename)
             # If that doesn't exist, try the direct path
             if not os.path.exists(video_path):
                 video_path = os.path.join(VIDEO_RESULT_FOLDER, filename)
-        else:
-            video_path = webm_path
-            filename = webm_filename
 
         # Determine the correct mimetype based on file extension
-        if filename.endswith('.webm'):
-            mimetype = 'video/webm'
-        elif filename.endswith('.mp4'):
-            mimetype = 'video/mp4'
-        elif filename.endswith('.avi'):
-            mimetype = 'video/x-msvideo'
-        else:
-            mimetype = 'video/mp4'  # Default
+        mimetype = VIDEO_MIMETYPES.get(video_path.rsplit('.', 1)[-1].lower(), 'video/mp4')
 
-        return send_file(video_path, mimetype=mimetype, conditional=True)
+        return storage_manager.send_file(video_path, mimetype=mimetype, conditional=True)
     except Exception as e:
         return jsonify({"error": f"Error serving video: {str(e)}"}), 404
 
-# Load YOLOv8 model
-model = YOLO('july29_5th_train.pt')  # Using the nano model for speed, can be changed to larger models for better accuracy
+@detection_bp.route('/results/video/<video_name>/<filename>', methods=['GET'])
+def serve_video_segment(video_name, filename):
+    """Serve the HLS playlist or a segment of a progressively written video result"""
+    result_dir = os.path.join(VIDEO_RESULT_FOLDER, secure_filename(video_name))
+    filename = secure_filename(filename)
+    path = os.path.join(result_dir, filename)
+    mimetype = SEGMENT_MIMETYPES.get(filename.rsplit('.', 1)[-1].lower())
+    if mimetype is None or not os.path.isfile(path):
+        return jsonify({"error": "Video segment not found"}), 404
+    # Byte ranges are handled by send_file(conditional=True)
+    response = storage_manager.send_file(path, mimetype=mimetype, conditional=True)
+    if filename == PLAYLIST_NAME:
+        # The playlist grows while the job runs; once it has #EXT-X-ENDLIST it no longer changes
+        with open(path) as playlist:
+            finished = '#EXT-X-ENDLIST' in playlist.read()
+        response.headers['Cache-Control'] = 'public, max-age=3600' if finished else 'no-cache'
+    elif filename in listed_segments(os.path.join(result_dir, PLAYLIST_NAME)):
+        # A segment is never rewritten once it is listed in the playlist
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        # E.g. the segment still being written: what the client got may be truncated
+        response.headers['Cache-Control'] = 'no-store'
+    return response
+
+# With INFERENCE_WORKERS set, models live in worker processes and this process only holds handles
+inference_workers = InferenceWorkerPool(INFERENCE_WORKERS, dict(
+    weights=MODEL_WEIGHTS, backend=INFERENCE_BACKEND, precision=INFERENCE_PRECISION,
+    export_dir=EXPORT_FOLDER, calibration_data=INT8_CALIBRATION_DATA
+)) if INFERENCE_WORKERS > 0 else None
+
+def create_model():
+    """Load the detection model with the configured backend (PyTorch, ONNX Runtime or OpenVINO),
+    or return a handle on the inference worker processes"""
+    if inference_workers is not None:
+        return inference_workers.model()
+    return load_detection_model(
+        MODEL_WEIGHTS, INFERENCE_BACKEND, INFERENCE_PRECISION,
+        export_dir=EXPORT_FOLDER, calibration_data=INT8_CALIBRATION_DATA
+    )
+
+def warm_up_model(loaded_model):
+    """Run a dummy image request's forward pass and plot, so the first real request does not pay for
+    lazy imports, predictor setup and allocations (inference workers also run their own pass)"""
+    if inference_workers is not None:
+        inference_workers.wait_ready()
+    size = IMAGE_INFERENCE_ARGS['imgsz']
+    results = loaded_model.predict(np.zeros((size, size, 3), dtype=np.uint8), verbose=False, **IMAGE_INFERENCE_ARGS)
+    results[0].plot()
+
+def workers_loaded():
+    """Whether at least one inference worker has loaded the model (the handle create_model returns loads nothing)"""
+    return inference_workers.stats()['ready'] > 0
+
+# Shared model for image requests, loaded on first use or by the warm-up started with the server
+# (see MODEL_WARMUP), so importing the app, e.g. for /api/auth, does not wait for it
+model = LazyModel(create_model, warm_up_model, loaded=workers_loaded if inference_workers is not None else None)
+
+# Video jobs each check out their own model instance and run through a bounded scheduler,
+# or, with JOB_BROKER=database, wait in the database for detection workers (worker.py)
+video_model_pool = ModelPool(create_model, MAX_CONCURRENT_VIDEO_JOBS)
+if JOB_BROKER == 'database':
+    video_scheduler = DatabaseJobQueue(JOB_LEASE_TIMEOUT)
+else:
+    video_scheduler = VideoJobScheduler(socketio, max_concurrent=MAX_CONCURRENT_VIDEO_JOBS)
+
+if VIDEO_SEGMENTED_OUTPUT and VIDEO_ENCODER != 'none' and not segmented_output(VIDEO_ENCODER, VIDEO_ENCODER_CODEC, True):
+    print(f"VIDEO_SEGMENTED_OUTPUT needs VIDEO_ENCODER=ffmpeg with an H.264/H.265 codec for HLS (MPEG-TS) segments; "
+          f"{VIDEO_ENCODER}/{VIDEO_ENCODER_CODEC} results are written as single files instead")
+
+# Alert cooldowns are per Socket.IO session, shared by all of its video jobs and streams
+alert_cooldowns = AlertCooldowns(ALERT_COOLDOWN_SECONDS)
+
+# Receive state of chunked uploads in progress, shared with the jobs that start before they finish
+upload_registry = UploadRegistry(UPLOAD_STALL_TIMEOUT)
+
+# Queue, concurrency and model memory are read from their owners whenever /metrics is scraped
+VIDEO_JOBS_QUEUED.set_function(lambda: video_scheduler.stats()['queued'])
+VIDEO_JOBS_ACTIVE.set_function(lambda: video_scheduler.stats()['running'])
+if inference_workers is not None:
+    MODEL_MEMORY_BYTES.set_function(inference_workers.memory_bytes)
+    INFERENCE_WORKERS_BUSY.set_function(inference_workers.busy)
+else:
+    MODEL_MEMORY_BYTES.set_function(
+        lambda: model_memory_bytes(model.get()) * (1 + video_model_pool.stats()['created']) if model.loaded else 0
+    )
+
+# Everything that changes the output of detect_image is part of the cache key
+IMAGE_CACHE_PARAMS = {**IMAGE_INFERENCE_ARGS, 'backend': INFERENCE_BACKEND, 'precision': INFERENCE_PRECISION}
+
+# Tiled requests produce different boxes, so their tile settings are part of the cache key too
+TILED_CACHE_PARAMS = {
+    'tiled': True, 'tile_size': TILE_SIZE, 'tile_overlap': TILE_OVERLAP,
+    'tile_full_frame': TILE_FULL_FRAME, 'tile_min_content_std': TILE_MIN_CONTENT_STD
+}
+
+def create_tiled_detector(pipeline):
+    """Create a TiledDetector with the configured tile settings (one per image request or video job)"""
+    return TiledDetector(
+        tile_size=TILE_SIZE,
+        overlap=TILE_OVERLAP,
+        full_frame=TILE_FULL_FRAME,
+        min_content_std=TILE_MIN_CONTENT_STD,
+        motion_threshold=TILE_MOTION_THRESHOLD,
+        refresh_interval=TILE_REFRESH_INTERVAL,
+        pipeline=pipeline
+    )
+
+# Content-addressed cache of image detection results (memory LRU + size-capped disk tier)
+image_result_cache = DetectionResultCache(
+    os.path.join(RESULT_FOLDER, 'cache'),
+    MODEL_WEIGHTS,
+    memory_entries=IMAGE_CACHE_MEMORY_ENTRIES,
+    disk_max_bytes=IMAGE_CACHE_DISK_MAX_BYTES
+)
+
+# Size and age limits of uploads/ and results/ (the cache above keeps its own), and deduplicated uploads
+storage_manager = StorageManager(
+    StorageArea('uploads', UPLOAD_FOLDER, STORAGE_UPLOADS_MAX_BYTES, STORAGE_UPLOADS_MAX_AGE),
+    StorageArea('results', RESULT_FOLDER, STORAGE_RESULTS_MAX_BYTES, STORAGE_RESULTS_MAX_AGE, skip=('cache',)),
+    dedupe=STORAGE_DEDUPE_UPLOADS
+)
+
+def active_storage_paths():
+    """Files the storage sweep must keep: those of queued or running video jobs and of uploads in progress"""
+    paths = []
+    jobs = VideoJob.query.filter(VideoJob.state.in_(VideoJob.RESUMABLE_STATES))
+    for file_path, result_dir in jobs.with_entities(VideoJob.file_path, VideoJob.result_dir):
+        paths += [file_path, result_dir]
+    uploads = UploadSession.query.filter_by(state='uploading').with_entities(UploadSession.file_path)
+    return paths + [file_path for (file_path,) in uploads]
+
+storage_manager.add_pin_provider(active_storage_paths)
+
+# Admission control: detection requests carry the JWT from /api/auth/login, each user has token-bucket
+# rate limits and a cap on active video jobs, and new work is shed with 503 while the host is overloaded,
+# so the requests that are admitted still finish in bounded time
+token_cache = TokenCache(AUTH_TOKEN_CACHE_SIZE)
+rate_limiters = {
+    'image': RateLimiter(RATE_LIMIT_IMAGE_PER_MINUTE, RATE_LIMIT_IMAGE_BURST),
+    'video': RateLimiter(RATE_LIMIT_VIDEO_PER_MINUTE, RATE_LIMIT_VIDEO_BURST)
+}
+image_load = LoadShedder(SHED_MAX_INFLIGHT_IMAGES, SHED_IMAGE_LATENCY_MS / 1000, SHED_LATENCY_WINDOW)
+IMAGE_REQUESTS_INFLIGHT.set_function(lambda: image_load.inflight)
+
+def authenticate():
+    """
+    The user ID in the request's bearer token, or None for a request without one when DETECTION_AUTH_REQUIRED
+    is off. Raises ExpiredSignatureError or InvalidTokenError otherwise.
+    """
+    header = request.headers.get('Authorization', '')
+    if not header.startswith('Bearer '):
+        if DETECTION_AUTH_REQUIRED:
+            raise InvalidTokenError("Missing bearer token")
+        return None
+    payload = token_cache.decode(header[len('Bearer '):].strip())
+    if payload.get('user_id') is None:
+        raise InvalidTokenError("Token has no user_id")
+    return payload['user_id']
+
+def reject(endpoint, outcome, status, message, retry_after=None):
+    """An error response for a request refused before any work was done, with Retry-After when given"""
+    REQUESTS.inc(endpoint=endpoint, outcome=outcome)
+    response = jsonify({"error": message})
+    response.status_code = status
+    if retry_after is not None:
+        response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+def video_backlog():
+    """Why a new video should be shed ('queue' while too many jobs wait for a slot), or None"""
+    if SHED_MAX_QUEUED_VIDEO_JOBS and video_scheduler.stats()['queued'] >= SHED_MAX_QUEUED_VIDEO_JOBS:
+        return 'queue'
+    return None
+
+def active_jobs(user_id):
+    """A user's video jobs that are queued or running, plus chunked uploads that have not started a job yet"""
+    jobs = JobOwner.query.join(VideoJob, VideoJob.id == JobOwner.id).filter(
+        JobOwner.user_id == user_id, VideoJob.state.in_(VideoJob.RESUMABLE_STATES)
+    ).count()
+    uploads = JobOwner.query.join(UploadSession, UploadSession.id == JobOwner.id).filter(
+        JobOwner.user_id == user_id, UploadSession.state == 'uploading', UploadSession.job_id.is_(None)
+    ).count()
+    return jobs + uploads
+
+def owned_by_caller(resource_id):
+    """Whether the video job or upload `resource_id` belongs to the caller (anonymous callers own what has no owner)"""
+    owner = JobOwner.query.get(resource_id)
+    return (owner.user_id if owner else None) == g.user_id
+
+def user_priority(value):
+    """A client-requested job priority as an int clamped to 0..VIDEO_MAX_USER_PRIORITY; raises ValueError/TypeError"""
+    return max(0, min(int(value), VIDEO_MAX_USER_PRIORITY))
+
+def admit(endpoint, limit=None, load=None, shed=None, quota=False):
+    """
+    Decorator for detection views, cheapest checks first: authenticate (401), shed load while `load`
+    (a LoadShedder, which then also tracks the view) or `shed()` reports overload (503), take a token
+    from the user's `limit` rate limiter (429) and, with `quota`, check their active video jobs (429).
+    The view finds the user in g.user_id (None if anonymous; anonymous requests are only shed).
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                g.user_id = authenticate()
+            except ExpiredSignatureError:
+                return reject(endpoint, 'unauthorized', 401, "Token expired, please log in again")
+            except InvalidTokenError:
+                return reject(endpoint, 'unauthorized', 401, "Authentication required")
+            reason = (load.overloaded() if load else None) or (shed() if shed else None)
+            if reason:
+                return reject(endpoint, 'shed', 503, f"Server is overloaded ({reason}), try again later", SHED_RETRY_AFTER)
+            if g.user_id is not None:
+                wait = rate_limiters[limit].take(g.user_id) if limit else 0
+                if wait:
+                    return reject(endpoint, 'rate_limited', 429, "Rate limit exceeded, slow down", wait)
+                if quota and MAX_ACTIVE_JOBS_PER_USER and active_jobs(g.user_id) >= MAX_ACTIVE_JOBS_PER_USER:
+                    return reject(endpoint, 'over_quota', 429,
+                                  f"You already have {MAX_ACTIVE_JOBS_PER_USER} video jobs in progress", SHED_RETRY_AFTER)
+            if load is None:
+                return view(*args, **kwargs)
+            with load.track():
+                return view(*args, **kwargs)
+        return wrapper
+    return decorator
 
 def allowed_image_file(filename):
     """Check if the uploaded file has an allowed image extension"""
@@ -80,7 +339,68 @@ def allowed_video_file(filename):
     """Check if the uploaded file has an allowed video extension"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_VIDEO_EXTENSIONS
 
+def decode_image(image_bytes):
+    """Decode uploaded image bytes into a BGR numpy array, or None if they are not an image"""
+    image = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        # Fall back to Pillow for formats OpenCV cannot decode (e.g. some GIFs)
+        try:
+            image = np.array(Image.open(io.BytesIO(image_bytes)).convert('RGB'))[..., ::-1]
+            image = np.ascontiguousarray(image)
+        except Exception:
+            return None
+    return image
+
+def observe_model_speed(result, pipeline):
+    """Record ultralytics' per-image preprocess / inference / postprocess times (milliseconds)"""
+    for stage in ('preprocess', 'inference', 'postprocess'):
+        milliseconds = (getattr(result, 'speed', None) or {}).get(stage)
+        if milliseconds is not None:
+            STAGE_SECONDS.observe(milliseconds / 1000, pipeline=pipeline, stage=stage)
+
+def reuse_detections(previous_result, frame):
+    """Carry the previous frame's tracked boxes (IDs included) over to an unchanged frame"""
+    from ultralytics.engine.results import Results
+    boxes = previous_result.boxes.data.clone() if previous_result.boxes is not None else None
+    return Results(orig_img=frame, path=previous_result.path, names=previous_result.names, boxes=boxes)
+
+def video_result_name(result_filename):
+    """Name of the annotated video a job produces with the configured encoder (None in detections-only mode)."""
+    return result_video_name(result_filename.split('.')[0], VIDEO_ENCODER, VIDEO_ENCODER_CODEC, VIDEO_SEGMENTED_OUTPUT)
+
+def video_playlist_path(result_filename):
+    """URL of the growing HLS playlist when results are written progressively, else None."""
+    if not segmented_output(VIDEO_ENCODER, VIDEO_ENCODER_CODEC, VIDEO_SEGMENTED_OUTPUT):
+        return None
+    return f"/api/detect/results/video/{result_filename.split('.')[0]}/{PLAYLIST_NAME}"
+
+def is_weapon_class(class_name):
+    """Check if a detected class name refers to a weapon"""
+    name = str(class_name).lower()
+    return any(keyword in name for keyword in WEAPON_CLASS_KEYWORDS)
+
+def create_alert_engine(session_id):
+    """Alert engine for one video job or live stream, with the configured confirmation rules"""
+    return AlertEngine(
+        session_id, is_weapon_class, alert_cooldowns,
+        confirm_frames=ALERT_CONFIRM_FRAMES,
+        window_frames=ALERT_WINDOW_FRAMES,
+        min_confidence=ALERT_MIN_CONFIDENCE,
+        close_after=ALERT_CLOSE_AFTER,
+        crop_max_size=ALERT_CROP_MAX_SIZE
+    )
+
+def emit_alerts(events, room, pipeline, **context):
+    """Emit weapon_alert / weapon_alert_closed for AlertEngine events; `context` identifies the job or stream."""
+    for kind, payload in events:
+        if kind == 'suppressed':
+            ALERTS.inc(pipeline=pipeline, event='suppressed')  # Counted, but the session is cooling down
+            continue
+        ALERTS.inc(pipeline=pipeline, event='opened' if kind == 'open' else 'closed')
+        socketio.emit("weapon_alert" if kind == 'open' else "weapon_alert_closed", {**payload, **context}, room=room)
+
 @detection_bp.route('/image', methods=['POST'])
+@admit('image', limit='image', load=image_load)
 def detect_image():
     """Detect people in an uploaded image using YOLOv8"""
     if 'image' not in request.files:
@@ -94,6 +414,13 @@ def detect_image():
     if not allowed_image_file(file.filename):
         return jsonify({"error": "File type not allowed. Please upload an image file (png, jpg, jpeg, gif)"}), 400
 
+    # Persisting the upload / annotated result is optional; the model always runs in memory
+    persist_upload = parse_bool(request.form.get('persist_upload'), PERSIST_IMAGE_UPLOADS)
+    persist_result = parse_bool(request.form.get('persist_result'), PERSIST_IMAGE_RESULTS)
+    return_image = parse_bool(request.form.get('return_image'), False)
+    use_cache = parse_bool(request.form.get('use_cache'), IMAGE_CACHE_ENABLED)
+    tiled = parse_bool(request.form.get('tiled'), TILED_INFERENCE)
+
     try:
         # Get timestamp from form (optional)
         timestamp = time.time()
@@ -102,62 +429,140 @@ def detect_image():
 
         # Secure the filename and generate a unique name
         filename = secure_filename(file.filename)
-        unique_filename = f"{uuid.uuid4()}_{filename}"
-        file_path = os.path.join(IMAGE_UPLOAD_FOLDER, unique_filename)
+        image_job_id = str(uuid.uuid4())
+        unique_filename = f"{image_job_id}_{filename}"
 
-        # Save the uploaded file
-        file.save(file_path)
+        image_bytes = file.read()
 
-        # Process the image with YOLOv8
-        results = model(file_path)
+        # Identical bytes + weights + parameters give identical results: serve them from the cache
+        cache_params = {**IMAGE_CACHE_PARAMS, **TILED_CACHE_PARAMS} if tiled else IMAGE_CACHE_PARAMS
+        cache_key = image_result_cache.make_key(image_bytes, cache_params) if use_cache else None
+        cached = image_result_cache.get(cache_key) if use_cache else None
 
         # Create a list to store detection results
         detections = []
+        result_filename = None
+        annotated_jpeg = None
+        tiling_report = None
 
-        # Process detection results
-        if len(results) > 0:
-            result = results[0]  # Get the first result
+        if cached is not None:
+            detections = [dict(detection, timestamp=timestamp) for detection in cached["detections"]]
+            annotated_jpeg = cached["image"]
+            REQUESTS.inc(endpoint='image', outcome='cache_hit')
+            if persist_result:
+                result_filename = cached["result_filename"]
+                if not result_filename or not os.path.exists(os.path.join(IMAGE_RESULT_FOLDER, result_filename)):
+                    result_filename = f"result_{os.path.splitext(unique_filename)[0]}.jpg"
+                    with open(os.path.join(IMAGE_RESULT_FOLDER, result_filename), 'wb') as result_file:
+                        result_file.write(annotated_jpeg)
+                    image_result_cache.set_result_filename(cache_key, cached, result_filename)
+        else:
+            # Decode the upload straight from the request stream
+            with STAGE_SECONDS.time(pipeline='image', stage='decode'):
+                image = decode_image(image_bytes)
+            if image is None:
+                REQUESTS.inc(endpoint='image', outcome='invalid')
+                return jsonify({"error": "Could not decode image"}), 400
+
+            # Process the image with YOLOv8, tile by tile in tiled mode
+            if tiled:
+                tiled_result, tiling_report = create_tiled_detector('image').detect(model, image, **IMAGE_INFERENCE_ARGS)
+                results = [tiled_result]
+            else:
+                results = model(image, verbose=False, **IMAGE_INFERENCE_ARGS)
+            REQUESTS.inc(endpoint='image', outcome='processed')
 
-            # Save the annotated image
-            result_filename = f"result_{unique_filename}"
-            result_path = os.path.join(IMAGE_RESULT_FOLDER, result_filename)
+            # Process detection results
+            if len(results) > 0:
+                result = results[0]  # Get the first result
+                observe_model_speed(result, 'image')
+                with STAGE_SECONDS.time(pipeline='image', stage='plot'):
+                    annotated_image = result.plot()
 
-            # Save the result image with annotations
-            result.save(result_path)
+                # Save the annotated image
+                if persist_result:
+                    result_filename = f"result_{unique_filename}"
+                    result_path = os.path.join(IMAGE_RESULT_FOLDER, result_filename)
+                    Image.fromarray(annotated_image[..., ::-1]).save(result_path)
 
-            # Extract detection information
-            for box in result.boxes:
-                # Get box coordinates
-                x1, y1, x2, y2 = box.xyxy[0].tolist()
+                if return_image or use_cache:
+                    with STAGE_SECONDS.time(pipeline='image', stage='jpeg_encode'):
+                        _, buffer = cv2.imencode('.jpg', annotated_image)
+                        annotated_jpeg = buffer.tobytes()
 
-                # Get confidence score
-                confidence = box.conf[0].item()
+                # Extract detection information
+                for box in result.boxes:
+                    # Get box coordinates
+                    x1, y1, x2, y2 = box.xyxy[0].tolist()
 
-                # Get class name
-                class_id = int(box.cls[0].item())
-                class_name = result.names[class_id]
+                    # Get confidence score
+                    confidence = box.conf[0].item()
 
-                detections.append({
-                    "class": class_name,
-                    "confidence": round(confidence, 2),
-                    "bbox": [round(x1), round(y1), round(x2), round(y2)],
-                    "timestamp": timestamp
-                })
+                    # Get class name
+                    class_id = int(box.cls[0].item())
+                    class_name = result.names[class_id]
+
+                    detections.append({
+                        "class": class_name,
+                        "confidence": round(confidence, 2),
+                        "bbox": [round(x1), round(y1), round(x2), round(y2)],
+                        "timestamp": timestamp
+                    })
+                    DETECTIONS.inc(pipeline='image', class_name=class_name)
+
+                if use_cache:
+                    image_result_cache.put(cache_key, detections, annotated_jpeg, result_filename)
+
+        if DETECTION_STORE_ENABLED and detections:
+            with STAGE_SECONDS.time(pipeline='image', stage='store'):
+                if g.user_id is not None:
+                    # Committed with the rows, so GET /api/detections only shows them to their owner
+                    db.session.add(JobOwner(id=image_job_id, user_id=g.user_id))
+                detection_writer = DetectionWriter(image_job_id, source='image')
+                detection_writer.add(detections)
+                detection_writer.flush()
+
+        if persist_upload:
+            with STAGE_SECONDS.time(pipeline='image', stage='upload_save'):
+                storage_manager.store(image_bytes, os.path.join(IMAGE_UPLOAD_FOLDER, unique_filename))
 
         # Return detection results with the path to the annotated image
-        return jsonify({
+        response = {
             "success": True,
+            "job_id": image_job_id,
             "filename": unique_filename,
             "result_filename": result_filename,
-            "result_path": f"/api/detect/results/image/{result_filename}",
+            "result_path": f"/api/detect/results/image/{result_filename}" if result_filename else None,
             "detections": detections,
+            "cached": cached is not None,
+            "tiling": tiling_report,
             "message": f"Detected {len(detections)} people"
-        })
+        }
+        if return_image:
+            with STAGE_SECONDS.time(pipeline='image', stage='base64_encode'):
+                response["image_base64"] = base64.b64encode(annotated_jpeg).decode('utf-8') if annotated_jpeg else None
+        return jsonify(response)
 
     except Exception as e:
+        REQUESTS.inc(endpoint='image', outcome='error')
         return jsonify({"error": f"Error processing image: {str(e)}"}), 500
 
+@detection_bp.route('/image/cache', methods=['GET'])
+@admit('image_cache')
+def image_cache_stats():
+    """Get hit/miss counters of the image detection cache"""
+    return jsonify(image_result_cache.stats())
+
+@detection_bp.route('/ready', methods=['GET'])
+def detection_ready():
+    """Readiness probe: 200 once the detection model is loaded and warmed up, 503 until then (or if that failed)"""
+    status = model.status()
+    if inference_workers is not None:
+        status['inference_workers'] = inference_workers.stats()
+    return jsonify(status), 200 if status['ready'] else 503
+
 @detection_bp.route('/video', methods=['POST'])
+@admit('video', limit='video', shed=video_backlog, quota=True)
 def detect_video():
     """Detect people in an uploaded video using YOLOv8 frame by frame with tracking and send per-frame results to a webhook"""
     if 'video' not in request.files:
@@ -178,6 +583,12 @@ def detect_video():
     if not session_id:
         return jsonify({"error": "No session_id provided for WebSocket communication"}), 400
 
+    try:
+        priority = user_priority(request.form.get('priority', 0))
+    except ValueError:
+        return jsonify({"error": "priority must be an integer"}), 400
+    tiled = parse_bool(request.form.get('tiled'), TILED_INFERENCE)
+
     try:
         # Secure the filename and generate a unique name
         filename = secure_filename(file.filename)
@@ -185,49 +596,190 @@ def detect_video():
         file_path = os.path.join(VIDEO_UPLOAD_FOLDER, unique_filename)
 
         # Save the uploaded file
-        file.save(file_path)
-
-        # Create result directory
-        result_filename = f"result_{unique_filename}"
-        result_dir = os.path.join(VIDEO_RESULT_FOLDER, result_filename.split('.')[0])
-        os.makedirs(result_dir, exist_ok=True)
-        socketio.emit(
-            "video_processing_started",
-            {
-                "filename": unique_filename,
-                "result_filename": f"{result_filename.split('.')[0]}.webm",
-                "session_id": session_id,
-                "message": "Video processing has started."
-            },
-            room=session_id
-        )
-        # Start background task for processing (SocketIO-managed for real-time emits)
-        socketio.start_background_task(
-            process_video_detection,
-            file_path, result_filename, result_dir, session_id, unique_filename
-        )
-
-        # Emit WebSocket message: processing started
+        with STAGE_SECONDS.time(pipeline='video', stage='upload_save'):
+            file.save(file_path)
+            storage_manager.dedupe(file_path)
 
+        job, result_filename = queue_video_job(session_id, unique_filename, file_path, priority, tiled, user_id=g.user_id)
 
         # Immediately return success response
         return jsonify({
             "success": True,
             "filename": unique_filename,
-            "result_filename": f"{result_filename.split('.')[0]}.webm",
+            "result_filename": video_result_name(result_filename),
+            "playlist_path": video_playlist_path(result_filename),
+            "job_id": job.job_id,
+            "queue_position": video_scheduler.position(job.job_id),
             "message": "Video uploaded successfully. Processing started."
         }), 200
 
     except Exception as e:
+        REQUESTS.inc(endpoint='video', outcome='error')
         return jsonify({"error": f"Error uploading video: {str(e)}"}), 500
 
-def process_video_detection(file_path, result_filename, result_dir, session_id, unique_filename):
-    """Background video detection logic for YOLOv8 video processing."""
+def queue_video_job(session_id, unique_filename, file_path, priority=0, tiled=None, job_id=None, user_id=None):
+    """
+    Persist a video job for an uploaded file (owned by `user_id`, if any), announce it to the session's room and queue it.
+
+    Pending changes of the caller's db session are committed with the job. Returns (ScheduledJob, result_filename).
+    """
+    # Create result directory
+    result_filename = f"result_{unique_filename}"
+    result_dir = os.path.join(VIDEO_RESULT_FOLDER, result_filename.split('.')[0])
+    os.makedirs(result_dir, exist_ok=True)
+    socketio.emit(
+        "video_processing_started",
+        {
+            "filename": unique_filename,
+            "result_filename": video_result_name(result_filename),
+            "playlist_path": video_playlist_path(result_filename),
+            "session_id": session_id,
+            "message": "Video processing has started."
+        },
+        room=session_id
+    )
+    # Persist the job first so it survives a restart, then queue it; the scheduler
+    # starts it as a SocketIO background task when a slot is free
+    video_job = VideoJob(
+        id=job_id or str(uuid.uuid4()),
+        session_id=session_id,
+        filename=unique_filename,
+        file_path=file_path,
+        result_filename=result_filename,
+        result_dir=result_dir,
+        priority=priority
+    )
+    db.session.add(video_job)
+    if user_id is not None:
+        db.session.add(JobOwner(id=video_job.id, user_id=user_id))
+    db.session.commit()
+    REQUESTS.inc(endpoint='video', outcome='queued')
+    job = video_scheduler.submit(
+        run_video_job,
+        (current_app._get_current_object(), video_job.id, tiled),
+        session_id=session_id,
+        priority=priority,
+        job_id=video_job.id
+    )
+    return job, result_filename
+
+def run_video_job(app, job_id, tiled=None):
+    """
+    Scheduled entry point: check out a pooled model and process a persisted job, resuming from its checkpoint.
+
+    `tiled` overrides TILED_INFERENCE for this run; jobs resumed after a restart use the default.
+    """
+    with app.app_context():
+        video_job = VideoJob.query.get(job_id)
+        if video_job is None or video_job.state in VideoJob.FINAL_STATES:
+            return
+        session_id = video_job.session_id
+        unique_filename = video_job.filename
+        resume = None
+        if video_job.last_frame > 0:
+            resume = {
+                "last_frame": video_job.last_frame,
+                "processed_frames": video_job.processed_frames,
+                "tracks": video_job.get_tracks()
+            }
+            print(f"Resuming video job {job_id} from frame {video_job.last_frame}")
+        # A job started before its chunked upload finished decodes the file as it grows
+        upload = UploadSession.query.filter_by(job_id=job_id, state='uploading').first()
+        growing_upload = upload_registry.track(upload.id, upload.received, upload.size) if upload else None
+        video_job.state = 'running'
+        db.session.commit()
+
+        def save_checkpoint(last_frame, processed_frames, tracks):
+            video_job.last_frame = last_frame
+            video_job.processed_frames = processed_frames
+            video_job.set_tracks(tracks)
+            db.session.commit()
+
+        try:
+            with video_model_pool.acquire() as job_model:
+                video_job.state = process_video_detection(
+                    video_job.file_path, video_job.result_filename, video_job.result_dir,
+                    session_id, unique_filename, job_model,
+                    resume=resume,
+                    on_checkpoint=save_checkpoint,
+                    tiled=tiled,
+                    job_id=job_id,
+                    upload=growing_upload,
+                    should_cancel=lambda: video_scheduler.is_cancel_requested(job_id)
+                )
+        except Exception as e:
+            print(f"Error starting video job: {str(e)}")
+            video_job.state = 'failed'
+            video_job.error = str(e)
+            socketio.emit("video_processing_error", {
+                "filename": unique_filename,
+                "error": str(e)
+            }, room=session_id)
+        db.session.commit()
+
+def resume_video_jobs(app):
+    """Re-queue video jobs that were queued or running when the server last stopped."""
+    if JOB_BROKER == 'database':
+        return 0  # Workers pick up unfinished jobs themselves, taking over expired claims
+    with app.app_context():
+        jobs = VideoJob.query.filter(
+            VideoJob.state.in_(VideoJob.RESUMABLE_STATES)
+        ).order_by(VideoJob.created_at).all()
+        for video_job in jobs:
+            video_job.state = 'queued'
+            db.session.commit()
+            video_scheduler.submit(
+                run_video_job,
+                (app, video_job.id),
+                session_id=video_job.session_id,
+                priority=video_job.priority,
+                job_id=video_job.id
+            )
+        if jobs:
+            print(f"Resumed {len(jobs)} unfinished video job(s)")
+        return len(jobs)
+
+def copy_partial_output(partial_path, out, max_frames):
+    """Copy up to max_frames already-annotated frames from an interrupted run into a new writer."""
+    copied = 0
+    partial = cv2.VideoCapture(partial_path)
+    try:
+        while copied < max_frames:
+            ret, frame = partial.read()
+            if not ret or frame is None:
+                break
+            out.write(frame)
+            copied += 1
+    finally:
+        partial.release()
+    return copied
+
+def process_video_detection(file_path, result_filename, result_dir, session_id, unique_filename, job_model=None,
+                            resume=None, on_checkpoint=None, should_cancel=None, tiled=None, job_id=None,
+                            upload=None):
+    """
+    Background video detection logic for YOLOv8 video processing.
+
+    `resume` ({"last_frame", "processed_frames", "tracks"}) continues an interrupted run from its
+    checkpoint, `on_checkpoint(last_frame, processed_frames, tracks)` is called every
+    VIDEO_CHECKPOINT_INTERVAL source frames and `should_cancel()` is polled between frames.
+    `tiled` enables sliced inference (default TILED_INFERENCE). With a `job_id`, detections and
+    track summaries are stored for GET /api/detections (needs an app context). `upload` (a
+    GrowingUpload) means the file is still being uploaded and is read as it grows.
+    Returns the final job state: 'completed', 'failed' or 'cancelled'.
+    """
+    if job_model is None:
+        job_model = model
     try:
+        import torch
         device = 'cuda' if torch.cuda.is_available() else 'cpu'
         print(f"Using device: {device}")
 
-        cap = cv2.VideoCapture(file_path)
+        if upload is not None:
+            cap = GrowingVideoReader(file_path, upload,
+                                     should_stop=lambda: should_cancel is not None and should_cancel())
+        else:
+            cap = cv2.VideoCapture(file_path)
         fps = cap.get(cv2.CAP_PROP_FPS)
         if not fps or fps <= 1:
             fps = 25.0
@@ -239,165 +791,382 @@ def process_video_detection(file_path, result_filename, result_dir, session_id,
         seconds = int(duration_seconds % 60)
         duration = f"00:{minutes:02d}:{seconds:02d}"
 
-        webm_output_path = os.path.join(result_dir, f"{result_filename.split('.')[0]}.webm")
-        fourcc = cv2.VideoWriter_fourcc(*'VP90')
-        out = cv2.VideoWriter(webm_output_path, fourcc, fps, (width, height))
-
-        unique_tracks = {}
-        frame_idx = 0
-        processed_frames = 0
+        output_name = result_filename.split('.')[0]
+        start_frame = resume["last_frame"] if resume else 0
+        # Compact per-track state (fixed-size box history); to_dict() is the checkpoint / API shape
+        unique_tracks = TrackStore.from_dict(resume["tracks"]) if resume else TrackStore()
+        processed_frames = resume["processed_frames"] if resume else 0
+        written_frames = 0
+        encoder_args = dict(
+            backend=VIDEO_ENCODER, codec=VIDEO_ENCODER_CODEC, preset=VIDEO_ENCODER_PRESET,
+            crf=VIDEO_ENCODER_CRF, threads=VIDEO_ENCODER_THREADS, scale=VIDEO_OUTPUT_SCALE,
+            ffmpeg_binary=FFMPEG_BINARY
+        )
+        if segmented_output(VIDEO_ENCODER, VIDEO_ENCODER_CODEC, VIDEO_SEGMENTED_OUTPUT):
+            out = SegmentedVideoWriter(result_dir, fps, (width, height), VIDEO_SEGMENT_SECONDS, **encoder_args)
+            if start_frame:
+                written_frames = out.restore(processed_frames)
+                print(f"Restored {written_frames} annotated frames from the interrupted run")
+        else:
+            partial_output_path = None
+            previous_output_path = find_video_output(result_dir, output_name) if start_frame else None
+            if previous_output_path:
+                # Keep the frames annotated before the interruption instead of re-running inference on them
+                partial_output_path = f"{previous_output_path}.partial"
+                os.replace(previous_output_path, partial_output_path)
+            out = create_video_writer(os.path.join(result_dir, output_name), fps, (width, height), **encoder_args)
+            if partial_output_path:
+                written_frames = copy_partial_output(partial_output_path, out, processed_frames)
+                os.remove(partial_output_path)
+                print(f"Restored {written_frames} annotated frames from the interrupted run")
+        if start_frame:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+        detection_writer = None
+        if DETECTION_STORE_ENABLED and job_id is not None:
+            detection_writer = DetectionWriter(job_id, 'video', DETECTION_STORE_BATCH_SIZE)
+            # Detections stored after the checkpoint are produced again by this run
+            detection_writer.discard_from(start_frame)
 
         print(f"Processing video: {frame_count} frames at {fps} FPS")
-        target_size = 480
-        frame_skip_interval = 2
-        time.sleep(1)
-        while True:
-            ret, frame = cap.read()
-            if not ret or frame is None:
-                break
-            # Enforce constant frame size and dtype to avoid optical flow size mismatches
-            if frame.shape[1] != width or frame.shape[0] != height:
-                frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_LINEAR)
-            if frame.dtype != np.uint8:
-                frame = frame.astype(np.uint8)
-            original_frame = frame.copy()
-            frame_idx += 1
-            if (frame_idx % frame_skip_interval) != 0:
-                continue
-            try:
+        skip_controller = AdaptiveFrameSkipController(
+            fps,
+            target_speed=VIDEO_TARGET_SPEED,
+            min_skip=VIDEO_MIN_FRAME_SKIP,
+            max_skip=VIDEO_MAX_FRAME_SKIP,
+            inference_sizes=VIDEO_INFERENCE_SIZES,
+            active_speed=VIDEO_ACTIVE_TARGET_SPEED,
+            start_frame=start_frame
+        )
+        batch_size = max(1, VIDEO_INFERENCE_BATCH_SIZE)
+        inference_time = 0.0
+        last_checkpoint_frame = start_frame
+        # Preview frames are rate-limited/downscaled per room and sent as binary attachments
+        preview_encoder = PreviewEncoder(session_id)
+        preview_channel = PreviewChannel(socketio, session_id, acks=JOB_BROKER != 'database')
+        # Tracker state belongs to this job only, so concurrent jobs keep independent track IDs
+        # A resumed job starts a fresh ByteTrack, so offset its IDs past the checkpointed ones
+        tracker = JobTracker(
+            "bytetrack.yaml",  # force ByteTrack (avoids optical flow size mismatch)
+            id_offset=unique_tracks.max_id()
+        )
+        # Sliced inference keeps per-tile motion state, so it also belongs to this job only
+        tiler = create_tiled_detector('video') if (TILED_INFERENCE if tiled is None else tiled) else None
+        # Frames that barely differ from the last inferred one reuse its detections instead of running the model
+        motion_gate = MotionGate(
+            min_changed_fraction=MOTION_GATE_MIN_CHANGED_FRACTION,
+            pixel_delta=MOTION_GATE_PIXEL_DELTA,
+            max_gated=MOTION_GATE_MAX_GATED
+        ) if MOTION_GATE_ENABLED else None
+        last_tracked_result = None
+        # One weapon_alert per confirmed weapon track instead of per-frame alerting on the client
+        alert_engine = create_alert_engine(session_id)
+
+        def decode_batches():
+            """Decoder stage: read frames, apply the adaptive skip and group them into inference batches."""
+            frame_idx = start_frame
+            # Frames waiting for the next batched forward pass: (frame_idx, original_frame, frame_for_infer, gated)
+            pending_frames = []
+            while True:
+                decode_started = time.perf_counter()
+                ret, frame = cap.read()
+                if not ret or frame is None:
+                    break
+                # Enforce constant frame size and dtype to avoid optical flow size mismatches
+                if frame.shape[1] != width or frame.shape[0] != height:
+                    frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_LINEAR)
+                if frame.dtype != np.uint8:
+                    frame = frame.astype(np.uint8)
+                STAGE_SECONDS.observe(time.perf_counter() - decode_started, pipeline='video', stage='decode')
+                FRAMES.inc(status='decoded')
+                frame_idx += 1
+                if not skip_controller.should_process(frame_idx):
+                    FRAMES.inc(status='skipped')
+                    continue
+                # Gated (unchanged) frames stay in order in the batch but skip the model
+                gated = motion_gate is not None and not motion_gate.should_infer(frame)
+                # Nothing downstream draws on the decoded frame (plot() copies it), so it is shared
+                # as the original instead of being copied; skipped frames are never touched
                 # Ensure contiguous memory to avoid OpenCV optical flow size/assert issues
-                frame_for_infer = np.ascontiguousarray(frame)
-                results = model.track(
-                    source=frame_for_infer,
-                    device=device,
-                    conf=0.6,
-                    imgsz=target_size,
-                    persist=True,
-                    tracker="bytetrack.yaml",  # force ByteTrack (avoids optical flow size mismatch)
-                    verbose=False
-                )
+                pending_frames.append((frame_idx, frame, np.ascontiguousarray(frame), gated))
+                if len(pending_frames) >= batch_size:
+                    yield pending_frames
+                    pending_frames = []
+            if pending_frames:
+                yield pending_frames
+
+        def run_batch(batch):
+            """Inference stage: run detection + ByteTrack on a batch and return the results in frame order."""
+            nonlocal inference_time, last_tracked_result
+            try:
+                infer_started = time.time()
+                # A list source is predicted as one batch; the job's tracker is then
+                # updated frame by frame, in list order, exactly as in the sequential path.
+                frames_for_infer = [frame_for_infer for _, _, frame_for_infer, gated in batch if not gated]
+                if not frames_for_infer:
+                    batch_results = []
+                elif tiler is not None:
+                    # Tiles of one frame form the batch; static tiles reuse their previous boxes
+                    batch_results = [
+                        tiler.detect(job_model, frame_for_infer, conf=0.6, imgsz=skip_controller.inference_size,
+                                     track_motion=True, device=device)[0]
+                        for frame_for_infer in frames_for_infer
+                    ]
+                else:
+                    batch_results = job_model.predict(
+                        source=frames_for_infer,
+                        device=device,
+                        conf=0.6,
+                        imgsz=skip_controller.inference_size,
+                        verbose=False
+                    )
+                tracked_results = []
+                reused = []
+                inferred = iter(batch_results)
+                for _, _, frame_for_infer, gated in batch:
+                    reused.append(gated and last_tracked_result is not None)
+                    if reused[-1]:
+                        # Nothing changed: keep the previous boxes and track IDs, leave the tracker as it is
+                        tracked_results.append(reuse_detections(last_tracked_result, frame_for_infer))
+                        continue
+                    result = next(inferred)
+                    observe_model_speed(result, 'video')
+                    with STAGE_SECONDS.time(pipeline='video', stage='tracking'):
+                        last_tracked_result = tracker.update(result, frame_for_infer)
+                    tracked_results.append(last_tracked_result)
+                batch_results = tracked_results
+                gated_frames = sum(1 for item in batch if item[3])
+                FRAMES.inc(len(batch) - gated_frames, status='processed')
+                if gated_frames:
+                    FRAMES.inc(gated_frames, status='gated')
+                batch_seconds = time.time() - infer_started
+                inference_time += batch_seconds
+                skip_controller.record_inference(batch_seconds, len(batch), batch[-1][0])
             except Exception as track_err:
-                print(f"Tracking error on frame {frame_idx}: {track_err}")
-                results = None
+                print(f"Tracking error on frames {batch[0][0]}-{batch[-1][0]}: {track_err}")
+                DROPPED_FRAMES.inc(len(batch), reason='inference_error')
+                batch_results = None
+            frame_results = []
+            for i, (frame_idx, original_frame, _, _) in enumerate(batch):
+                result = batch_results[i] if batch_results is not None and i < len(batch_results) else None
+                frame_results.append((frame_idx, original_frame, result, result is not None and reused[i]))
+            return frame_results
+
+        def annotate_frame(item):
+            """Annotator/encoder stage: draw, write the output video and JPEG-encode the preview."""
+            nonlocal written_frames, last_checkpoint_frame
+            frame_idx, original_frame, result, reused = item
+            checkpoint = None
+            if frame_idx - last_checkpoint_frame >= VIDEO_CHECKPOINT_INTERVAL:
+                # Snapshot on this thread, which owns unique_tracks, before the frame is applied
+                last_checkpoint_frame = frame_idx
+                checkpoint = (frame_idx - 1, written_frames, unique_tracks.to_dict())
             frame_detections = []
             # Compute timestamp once per frame so it is always defined
             frame_time = frame_idx / fps if fps else 0
             frame_minutes = int(frame_time // 60)
             frame_seconds = int(frame_time % 60)
             timestamp = f"00:{frame_minutes:02d}:{frame_seconds:02d}"
-            if results is not None and len(results) > 0:
-                result = results[0]
-                # annotated_frame = original_frame.copy()
-                annotated_frame = results[0].plot()
-                if result.boxes is not None:
-                    for box in result.boxes:
-                        x1, y1, x2, y2 = box.xyxy[0].tolist()
-                        confidence = box.conf[0].item()
-                        class_id = int(box.cls[0].item())
-                        class_name = result.names[class_id]
-                        track_id = None
-                        if hasattr(box, 'id') and box.id is not None:
-                            track_id = int(box.id[0].item())
-                        # cv2.rectangle(annotated_frame, (int(x1), int(y1)), (int(x2), int(y2)), (0, 255, 0), 2)
-                        if track_id is not None:
-                            label = f"{class_name} ID:{track_id}: {confidence:.2f}"
-                        else:
-                            label = f"{class_name}: {confidence:.2f}"
-                            label += " [P]"
-                        label_size = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 2)[0]
-                        # cv2.rectangle(annotated_frame, (int(x1), int(y1) - label_size[1] - 10),
-                        #             (int(x1) + label_size[0], int(y1)), (0, 255, 0), -1)
-                        # cv2.putText(annotated_frame, label, (int(x1), int(y1) - 5),
-                        #           cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 2)
-                        if track_id is not None:
-                            if track_id not in unique_tracks:
-                                unique_tracks[track_id] = {
-                                    "track_id": track_id,
-                                    "class": class_name,
-                                    "first_seen_frame": frame_idx,
-                                    "first_seen_timestamp": timestamp,
-                                    "last_seen_frame": frame_idx,
-                                    "last_seen_timestamp": timestamp,
-                                    "max_confidence": round(confidence, 2),
-                                    "detection_count": 1,
-                                    "bbox_history": [[int(x1), int(y1), int(x2), int(y2)]]
-                                }
-                            else:
-                                unique_tracks[track_id]["last_seen_frame"] = frame_idx
-                                unique_tracks[track_id]["last_seen_timestamp"] = timestamp
-                                unique_tracks[track_id]["max_confidence"] = max(
-                                    unique_tracks[track_id]["max_confidence"],
-                                    round(confidence, 2)
-                                )
-                                unique_tracks[track_id]["detection_count"] += 1
-                                unique_tracks[track_id]["bbox_history"].append([int(x1), int(y1), int(x2), int(y2)])
-                                if len(unique_tracks[track_id]["bbox_history"]) > 5:
-                                    unique_tracks[track_id]["bbox_history"] = unique_tracks[track_id]["bbox_history"][-5:]
-                        frame_detections.append({
-                            "class": class_name,
-                            "confidence": round(confidence, 2),
-                            "bbox": [round(x1), round(y1), round(x2), round(y2)],
-                            "track_id": track_id,
-                            "timestamp": timestamp,
-                            "frame": frame_idx
-                        })
+            written_frames += 1
+            if result is None:
+                with STAGE_SECONDS.time(pipeline='video', stage='video_write'):
+                    out.write(original_frame)
+                return [(frame_idx, None, checkpoint, None, [])]
+            weapon_tracked = False
+            tracked_boxes = ([], [], [], [])
+            # annotated_frame = original_frame.copy()
+            with STAGE_SECONDS.time(pipeline='video', stage='plot'):
+                annotated_frame = result.plot()
+            # One device-to-host copy per frame, then plain Python values for the payload
+            xyxy, confidences, class_ids, track_ids = result_arrays(result)
+            if len(xyxy):
+                class_names = [result.names[class_id] for class_id in class_ids.tolist()]
+                rounded_confidences = np.round(confidences, 2).tolist()
+                bboxes = np.rint(xyxy).astype(int).tolist()
+                ids = track_ids.tolist() if track_ids is not None else [None] * len(bboxes)
+                if track_ids is not None:
+                    weapon_tracked = any(is_weapon_class(class_name) for class_name in class_names)
+                    unique_tracks.update(frame_idx, timestamp, ids, class_names, rounded_confidences,
+                                         xyxy.astype(np.int32))
+                    tracked_boxes = (ids, class_names, rounded_confidences, bboxes)
+                for class_name, confidence, bbox, track_id in zip(class_names, rounded_confidences, bboxes, ids):
+                    frame_detections.append({
+                        "class": class_name,
+                        "confidence": confidence,
+                        "bbox": bbox,
+                        "track_id": track_id,
+                        "timestamp": timestamp,
+                        "frame": frame_idx
+                    })
+                    DETECTIONS.inc(pipeline='video', class_name=class_name)
+            # Called on every annotated frame, so alerts of tracks that vanished are closed on time; boxes carried
+            # over from the last inferred frame keep their tracks alive but do not count toward confirmation
+            alerts = alert_engine.update(frame_idx / fps, frame_idx, timestamp, *tracked_boxes, original_frame,
+                                         observed=not reused)
+            skip_controller.set_weapon_active(weapon_tracked)
+            with STAGE_SECONDS.time(pipeline='video', stage='video_write'):
                 out.write(annotated_frame)
-                _, buffer = cv2.imencode('.jpg', annotated_frame)
-                jpg_as_text = base64.b64encode(buffer).decode('utf-8')
-                payload = {
-                    "frame_index": frame_idx,
-                    "timestamp": timestamp,
-                    "image_base64": jpg_as_text,
-                    "detections": frame_detections
-                }
+            payload = {
+                "frame_index": frame_idx,
+                "timestamp": timestamp,
+                "detections": frame_detections
+            }
+            preview = preview_encoder.encode(annotated_frame)
+            return [(frame_idx, payload, checkpoint, preview, alerts)]
+
+        def annotate_and_measure(item):
+            """Annotate a frame and report its cost, so the frame skip follows the slowest stage."""
+            annotate_started = time.time()
+            output = annotate_frame(item)
+            skip_controller.record_stage("annotate", time.time() - annotate_started)
+            return output
+
+        # Decode, inference and annotate/encode each run on their own thread; emits stay on this one
+        pipeline = VideoPipeline(queue_size=VIDEO_PIPELINE_QUEUE_SIZE)
+        pipeline.source("decode", decode_batches())
+        pipeline.stage("inference", run_batch)
+        pipeline.stage("annotate", annotate_and_measure)
+
+        time.sleep(1)
+        processing_started = time.time()
+        pipeline.start()
+        last_progress_frame = start_frame
+        frame_idx = start_frame
+        cancelled = False
+        for frame_idx, payload, checkpoint, preview, alerts in pipeline.results(idle=socketio.sleep):
+            if should_cancel is not None and should_cancel():
+                cancelled = True
+                pipeline.stop()
+                break
+            if checkpoint is not None and on_checkpoint is not None:
+                if detection_writer is not None:
+                    # Rows of the frames a checkpoint covers must be stored before it is: a resumed job
+                    # only redoes the frames after it
+                    detection_writer.flush()
+                on_checkpoint(*checkpoint)
+            processed_frames += 1
+            if alerts:
+                emit_alerts(alerts, session_id, 'video', filename=unique_filename, job_id=job_id)
+            if payload is not None and detection_writer is not None and payload["detections"]:
+                with STAGE_SECONDS.time(pipeline='video', stage='store'):
+                    detection_writer.add(payload["detections"], frame_idx, frame_idx / fps)
+            if payload is not None:
+                emit_started = time.perf_counter()
+                # Detection JSON always goes out in full; the preview image may be dropped
                 socketio.emit("frame_detection", payload, room=session_id)
+                if preview is not None:
+                    jpeg_bytes, preview_width, preview_height = preview
+                    preview_channel.send({
+                        "frame_index": frame_idx,
+                        "timestamp": payload["timestamp"],
+                        "width": preview_width,
+                        "height": preview_height,
+                        "image": jpeg_bytes
+                    })
+                STAGE_SECONDS.observe(time.perf_counter() - emit_started, pipeline='video', stage='emit')
                 try:
                     # Yield to the event loop to flush the message to clients
                     socketio.sleep(0)
                 except Exception:
                     pass
-            else:
-                out.write(original_frame)
-            processed_frames += 1
-            if frame_idx % 30 == 0:
+            # The skip interval varies, so report whenever another 30 source frames have gone by
+            if frame_idx - last_progress_frame >= 30:
+                last_progress_frame = frame_idx
                 progress = (frame_idx / frame_count) * 100 if frame_count else 0
-                actual_processed = (frame_idx // frame_skip_interval) + (1 if frame_idx % frame_skip_interval > 0 else 0)
-                print(f"Processing progress: {progress:.1f}% ({frame_idx}/{frame_count} frames, {actual_processed} processed)")
+                controller_state = skip_controller.to_dict()
+                print(f"Processing progress: {progress:.1f}% ({frame_idx}/{frame_count} frames, {processed_frames} processed, "
+                      f"skip {controller_state['frameSkip']}, imgsz {controller_state['inferenceSize']})")
                 try:
                     socketio.emit("video_processing_progress", {
                         "progress": round(progress, 1),
                         "frame_index": frame_idx,
                         "processedFrames": processed_frames,
                         "totalFrames": frame_count,
-                        "session_id": session_id
+                        "session_id": session_id,
+                        "gatedFraction": motion_gate.to_dict()['gatedFraction'] if motion_gate is not None else None,
+                        "segmentsReady": len(out.segments) if isinstance(out, SegmentedVideoWriter) else None,
+                        **controller_state
                     }, room=session_id)
                     # Yield to ensure progress event is delivered promptly
                     socketio.sleep(0)
                 except Exception as _:
                     pass
+        if not cancelled and should_cancel is not None and should_cancel():
+            # Cancelled while no frame was in flight, e.g. while waiting for upload data
+            cancelled = True
+        elapsed = time.time() - processing_started
+        processing_fps = processed_frames / elapsed if elapsed > 0 else 0
+        inference_fps = processed_frames / inference_time if inference_time > 0 else 0
+        stage_timings = pipeline.timings()
+        print(f"Batch size {batch_size}: {processing_fps:.2f} frames/s end-to-end, "
+              f"{inference_fps:.2f} frames/s inference")
+        for stage_name, stage_stats in stage_timings.items():
+            print(f"  {stage_name}: {stage_stats}")
+        pipeline.join()
         cap.release()
         out.release()
+        emit_alerts(alert_engine.close_all(frame_idx / fps), session_id, 'video',
+                    filename=unique_filename, job_id=job_id)
+        if detection_writer is not None:
+            # Whatever was found before a cancellation stays queryable too
+            detection_writer.flush()
+            detection_writer.save_tracks(unique_tracks.to_dict(), fps)
+        if cancelled:
+            print(f"Video processing cancelled at frame {frame_idx}")
+            socketio.emit("video_processing_cancelled", {
+                "filename": unique_filename,
+                "frame_index": frame_idx,
+                "session_id": session_id
+            }, room=session_id)
+            return 'cancelled'
+        if on_checkpoint is not None:
+            on_checkpoint(frame_idx, processed_frames, unique_tracks.to_dict())
         print(f"Video processing completed. Processed {processed_frames} frames.")
         print(f"Total unique tracks found: {len(unique_tracks)}")
-        if not os.path.exists(webm_output_path):
-            raise Exception("Failed to create output video file")
-        file_size = os.path.getsize(webm_output_path)
-        print(f"Output video size: {file_size / (1024*1024):.2f} MB")
+        output_filename = None
+        if out.path is not None:
+            if not os.path.exists(out.path):
+                raise Exception("Failed to create output video file")
+            output_filename = result_video_name(output_name, VIDEO_ENCODER, VIDEO_ENCODER_CODEC,
+                                                isinstance(out, SegmentedVideoWriter))
+            output_size = sum(os.path.getsize(os.path.join(result_dir, filename)) for filename, _ in out.segments) \
+                if isinstance(out, SegmentedVideoWriter) else os.path.getsize(out.path)
+            print(f"Output video size: {output_size / (1024*1024):.2f} MB")
         socketio.emit("video_processing_complete", {
             "filename": unique_filename,
-            "result_filename": f"{result_filename.split('.')[0]}.webm",
-            "result_path": f"/api/detect/results/video/{result_filename.split('.')[0]}.webm",
+            "result_filename": output_filename,
+            "result_path": f"/api/detect/results/video/{output_filename}" if output_filename else None,
             "uniqueTracks": len(unique_tracks),
+            "batchSize": batch_size,
+            "processingFps": round(processing_fps, 2),
+            "inferenceFps": round(inference_fps, 2),
+            "stageTimings": stage_timings,
+            "adaptiveSkip": skip_controller.to_dict(),
+            "tiling": tiler.summary() if tiler is not None else None,
+            "motionGate": motion_gate.to_dict() if motion_gate is not None else None,
+            "alerts": alert_engine.to_dict(),
+            "upload": {"earlyStart": True, "reopens": cap.reopens} if upload is not None else None,
+            "encoder": {"backend": VIDEO_ENCODER, "codec": VIDEO_ENCODER_CODEC, **out.stats()},
+            "preview": {
+                **preview_channel.stats(),
+                "encoded": preview_encoder.encoded,
+                "rateLimited": preview_encoder.rate_limited
+            },
             "message": f"Processing complete. {len(unique_tracks)} unique tracks detected.",
             "session_id": session_id
         }, room=session_id)
+        return 'completed'
     except Exception as e:
         print(f"Error in background video processing: {str(e)}")
         try:
+            if 'pipeline' in locals():
+                pipeline.stop()
+                pipeline.join()
             if 'cap' in locals():
                 cap.release()
             if 'out' in locals():
                 out.release()
+            if locals().get('detection_writer') is not None:
+                detection_writer.flush()
         except:
             pass
         try:
@@ -407,3 +1176,4 @@ def process_video_detection(file_path, result_filename, result_dir, session_id,
             }, room=session_id)
         except:
             pass
+        return 'failed'
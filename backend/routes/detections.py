@@ -0,0 +1,129 @@
+from flask import Blueprint, jsonify, request, g
+from models import db
+from models.detection import Detection, Track
+from models.video_job import JobOwner
+from routes.detection import admit, owned_by_caller
+from utils.detection_store import parse_seconds
+
+# Create a Blueprint for querying stored detections
+detections_bp = Blueprint('detections', __name__)
+
+MAX_PER_PAGE = 1000
+
+
+def parse_filters():
+    """Read the shared query-string filters; raises ValueError with a message for bad values."""
+    filters = {}
+    for name, parse in (('min_confidence', float), ('max_confidence', float), ('track_id', int),
+                        ('start', parse_seconds), ('end', parse_seconds)):
+        value = request.args.get(name)
+        if value not in (None, ''):
+            try:
+                filters[name] = parse(value)
+            except ValueError:
+                raise ValueError(f"Invalid value for {name}: {value}")
+    classes = request.args.get('class')
+    if classes:
+        filters['classes'] = [name.strip() for name in classes.split(',') if name.strip()]
+    return filters
+
+
+def owned_jobs(job_id_column):
+    """Filter keeping rows of the caller's jobs (for anonymous callers, of jobs nobody owns)."""
+    if g.user_id is None:
+        return ~job_id_column.in_(db.session.query(JobOwner.id))
+    return job_id_column.in_(db.session.query(JobOwner.id).filter(JobOwner.user_id == g.user_id))
+
+
+def paginate(query):
+    """Page a query with ?page= and ?per_page= (at most MAX_PER_PAGE)."""
+    page = query.paginate(
+        page=request.args.get('page', 1, type=int),
+        per_page=request.args.get('per_page', 100, type=int),
+        max_per_page=MAX_PER_PAGE,
+        error_out=False
+    )
+    return {
+        "items": [item.to_dict() for item in page.items],
+        "page": page.page,
+        "per_page": page.per_page,
+        "total": page.total,
+        "pages": page.pages
+    }
+
+
+@detections_bp.route('/', methods=['GET'])
+@admit('detections')
+def get_detections():
+    """
+    Query stored detections, e.g. ?job_id=...&class=rifle&min_confidence=0.8&start=00:03:00&end=00:05:00.
+
+    Filters: job_id, source (video/image), class (comma-separated), min_confidence, max_confidence,
+    track_id, start and end (seconds or [HH:]MM:SS). Results are ordered by job, then time, and
+    limited to the caller's jobs.
+    """
+    try:
+        filters = parse_filters()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    query = Detection.query
+    if request.args.get('job_id'):
+        if not owned_by_caller(request.args['job_id']):
+            return jsonify({"error": "Job not found"}), 404
+        query = query.filter(Detection.job_id == request.args['job_id'])
+    else:
+        query = query.filter(owned_jobs(Detection.job_id))
+    if request.args.get('source'):
+        query = query.filter(Detection.source == request.args['source'])
+    if 'classes' in filters:
+        query = query.filter(Detection.class_name.in_(filters['classes']))
+    if 'min_confidence' in filters:
+        query = query.filter(Detection.confidence >= filters['min_confidence'])
+    if 'max_confidence' in filters:
+        query = query.filter(Detection.confidence <= filters['max_confidence'])
+    if 'track_id' in filters:
+        query = query.filter(Detection.track_id == filters['track_id'])
+    if 'start' in filters:
+        query = query.filter(Detection.seconds >= filters['start'])
+    if 'end' in filters:
+        query = query.filter(Detection.seconds <= filters['end'])
+    query = query.order_by(Detection.job_id, Detection.seconds, Detection.id)
+    return jsonify(paginate(query))
+
+
+@detections_bp.route('/tracks', methods=['GET'])
+@admit('detections')
+def get_tracks():
+    """
+    Query track summaries of video jobs.
+
+    Filters: job_id, class, min_confidence (on the track's best detection), track_id, and
+    start / end, which keep tracks visible at some point within the range. Limited to the caller's jobs.
+    """
+    try:
+        filters = parse_filters()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    query = Track.query
+    if request.args.get('job_id'):
+        if not owned_by_caller(request.args['job_id']):
+            return jsonify({"error": "Job not found"}), 404
+        query = query.filter(Track.job_id == request.args['job_id'])
+    else:
+        query = query.filter(owned_jobs(Track.job_id))
+    if 'classes' in filters:
+        query = query.filter(Track.class_name.in_(filters['classes']))
+    if 'min_confidence' in filters:
+        query = query.filter(Track.max_confidence >= filters['min_confidence'])
+    if 'max_confidence' in filters:
+        query = query.filter(Track.max_confidence <= filters['max_confidence'])
+    if 'track_id' in filters:
+        query = query.filter(Track.track_id == filters['track_id'])
+    if 'start' in filters:
+        query = query.filter(Track.last_seconds >= filters['start'])
+    if 'end' in filters:
+        query = query.filter(Track.first_seconds <= filters['end'])
+    query = query.order_by(Track.job_id, Track.first_seconds, Track.track_id)
+    return jsonify(paginate(query))
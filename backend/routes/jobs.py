@@ -0,0 +1,84 @@
+from flask import Blueprint, jsonify, request, g
+from models import db
+from models.video_job import VideoJob, JobOwner
+from routes.detection import video_scheduler, admit, owned_by_caller, user_priority
+from socketio_instance import socketio
+
+# Create a Blueprint for video job management
+jobs_bp = Blueprint('jobs', __name__)
+
+def job_to_dict(video_job):
+    """Serialize a job together with its live queue position."""
+    data = video_job.to_dict()
+    data['queue_position'] = video_scheduler.position(video_job.id)
+    return data
+
+@jobs_bp.route('/', methods=['GET'])
+@admit('jobs')
+def get_jobs():
+    """List the caller's video jobs, newest first, optionally filtered by ?state="""
+    query = VideoJob.query.outerjoin(JobOwner, JobOwner.id == VideoJob.id)
+    if g.user_id is None:
+        query = query.filter(JobOwner.user_id.is_(None))
+    else:
+        query = query.filter(JobOwner.user_id == g.user_id)
+    state = request.args.get('state')
+    if state:
+        query = query.filter_by(state=state)
+    jobs = query.order_by(VideoJob.created_at.desc()).all()
+    return jsonify([job_to_dict(video_job) for video_job in jobs])
+
+@jobs_bp.route('/<job_id>', methods=['GET'])
+@admit('jobs')
+def get_job(job_id):
+    """Get a specific video job"""
+    video_job = VideoJob.query.get(job_id)
+    if not video_job or not owned_by_caller(job_id):
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job_to_dict(video_job))
+
+@jobs_bp.route('/<job_id>/cancel', methods=['POST'])
+@admit('jobs')
+def cancel_job(job_id):
+    """Cancel a queued or running video job"""
+    video_job = VideoJob.query.get(job_id)
+    if not video_job or not owned_by_caller(job_id):
+        return jsonify({"error": "Job not found"}), 404
+    if video_job.state in VideoJob.FINAL_STATES:
+        return jsonify({"error": f"Job is already {video_job.state}"}), 400
+
+    was_running = video_scheduler.position(job_id) == 0
+    video_scheduler.cancel(job_id)
+    if not was_running:
+        # Queued jobs are dropped at once; running jobs stop at their next frame and record it themselves
+        video_job.state = 'cancelled'
+        db.session.commit()
+        socketio.emit("video_processing_cancelled", {
+            "filename": video_job.filename,
+            "frame_index": video_job.last_frame,
+            "session_id": video_job.session_id
+        }, room=video_job.session_id)
+    return jsonify({"message": "Cancellation requested" if was_running else "Job cancelled", "job": job_to_dict(video_job)})
+
+@jobs_bp.route('/<job_id>', methods=['PATCH'])
+@admit('jobs')
+def update_job(job_id):
+    """Change the priority of a video job (higher runs sooner, up to VIDEO_MAX_USER_PRIORITY)"""
+    video_job = VideoJob.query.get(job_id)
+    if not video_job or not owned_by_caller(job_id):
+        return jsonify({"error": "Job not found"}), 404
+
+    data = request.get_json()
+    if not data or 'priority' not in data:
+        return jsonify({"error": "Missing required fields: priority"}), 400
+    try:
+        priority = user_priority(data['priority'])
+    except (TypeError, ValueError):
+        return jsonify({"error": "priority must be an integer"}), 400
+    if video_job.state in VideoJob.FINAL_STATES:
+        return jsonify({"error": f"Job is already {video_job.state}"}), 400
+
+    video_job.priority = priority
+    db.session.commit()
+    video_scheduler.reprioritize(job_id, priority)
+    return jsonify(job_to_dict(video_job))
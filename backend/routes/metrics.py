@@ -0,0 +1,10 @@
+from flask import Blueprint, Response
+from utils.metrics import REGISTRY
+
+# Create a Blueprint for the Prometheus scrape endpoint
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Expose detection timings, counters and gauges in the Prometheus text format"""
+    return Response(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,19 @@
+from flask import Blueprint, jsonify
+from routes.detection import storage_manager, admit
+
+# Create a Blueprint for storage usage and retention
+storage_bp = Blueprint('storage', __name__)
+
+
+@storage_bp.route('/', methods=['GET'])
+@admit('storage')
+def get_storage_usage():
+    """Disk used by uploads and results, their limits, deduplication savings and the last sweep"""
+    return jsonify(storage_manager.usage())
+
+
+@storage_bp.route('/sweep', methods=['POST'])
+@admit('storage')
+def sweep_storage():
+    """Apply the storage size and age limits now instead of at the next scheduled sweep"""
+    return jsonify(storage_manager.sweep())
@@ -0,0 +1,254 @@
+from flask import Blueprint, jsonify, request, g
+from werkzeug.utils import secure_filename
+import os
+import time
+import numpy as np
+from config import (
+    VIDEO_UPLOAD_FOLDER, MAX_LIVE_STREAMS, STREAM_MAX_LATENCY, STREAM_INFERENCE_SIZE,
+    STREAM_RECONNECT_DELAY, STREAM_MAX_RECONNECT_DELAY, STREAM_MAX_RECONNECTS
+)
+from socketio_instance import socketio
+from routes.detection import create_model, is_weapon_class, observe_model_speed, create_alert_engine, emit_alerts, admit, storage_manager
+from utils.helpers import parse_bool
+from utils.job_scheduler import ModelPool
+from utils.live_stream import LatestFrameReader, StreamSession, parse_stream_source
+from utils.tracking import JobTracker
+from utils.track_store import result_arrays
+from utils.video_pipeline import VideoPipeline
+from utils.preview_stream import PreviewEncoder, PreviewChannel
+from utils.metrics import STAGE_SECONDS, FRAMES, DROPPED_FRAMES, DETECTIONS
+
+# Create a Blueprint for live stream sessions
+streams_bp = Blueprint('streams', __name__)
+
+# Network sources a stream may be opened from; anything else must be a device index or an uploaded file
+STREAM_URL_SCHEMES = ('rtsp://', 'rtsps://', 'rtmp://', 'http://', 'https://', 'udp://', 'tcp://')
+
+# Live streams get their own model instances so they never compete with queued video jobs
+stream_model_pool = ModelPool(create_model, MAX_LIVE_STREAMS)
+
+# Stream sessions by stream_id (kept after they stop so their final status can still be read)
+stream_sessions = {}
+MAX_FINISHED_STREAMS = 50
+ACTIVE_STREAM_STATES = ('starting', 'running')
+
+
+def active_streams():
+    return [stream for stream in stream_sessions.values() if stream.state in ACTIVE_STREAM_STATES]
+
+
+# Uploaded videos played back as a camera must outlive the storage sweep while their stream runs
+storage_manager.add_pin_provider(
+    lambda: [stream.reader.source for stream in active_streams() if stream.reader.is_file]
+)
+
+
+def forget_finished_streams():
+    """Keep only the most recent finished sessions."""
+    finished = sorted(
+        (stream for stream in stream_sessions.values() if stream.state not in ACTIVE_STREAM_STATES),
+        key=lambda stream: stream.started_at
+    )
+    for stream in finished[:-MAX_FINISHED_STREAMS]:
+        stream_sessions.pop(stream.stream_id, None)
+
+
+@streams_bp.route('/', methods=['GET'])
+@admit('stream')
+def get_streams():
+    """List the caller's stream sessions"""
+    return jsonify([stream.to_dict() for stream in stream_sessions.values() if stream.user_id == g.user_id])
+
+
+@streams_bp.route('/', methods=['POST'])
+@admit('stream')
+def start_stream():
+    """Start detecting on a live source: {"session_id", "source": URL or device index} or {"session_id", "file", "loop"}"""
+    data = request.get_json(silent=True) or {}
+    session_id = data.get('session_id')
+    if not session_id:
+        return jsonify({"error": "No session_id provided for WebSocket communication"}), 400
+
+    if data.get('file'):
+        # An uploaded video played back at its native FPS stands in for a camera
+        filename = secure_filename(data['file'])
+        source = os.path.join(VIDEO_UPLOAD_FOLDER, filename)
+        if not filename or not os.path.isfile(source):
+            return jsonify({"error": "Video file not found"}), 404
+        reader = LatestFrameReader(source, is_file=True, loop=parse_bool(data.get('loop'), False))
+        display_source = filename
+    elif data.get('source') is not None:
+        source = parse_stream_source(data['source'])
+        if not isinstance(source, int) and not source.lower().startswith(STREAM_URL_SCHEMES):
+            return jsonify({"error": f"source must be a device index or a {', '.join(STREAM_URL_SCHEMES)} URL"}), 400
+        reader = LatestFrameReader(
+            source,
+            reconnect_delay=STREAM_RECONNECT_DELAY,
+            max_reconnect_delay=STREAM_MAX_RECONNECT_DELAY,
+            max_reconnects=STREAM_MAX_RECONNECTS
+        )
+        display_source = str(source)
+    else:
+        return jsonify({"error": "Provide a stream source or an uploaded video file"}), 400
+
+    if len(active_streams()) >= MAX_LIVE_STREAMS:
+        return jsonify({"error": f"At most {MAX_LIVE_STREAMS} live streams can run at once"}), 429
+
+    forget_finished_streams()
+    stream = StreamSession(session_id, source, reader, display_source, user_id=g.user_id)
+    stream_sessions[stream.stream_id] = stream
+    reader.start()
+    socketio.start_background_task(run_stream_session, stream)
+    return jsonify({"success": True, **stream.to_dict()}), 201
+
+
+@streams_bp.route('/<stream_id>', methods=['GET'])
+@admit('stream')
+def get_stream(stream_id):
+    """Get the status of a stream session"""
+    stream = stream_sessions.get(stream_id)
+    if not stream or stream.user_id != g.user_id:
+        return jsonify({"error": "Stream not found"}), 404
+    return jsonify(stream.to_dict())
+
+
+@streams_bp.route('/<stream_id>/stop', methods=['POST'])
+@admit('stream')
+def stop_stream(stream_id):
+    """Stop a stream session"""
+    stream = stream_sessions.get(stream_id)
+    if not stream or stream.user_id != g.user_id:
+        return jsonify({"error": "Stream not found"}), 404
+    stream.request_stop()
+    return jsonify({"success": True, **stream.to_dict()})
+
+
+def run_stream_session(stream):
+    """
+    Background task: detect and track on the newest frame of a live source until it is stopped.
+
+    The reader thread keeps only the latest frame, a single inference thread takes whatever
+    is newest when it is free (dropping frames older than STREAM_MAX_LATENCY), and results
+    are emitted to the session's room from this green thread.
+    """
+    reader = stream.reader
+    session_id = stream.session_id
+    try:
+        with stream_model_pool.acquire() as stream_model:
+            tracker = JobTracker("bytetrack.yaml")
+            preview_encoder = PreviewEncoder(session_id)
+            preview_channel = PreviewChannel(socketio, session_id)
+            alert_engine = create_alert_engine(session_id)
+
+            def latest_frames():
+                """Source stage: newest frames from the reader, plus reader state changes."""
+                last_seq = 0
+                last_state = None
+                while not stream.stop_requested:
+                    if reader.state != last_state:
+                        last_state = reader.state
+                        yield ('status', reader.stats())
+                    latest = reader.read_latest(last_seq, timeout=0.5)
+                    if latest is None:
+                        if reader.finished:
+                            yield ('status', reader.stats())
+                            break
+                        continue
+                    last_seq = latest[0]
+                    yield ('frame',) + latest
+
+            def detect_frame(item):
+                """Inference stage: detect, track and annotate one frame unless it is already too old."""
+                if item[0] == 'status':
+                    return [item]
+                _, seq, frame, captured_at = item
+                if time.time() - captured_at > STREAM_MAX_LATENCY:
+                    stream.frames_late += 1
+                    DROPPED_FRAMES.inc(reason='stream_late')
+                    return []
+                result = stream_model.predict(frame, conf=0.6, imgsz=STREAM_INFERENCE_SIZE, verbose=False)[0]
+                observe_model_speed(result, 'stream')
+                with STAGE_SECONDS.time(pipeline='stream', stage='tracking'):
+                    result = tracker.update(result, frame)
+                with STAGE_SECONDS.time(pipeline='stream', stage='plot'):
+                    annotated_frame = result.plot()
+                detections = []
+                xyxy, confidences, class_ids, track_ids = result_arrays(result)
+                class_names = [result.names[class_id] for class_id in class_ids.tolist()]
+                ids = track_ids.tolist() if track_ids is not None else [None] * len(class_names)
+                weapon_detected = any(is_weapon_class(class_name) for class_name in class_names)
+                for class_name, confidence, bbox, track_id in zip(
+                        class_names, np.round(confidences, 2).tolist(), np.rint(xyxy).astype(int).tolist(), ids):
+                    detections.append({
+                        "class": class_name,
+                        "confidence": confidence,
+                        "bbox": bbox,
+                        "track_id": track_id,
+                        "frame": seq
+                    })
+                    DETECTIONS.inc(pipeline='stream', class_name=class_name)
+                alerts = alert_engine.update(captured_at, seq, captured_at, ids, class_names,
+                                             [detection["confidence"] for detection in detections],
+                                             [detection["bbox"] for detection in detections], frame)
+                FRAMES.inc(status='processed')
+                payload = {
+                    "stream_id": stream.stream_id,
+                    "frame_index": seq,
+                    "timestamp": captured_at,
+                    "weapon_detected": weapon_detected,
+                    "detections": detections
+                }
+                return [('frame', captured_at, payload, preview_encoder.encode(annotated_frame), alerts)]
+
+            # A queue size of 1 keeps at most one frame waiting between stages, bounding latency
+            pipeline = VideoPipeline(queue_size=1)
+            pipeline.source("capture", latest_frames())
+            pipeline.stage("inference", detect_frame)
+            pipeline.start()
+            stream.state = 'running'
+            for item in pipeline.results(idle=socketio.sleep):
+                if stream.stop_requested:
+                    pipeline.stop()
+                    break
+                if item[0] == 'status':
+                    socketio.emit("stream_status", {**stream.to_dict(), "reader": item[1]}, room=session_id)
+                    continue
+                _, captured_at, payload, preview, alerts = item
+                latency = time.time() - captured_at
+                stream.frames_processed += 1
+                stream.detections += len(payload["detections"])
+                stream.last_latency = latency
+                stream.total_latency += latency
+                payload["latencyMs"] = round(latency * 1000, 1)
+                with STAGE_SECONDS.time(pipeline='stream', stage='emit'):
+                    emit_alerts(alerts, session_id, 'stream', stream_id=stream.stream_id)
+                    socketio.emit("frame_detection", payload, room=session_id)
+                    if preview is not None:
+                        jpeg_bytes, preview_width, preview_height = preview
+                        preview_channel.send({
+                            "stream_id": stream.stream_id,
+                            "frame_index": payload["frame_index"],
+                            "width": preview_width,
+                            "height": preview_height,
+                            "image": jpeg_bytes
+                        })
+                socketio.sleep(0)
+            pipeline.join()
+            emit_alerts(alert_engine.close_all(time.time()), session_id, 'stream', stream_id=stream.stream_id)
+        if stream.stop_requested:
+            stream.state = 'stopped'
+        elif reader.state == 'failed':
+            stream.state = 'failed'
+            stream.error = reader.error
+        else:
+            stream.state = 'ended'  # A file played back without looping reached its end
+    except Exception as e:
+        print(f"Error in live stream {stream.stream_id}: {str(e)}")
+        stream.state = 'failed'
+        stream.error = str(e)
+    finally:
+        reader.stop()
+        stream.stopped_at = time.time()
+        print(f"Live stream {stream.stream_id} {stream.state}: {stream.frames_processed} frames processed, "
+              f"{reader.frames_dropped} stale frames dropped, {stream.frames_late} late frames dropped")
+        socketio.emit("stream_status", stream.to_dict(), room=session_id)
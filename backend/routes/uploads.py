@@ -0,0 +1,217 @@
+from flask import Blueprint, jsonify, request, g
+from werkzeug.exceptions import ClientDisconnected
+from werkzeug.utils import secure_filename
+import os
+import uuid
+import threading
+from config import (
+    VIDEO_UPLOAD_FOLDER, UPLOAD_CHUNK_SIZE, UPLOAD_MAX_BYTES,
+    UPLOAD_EARLY_START, UPLOAD_EARLY_START_BYTES, TILED_INFERENCE
+)
+from models import db
+from models.upload import UploadSession
+from models.video_job import VideoJob, JobOwner
+from routes.detection import (
+    allowed_video_file, queue_video_job, upload_registry, video_scheduler,
+    video_result_name, video_playlist_path, admit, video_backlog, storage_manager, owned_by_caller, user_priority
+)
+from utils.chunked_upload import is_streamable
+from utils.helpers import parse_bool
+from utils.metrics import STAGE_SECONDS, REQUESTS
+
+# Create a Blueprint for chunked, resumable video uploads
+uploads_bp = Blueprint('uploads', __name__)
+
+# One chunk at a time per upload; concurrent requests for the same upload are refused
+upload_locks = {}
+
+READ_BLOCK_SIZE = 1024 * 1024
+
+
+def maybe_start_job(upload):
+    """
+    Queue the detection job once the file is complete, or as soon as its container can be decoded
+    while it grows. Returns the response fields of a newly queued job, or None.
+    """
+    if upload.job_id is not None:
+        if upload.state != 'complete':
+            return None  # The early job reads the rest as it arrives
+        video_job = VideoJob.query.get(upload.job_id)
+        if video_job is None or video_job.state != 'failed':
+            return None
+        # The early job gave up (e.g. the upload stalled): start over on the complete file
+        upload.early_start = False
+    elif upload.state != 'complete':
+        if not UPLOAD_EARLY_START or upload.received < min(UPLOAD_EARLY_START_BYTES, upload.size):
+            return None
+        if upload.streamable is None:
+            upload.streamable = is_streamable(upload.file_path, upload.filename.rsplit('.', 1)[1], upload.received)
+        if not upload.streamable:
+            return None
+        upload.early_start = True
+    # Linked before the job is queued, so the job finds its upload still in progress
+    upload.job_id = str(uuid.uuid4())
+    owner = JobOwner.query.get(upload.id)
+    job, result_filename = queue_video_job(upload.session_id, upload.unique_filename, upload.file_path,
+                                           upload.priority, upload.tiled, job_id=upload.job_id,
+                                           user_id=owner.user_id if owner else None)
+    return {
+        "job_id": job.job_id,
+        "result_filename": video_result_name(result_filename),
+        "playlist_path": video_playlist_path(result_filename),
+        "queue_position": video_scheduler.position(job.job_id)
+    }
+
+
+@uploads_bp.route('/', methods=['POST'])
+@admit('upload', limit='video', shed=video_backlog, quota=True)
+def create_upload():
+    """
+    Start a chunked upload. JSON body: filename, size (bytes), session_id, optional priority and tiled.
+
+    Chunks are then sent with PATCH /api/uploads/<upload_id>; GET returns the offset to resume from.
+    """
+    data = request.get_json(silent=True) or {}
+    filename = data.get('filename') or ''
+    session_id = data.get('session_id')
+    if not filename:
+        return jsonify({"error": "No filename provided"}), 400
+    if not allowed_video_file(filename):
+        return jsonify({"error": "File type not allowed. Please upload a video file (mp4, avi, mov, mkv)"}), 400
+    if not session_id:
+        return jsonify({"error": "No session_id provided for WebSocket communication"}), 400
+    try:
+        size = int(data.get('size'))
+        priority = user_priority(data.get('priority', 0))
+    except (TypeError, ValueError):
+        return jsonify({"error": "size and priority must be integers"}), 400
+    if size <= 0:
+        return jsonify({"error": "size must be positive"}), 400
+    if size > UPLOAD_MAX_BYTES:
+        return jsonify({"error": f"File too large (max {UPLOAD_MAX_BYTES // (1024 * 1024)} MB)"}), 413
+
+    filename = secure_filename(filename)
+    unique_filename = f"{uuid.uuid4()}_{filename}"
+    file_path = os.path.join(VIDEO_UPLOAD_FOLDER, unique_filename)
+    open(file_path, 'wb').close()
+    upload = UploadSession(
+        id=str(uuid.uuid4()),
+        session_id=session_id,
+        filename=filename,
+        unique_filename=unique_filename,
+        file_path=file_path,
+        size=size,
+        priority=priority,
+        tiled=parse_bool(data.get('tiled'), TILED_INFERENCE)
+    )
+    db.session.add(upload)
+    if g.user_id is not None:
+        db.session.add(JobOwner(id=upload.id, user_id=g.user_id))
+    db.session.commit()
+    REQUESTS.inc(endpoint='upload', outcome='created')
+    return jsonify({**upload.to_dict(), "chunk_size": UPLOAD_CHUNK_SIZE}), 201
+
+
+@uploads_bp.route('/<upload_id>', methods=['GET'])
+@admit('upload')
+def get_upload(upload_id):
+    """Get an upload's state and the offset the next chunk must start at"""
+    upload = UploadSession.query.get(upload_id)
+    if not upload or not owned_by_caller(upload_id):
+        return jsonify({"error": "Upload not found"}), 404
+    return jsonify({**upload.to_dict(), "chunk_size": UPLOAD_CHUNK_SIZE})
+
+
+@uploads_bp.route('/<upload_id>', methods=['PATCH'])
+@admit('upload')
+def upload_chunk(upload_id):
+    """
+    Append a chunk: the raw bytes are the request body, the Upload-Offset header is where they start.
+
+    The offset must equal the upload's current offset (409 with the expected offset otherwise).
+    If the connection drops mid-chunk, the bytes that arrived are kept and GET tells where to resume.
+    """
+    upload = UploadSession.query.get(upload_id)
+    if not upload or not owned_by_caller(upload_id):
+        return jsonify({"error": "Upload not found"}), 404
+    if upload.state != 'uploading':
+        return jsonify({"error": f"Upload is already {upload.state}", "offset": upload.received}), 409
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+    except ValueError:
+        return jsonify({"error": "Missing or invalid Upload-Offset header"}), 400
+    if offset != upload.received:
+        return jsonify({"error": "Offset does not match the upload", "offset": upload.received}), 409
+
+    lock = upload_locks.setdefault(upload_id, threading.Lock())
+    if not lock.acquire(blocking=False):
+        return jsonify({"error": "Another chunk of this upload is being received", "offset": upload.received}), 409
+    try:
+        received = offset
+        disconnected = False
+        with STAGE_SECONDS.time(pipeline='video', stage='upload_chunk'):
+            with open(upload.file_path, 'r+b') as f:
+                f.seek(offset)
+                try:
+                    while True:
+                        block = request.stream.read(READ_BLOCK_SIZE)
+                        if not block:
+                            break
+                        if received + len(block) > upload.size:
+                            f.truncate(offset)
+                            return jsonify({"error": "Chunk runs past the declared size", "offset": offset}), 400
+                        f.write(block)
+                        received += len(block)
+                except ClientDisconnected:
+                    disconnected = True
+                # Drop anything past the new offset, e.g. bytes written before a restart but never recorded
+                f.truncate(received)
+        upload.received = received
+        growing_upload = upload_registry.track(upload.id, upload.received, upload.size)
+        if received >= upload.size:
+            upload.state = 'complete'
+        job = maybe_start_job(upload)
+        db.session.commit()
+        growing_upload.advance(received)
+        if upload.state == 'complete':
+            upload_registry.discard(upload.id)
+            upload_locks.pop(upload_id, None)
+            # A job that started early keeps reading the file it has open
+            storage_manager.dedupe(upload.file_path)
+            REQUESTS.inc(endpoint='upload', outcome='complete')
+        if disconnected:
+            return jsonify({"error": "Connection lost during the chunk", "offset": received}), 400
+        return jsonify({**upload.to_dict(), "job": job})
+    finally:
+        lock.release()
+
+
+@uploads_bp.route('/<upload_id>', methods=['DELETE'])
+@admit('upload')
+def abort_upload(upload_id):
+    """Abort an upload, cancel a job that started on it early and delete the partial file"""
+    upload = UploadSession.query.get(upload_id)
+    if not upload or not owned_by_caller(upload_id):
+        return jsonify({"error": "Upload not found"}), 404
+    if upload.state != 'uploading':
+        return jsonify({"error": f"Upload is already {upload.state}"}), 400
+    upload.state = 'aborted'
+    db.session.commit()
+    if upload.job_id is not None:
+        was_running = video_scheduler.position(upload.job_id) == 0
+        video_scheduler.cancel(upload.job_id)
+        video_job = VideoJob.query.get(upload.job_id)
+        if not was_running and video_job is not None and video_job.state not in VideoJob.FINAL_STATES:
+            # Running jobs stop by themselves once the upload is aborted
+            video_job.state = 'cancelled'
+            db.session.commit()
+    growing_upload = upload_registry.get(upload_id)
+    if growing_upload is not None:
+        growing_upload.abort()
+        upload_registry.discard(upload_id)
+    upload_locks.pop(upload_id, None)
+    if upload.job_id is None and os.path.exists(upload.file_path):
+        # An early-started job still has the file open; it is left in place for that job
+        os.remove(upload.file_path)
+    REQUESTS.inc(endpoint='upload', outcome='aborted')
+    return jsonify({"message": "Upload aborted", "upload": upload.to_dict()})
@@ -1,8 +1,18 @@
 from flask_socketio import SocketIO, emit, join_room, leave_room
 from flask import request
+from utils.preview_stream import set_preview_settings
+from utils.sqlite_pubsub import SQLitePubSubManager
 
 socketio = SocketIO(cors_allowed_origins="*", async_mode="eventlet", logger=False, engineio_logger=False)
 
+def message_queue_options(url):
+    """init_app() arguments that connect this process to the Socket.IO message queue at `url`, if any"""
+    if not url:
+        return {}
+    if url.startswith('sqlite:///'):
+        return {"client_manager": SQLitePubSubManager(url)}
+    return {"message_queue": url}
+
 @socketio.on("connect")
 def on_connect():
     print("Client connected", request.sid)
@@ -32,3 +42,17 @@ def on_room_msg(data):
     room = data.get("room")
     msg = data.get("text", "")
     emit("room_msg", {"text": msg, "room": room}, room=room)
+
+@socketio.on("preview_settings")
+def on_preview_settings(data):
+    # data: {"room": session_id, "max_width": int, "quality": int, "fps": float}
+    room = data.get("room")
+    if not room:
+        emit("server_message", {"text": "preview_settings requires a room"})
+        return
+    try:
+        settings = set_preview_settings(room, data.get("max_width"), data.get("quality"), data.get("fps"))
+    except (TypeError, ValueError):
+        emit("server_message", {"text": "Invalid preview settings"})
+        return
+    emit("preview_settings", {"room": room, **settings})
@@ -0,0 +1,47 @@
+import os
+import sys
+import uuid
+import tempfile
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# config reads the environment when it is first imported: point storage and the database at a scratch
+# directory, queue video jobs in the database instead of running them, and keep the model unloaded
+TEST_ROOT = tempfile.mkdtemp(prefix='backend-tests-')
+os.environ.update(
+    STORAGE_ROOT=TEST_ROOT,
+    DATABASE_URL=f"sqlite:///{os.path.join(TEST_ROOT, 'test.db')}",
+    JOB_BROKER='database',
+    INFERENCE_WORKERS='0',
+    MODEL_WARMUP='false',
+    STORAGE_SWEEP_INTERVAL='0',
+    DETECTION_AUTH_REQUIRED='true',
+    RATE_LIMIT_VIDEO_PER_MINUTE='0',
+    MAX_ACTIVE_JOBS_PER_USER='0'
+)
+
+
+@pytest.fixture(scope='session')
+def app():
+    import app as app_module
+    return app_module.app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def login(client):
+    """login() registers a new user and returns (user_id, Authorization headers)."""
+    def login():
+        username = f"user-{uuid.uuid4().hex[:8]}"
+        client.post('/api/auth/register', json={
+            'username': username, 'email': f"{username}@example.com", 'password': 'secret', 'mobile': '0'
+        })
+        data = client.post('/api/auth/login', json={'username': username, 'password': 'secret'}).get_json()
+        return data['user']['id'], {'Authorization': f"Bearer {data['token']}"}
+    return login
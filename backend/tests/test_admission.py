@@ -0,0 +1,154 @@
+import time
+import uuid
+import jwt
+import pytest
+from jwt import ExpiredSignatureError
+from models import db
+from models.video_job import VideoJob, JobOwner
+from routes import detection
+from utils import admission
+from utils.admission import TokenBucket, RateLimiter, LoadShedder, TokenCache
+from utils.jwt_utils import signing_key
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(admission, 'time', clock)
+    return clock
+
+
+def test_token_bucket_allows_a_burst_then_refills(clock):
+    bucket = TokenBucket(rate=2.0, burst=3)
+    assert [bucket.take() for _ in range(3)] == [0, 0, 0]
+    assert bucket.take() == pytest.approx(0.5)
+    clock.now += 0.5
+    assert bucket.take() == 0 and not bucket.full()
+    clock.now += 10
+    assert bucket.full()
+
+
+def test_rate_limiter_keeps_a_bucket_per_user(clock):
+    limiter = RateLimiter(per_minute=60, burst=1)
+    assert limiter.take('alice') == 0
+    assert limiter.take('alice') == pytest.approx(1.0)
+    assert limiter.take('bob') == 0
+    assert RateLimiter(per_minute=0, burst=1).take('alice') == 0  # 0 is unlimited
+
+
+def test_shedder_refuses_while_too_many_requests_are_in_flight(clock):
+    shedder = LoadShedder(max_inflight=2)
+    with shedder.track():
+        assert shedder.overloaded() is None
+        with shedder.track():
+            assert shedder.overloaded() == 'inflight'
+    assert shedder.overloaded() is None
+
+
+def test_shedder_refuses_while_recent_latency_is_high_until_the_window_passes(clock):
+    shedder = LoadShedder(max_latency=1.0, window=10.0, min_samples=5)
+    for duration in (0.1, 2.0, 2.0, 2.0, 2.0):
+        with shedder.track():
+            clock.now += duration
+    assert shedder.overloaded() == 'latency'
+    assert shedder.stats()['p90_seconds'] == 2.0
+    clock.now += 11
+    assert shedder.overloaded() is None and shedder.stats()['recent_requests'] == 0
+
+
+def test_shedder_waits_for_enough_samples(clock):
+    shedder = LoadShedder(max_latency=1.0, min_samples=5)
+    with shedder.track():
+        clock.now += 5
+    assert shedder.overloaded() is None
+
+
+def test_token_cache_checks_a_signature_once_and_drops_expired_tokens(app, clock):
+    cache = TokenCache(max_entries=1)
+    with app.app_context():
+        token, other = (jwt.encode({'user_id': user_id, 'exp': int(time.time()) + 3600}, signing_key(), algorithm='HS256')
+                        for user_id in (7, 8))
+        assert cache.decode(token)['user_id'] == 7
+        assert cache.decode(token)['user_id'] == 7
+        assert (cache.hits, cache.misses) == (1, 1)
+        cache.decode(other)  # Evicts the least recently used token
+        cache.decode(token)
+        assert cache.misses == 3
+        clock.now = cache._entries[token]['exp'] + 1
+        with pytest.raises(ExpiredSignatureError):
+            cache.decode(token)
+
+
+def test_detection_requests_need_a_valid_token(client):
+    assert client.post('/api/detect/image').status_code == 401
+    response = client.post('/api/detect/image', headers={'Authorization': 'Bearer not-a-token'})
+    assert response.status_code == 401
+
+
+def test_rate_limited_requests_get_retry_after(client, login, monkeypatch):
+    monkeypatch.setitem(detection.rate_limiters, 'image', RateLimiter(per_minute=6, burst=1))
+    _, headers = login()
+    assert client.post('/api/detect/image', headers=headers).status_code == 400  # Admitted: no image sent
+    response = client.post('/api/detect/image', headers=headers)
+    assert response.status_code == 429 and response.headers['Retry-After'] == '10'
+
+
+def test_overloaded_server_sheds_image_requests(client, login, monkeypatch):
+    monkeypatch.setattr(detection.image_load, 'max_inflight', 1)
+    _, headers = login()
+    with detection.image_load.track():
+        response = client.post('/api/detect/image', headers=headers)
+    assert response.status_code == 503 and 'Retry-After' in response.headers
+    assert client.post('/api/detect/image', headers=headers).status_code == 400
+
+
+def test_users_over_their_active_job_quota_are_refused(client, login, monkeypatch):
+    monkeypatch.setattr(detection, 'MAX_ACTIVE_JOBS_PER_USER', 1)
+    _, headers = login()
+    upload = {'filename': 'clip.avi', 'size': 10, 'session_id': 'room'}
+    assert client.post('/api/uploads/', json=upload, headers=headers).status_code == 201
+    response = client.post('/api/uploads/', json=upload, headers=headers)
+    assert response.status_code == 429 and 'in progress' in response.get_json()['error']
+
+
+@pytest.fixture
+def owned_job(app, login):
+    """A queued video job of a new user: (job_id, headers)."""
+    user_id, headers = login()
+    job_id = str(uuid.uuid4())
+    with app.app_context():
+        db.session.add(VideoJob(id=job_id, session_id='room', filename='clip.mp4', file_path='/nonexistent/clip.mp4',
+                                result_filename='result_clip.webm', result_dir='/nonexistent'))
+        db.session.add(JobOwner(id=job_id, user_id=user_id))
+        db.session.commit()
+    return job_id, headers
+
+
+def test_jobs_are_only_visible_to_their_owner(client, login, owned_job):
+    job_id, headers = owned_job
+    _, other_headers = login()
+    assert client.get('/api/jobs/').status_code == 401
+    assert [job['id'] for job in client.get('/api/jobs/', headers=headers).get_json()] == [job_id]
+    assert client.get('/api/jobs/', headers=other_headers).get_json() == []
+    assert client.get(f'/api/jobs/{job_id}', headers=other_headers).status_code == 404
+    assert client.patch(f'/api/jobs/{job_id}', json={'priority': 1}, headers=other_headers).status_code == 404
+    assert client.post(f'/api/jobs/{job_id}/cancel', headers=other_headers).status_code == 404
+    assert client.post(f'/api/jobs/{job_id}/cancel', headers=headers).status_code == 200
+
+
+@pytest.mark.parametrize('requested, stored', [(1000, detection.VIDEO_MAX_USER_PRIORITY), (-5, 0), (3, 3)])
+def test_requested_priorities_are_clamped(client, owned_job, requested, stored):
+    job_id, headers = owned_job
+    response = client.patch(f'/api/jobs/{job_id}', json={'priority': requested}, headers=headers)
+    assert response.status_code == 200 and response.get_json()['priority'] == stored
@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+from utils.alert_engine import AlertEngine, AlertCooldowns
+
+FRAME = np.zeros((120, 160, 3), dtype=np.uint8)
+
+
+@pytest.fixture
+def cooldowns():
+    return AlertCooldowns(cooldown_seconds=10.0)
+
+
+def engine(cooldowns, session_id='session', **kwargs):
+    args = dict(confirm_frames=3, window_frames=5, min_confidence=0.7, close_after=2.0)
+    args.update(kwargs)
+    return AlertEngine(session_id, lambda class_name: class_name == 'rifle', cooldowns, **args)
+
+
+def feed(alert_engine, now, track_id=1, confidence=0.9, class_name='rifle', observed=True):
+    """One frame with a single box at media time `now`; returns the kinds of the events it caused."""
+    frame_index = int(now * 25)
+    events = alert_engine.update(now, frame_index, str(now), [track_id], [class_name], [confidence],
+                                 [[10, 10, 60, 60]], FRAME, observed=observed)
+    return [kind for kind, _ in events]
+
+
+def test_opens_after_m_of_n_confident_frames(cooldowns):
+    alert_engine = engine(cooldowns)
+    assert feed(alert_engine, 0.0) == []
+    assert feed(alert_engine, 0.04, confidence=0.5) == []
+    assert feed(alert_engine, 0.08) == []
+    events = alert_engine.update(0.12, 3, '0.12', [1], ['rifle'], [0.95], [[10, 10, 60, 60]], FRAME)
+    assert [kind for kind, _ in events] == ['open']
+    payload = events[0][1]
+    assert payload['confidence'] == 0.95 and payload['crop'][:2] == b'\xff\xd8'  # JPEG crop of the best box
+    assert feed(alert_engine, 0.16) == []  # One alert per track
+
+
+def test_flickering_detections_do_not_alert(cooldowns):
+    alert_engine = engine(cooldowns)
+    for index in range(20):
+        assert feed(alert_engine, index * 0.04, confidence=0.9 if index % 3 == 0 else 0.3) == []
+    assert alert_engine.opened == 0
+
+
+def test_non_weapon_tracks_are_ignored(cooldowns):
+    alert_engine = engine(cooldowns, confirm_frames=1)
+    assert feed(alert_engine, 0.0, class_name='person') == []
+
+
+def test_carried_over_boxes_do_not_confirm(cooldowns):
+    """Frames skipped by the motion gate repeat the last boxes; they are not new evidence."""
+    alert_engine = engine(cooldowns)
+    assert feed(alert_engine, 0.0) == []
+    for index in range(1, 10):
+        assert feed(alert_engine, index * 0.04, observed=False) == []
+    assert feed(alert_engine, 0.4) == []
+    assert feed(alert_engine, 0.44) == ['open']
+
+
+def test_closes_when_the_track_disappears(cooldowns):
+    alert_engine = engine(cooldowns, confirm_frames=1)
+    assert feed(alert_engine, 0.0) == ['open']
+    assert feed(alert_engine, 1.5, track_id=2, class_name='person') == []
+    events = alert_engine.update(2.5, 62, '2.5', [], [], [], [], FRAME)
+    assert [kind for kind, _ in events] == ['close']
+    assert events[0][1]['detections'] == 1
+
+
+def test_close_all_closes_open_alerts(cooldowns):
+    alert_engine = engine(cooldowns, confirm_frames=1)
+    feed(alert_engine, 0.0)
+    assert [kind for kind, _ in alert_engine.close_all(1.0)] == ['close']
+    assert alert_engine.to_dict()['openAlerts'] == 0
+
+
+def test_track_confirmed_during_cooldown_alerts_once_it_is_over(cooldowns):
+    alert_engine = engine(cooldowns, confirm_frames=1, close_after=100)
+    assert feed(alert_engine, 0.0, track_id=1) == ['open']
+    assert feed(alert_engine, 1.0, track_id=2) == ['suppressed']
+    for now in (2.0, 5.0, 9.0):
+        feed(alert_engine, now, track_id=1)
+        assert feed(alert_engine, now, track_id=2) == []  # Still pending, reported only once
+    feed(alert_engine, 10.5, track_id=1)
+    assert feed(alert_engine, 10.5, track_id=2) == ['open']
+    assert alert_engine.to_dict()['alertsSuppressed'] == 1
+
+
+def test_cooldown_runs_in_media_time(cooldowns):
+    """A video processed much faster than real time still gets ALERT_COOLDOWN_SECONDS of video between alerts."""
+    alert_engine = engine(cooldowns, confirm_frames=1, close_after=100)
+    assert feed(alert_engine, 0.0, track_id=1) == ['open']
+    assert feed(alert_engine, 9.9, track_id=2) == ['suppressed']
+    assert feed(alert_engine, 10.0, track_id=3) == ['open']
+
+
+def test_cooldown_is_shared_by_the_jobs_of_a_session(cooldowns):
+    first, second = engine(cooldowns, confirm_frames=1), engine(cooldowns, confirm_frames=1)
+    other_session = engine(cooldowns, session_id='other', confirm_frames=1)
+    assert feed(first, 0.0) == ['open']
+    # Another job's media time says nothing about this one's; it waits in wall-clock time
+    assert feed(second, 500.0) == ['suppressed']
+    assert feed(other_session, 0.0) == ['open']
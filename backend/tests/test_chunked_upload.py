@@ -0,0 +1,126 @@
+import struct
+import pytest
+from eventlet import patcher
+from models import db
+from models.upload import UploadSession
+from utils.chunked_upload import GrowingUpload, UploadRegistry, is_streamable, mp4_index_first
+
+# Chunks arrive on another OS thread than the one waiting for them, even once the app has monkey-patched threading
+_threading = patcher.original('threading')
+
+
+def mp4_box(box_type, payload_size):
+    return struct.pack('>I4s', 8 + payload_size, box_type) + b'\0' * payload_size
+
+
+@pytest.fixture
+def write_file(tmp_path):
+    def write_file(name, data):
+        path = tmp_path / name
+        path.write_bytes(data)
+        return str(path)
+    return write_file
+
+
+def test_fast_start_mp4_is_streamable(write_file):
+    data = mp4_box(b'ftyp', 16) + mp4_box(b'moov', 100) + mp4_box(b'mdat', 1000)
+    path = write_file('fast.mp4', data)
+    assert mp4_index_first(path, len(data)) is True
+    assert mp4_index_first(path, 24 + 50) is None  # moov not complete yet
+    assert mp4_index_first(path, 4) is None
+
+
+def test_mp4_with_index_at_the_end_is_not_streamable(write_file):
+    data = mp4_box(b'ftyp', 16) + mp4_box(b'mdat', 1000) + mp4_box(b'moov', 100)
+    assert is_streamable(write_file('slow.mp4', data), 'MP4', len(data)) is False
+
+
+def test_matroska_and_other_containers(write_file):
+    mkv = write_file('a.mkv', b'\x1a\x45\xdf\xa3' + b'\0' * 60)
+    assert is_streamable(mkv, 'mkv', 2) is None
+    assert is_streamable(mkv, 'mkv', 64) is True
+    assert is_streamable(write_file('b.webm', b'RIFF' + b'\0' * 60), 'webm', 64) is False
+    assert is_streamable(write_file('c.avi', b'RIFF' + b'\0' * 60), 'avi', 64) is False
+
+
+def test_wait_for_returns_once_enough_bytes_arrived():
+    upload = GrowingUpload('u', received=0, size=100)
+    _threading.Timer(0.05, upload.advance, args=(60,)).start()
+    assert upload.wait_for(0, min_growth=50, poll_interval=0.01) is True
+    assert upload.received == 60 and not upload.complete
+    # Near the end of the file only the remaining bytes are waited for
+    _threading.Timer(0.05, upload.advance, args=(100,)).start()
+    assert upload.wait_for(60, min_growth=1000, poll_interval=0.01) is True and upload.complete
+
+
+def test_wait_for_stops_on_abort_and_on_stall():
+    upload = GrowingUpload('u', received=0, size=100)
+    _threading.Timer(0.05, upload.abort).start()
+    assert upload.wait_for(0, min_growth=10, poll_interval=0.01) is False
+    stalled = GrowingUpload('s', received=0, size=100, stall_timeout=0.05)
+    with pytest.raises(RuntimeError, match='stalled'):
+        stalled.wait_for(0, min_growth=10, poll_interval=0.01)
+    assert GrowingUpload('c', 0, 100).wait_for(0, 10, should_stop=lambda: True) is False
+
+
+def test_registry_keeps_one_state_per_upload():
+    registry = UploadRegistry()
+    upload = registry.track('u', 10, 100)
+    assert registry.track('u', 0, 100) is upload and registry.get('u') is upload
+    registry.discard('u')
+    assert registry.get('u') is None
+
+
+@pytest.fixture
+def upload(client, login):
+    """A new 10-byte chunked upload of a fresh user (AVI, so no job starts early): (upload_id, headers)."""
+    _, headers = login()
+    response = client.post('/api/uploads/', json={'filename': 'clip.avi', 'size': 10, 'session_id': 'room'},
+                           headers=headers)
+    assert response.status_code == 201
+    return response.get_json()['upload_id'], headers
+
+
+def send_chunk(client, upload_id, headers, offset, data):
+    response = client.patch(f'/api/uploads/{upload_id}', data=data, headers={**headers, 'Upload-Offset': str(offset)})
+    return response.status_code, response.get_json()
+
+
+def test_chunks_must_start_at_the_current_offset(client, upload):
+    upload_id, headers = upload
+    assert send_chunk(client, upload_id, headers, 0, b'abcd')[0] == 200
+    # A retried or out-of-order chunk is refused with the offset to resume from
+    status, body = send_chunk(client, upload_id, headers, 0, b'abcd')
+    assert (status, body['offset']) == (409, 4)
+    status, body = send_chunk(client, upload_id, headers, 6, b'ef')
+    assert (status, body['offset']) == (409, 4)
+    assert client.get(f'/api/uploads/{upload_id}', headers=headers).get_json()['offset'] == 4
+
+
+def test_chunk_past_the_declared_size_is_rejected(client, upload):
+    upload_id, headers = upload
+    send_chunk(client, upload_id, headers, 0, b'abcd')
+    status, body = send_chunk(client, upload_id, headers, 4, b'0123456789')
+    assert (status, body['offset']) == (400, 4)
+    assert client.get(f'/api/uploads/{upload_id}', headers=headers).get_json()['offset'] == 4
+
+
+def test_last_chunk_completes_the_upload_and_queues_its_job(app, client, upload):
+    upload_id, headers = upload
+    send_chunk(client, upload_id, headers, 0, b'abcd')
+    status, body = send_chunk(client, upload_id, headers, 4, b'efghij')
+    assert status == 200 and body['state'] == 'complete' and body['job'] is not None
+    status, body = send_chunk(client, upload_id, headers, 10, b'k')
+    assert (status, body['offset']) == (409, 10)
+    with app.app_context():
+        with open(db.session.get(UploadSession, upload_id).file_path, 'rb') as f:
+            assert f.read() == b'abcdefghij'
+
+
+def test_missing_offset_header_and_other_users(client, login, upload):
+    upload_id, headers = upload
+    assert client.patch(f'/api/uploads/{upload_id}', data=b'a', headers=headers).status_code == 400
+    _, other_headers = login()
+    assert send_chunk(client, upload_id, other_headers, 0, b'a')[0] == 404
+    assert client.delete(f'/api/uploads/{upload_id}', headers=other_headers).status_code == 404
+    assert client.delete(f'/api/uploads/{upload_id}', headers=headers).status_code == 200
@@ -0,0 +1,66 @@
+import uuid
+import pytest
+from models.detection import Detection, Track
+from utils.detection_store import DetectionWriter, parse_seconds
+
+
+def box(class_name='rifle', confidence=0.9, track_id=1):
+    return {'class': class_name, 'confidence': confidence, 'bbox': [1, 2, 3, 4], 'track_id': track_id}
+
+
+@pytest.mark.parametrize('value, seconds', [
+    ('185.5', 185.5), (42, 42.0), ('03:05', 185.0), ('01:02:03.5', 3723.5), (' 00:00:07 ', 7.0)
+])
+def test_parse_seconds(value, seconds):
+    assert parse_seconds(value) == seconds
+
+
+@pytest.mark.parametrize('value', ['1:2:3:4', 'abc', '01:xx', ''])
+def test_parse_seconds_rejects_bad_values(value):
+    with pytest.raises(ValueError):
+        parse_seconds(value)
+
+
+def test_writer_inserts_in_batches(app):
+    job_id = str(uuid.uuid4())
+    with app.app_context():
+        writer = DetectionWriter(job_id, batch_size=3)
+        writer.add([box(), box()], frame=0, seconds=0.0)
+        assert Detection.query.filter_by(job_id=job_id).count() == 0
+        writer.add([box(), box()], frame=1, seconds=0.04)
+        assert writer.rows_written == 4
+        writer.add([box()], frame=2, seconds=0.08)
+        assert Detection.query.filter_by(job_id=job_id).count() == 4
+        writer.flush()
+        assert Detection.query.filter_by(job_id=job_id).count() == 5
+        stored = Detection.query.filter_by(job_id=job_id, frame=1).first()
+        assert stored.to_dict()['bbox'] == [1, 2, 3, 4] and stored.source == 'video'
+
+
+def test_discard_from_drops_stored_and_buffered_rows(app):
+    """A resumed job deletes what it stored after its checkpoint, then processes those frames again."""
+    job_id = str(uuid.uuid4())
+    with app.app_context():
+        writer = DetectionWriter(job_id, batch_size=100)
+        for frame in range(4):
+            writer.add([box()], frame=frame)
+        writer.flush()
+        writer.add([box()], frame=4)
+        writer.add([box()], frame=5)
+        writer.discard_from(2)
+        writer.flush()
+        frames = sorted(row.frame for row in Detection.query.filter_by(job_id=job_id))
+        assert frames == [0, 1]
+
+
+def test_save_tracks_replaces_previous_summaries(app):
+    job_id = str(uuid.uuid4())
+    track = {'class': 'pistol', 'first_seen_frame': 25, 'last_seen_frame': 75, 'max_confidence': 0.8,
+             'detection_count': 3}
+    with app.app_context():
+        writer = DetectionWriter(job_id)
+        writer.save_tracks({1: track, 2: track}, fps=25)
+        writer.save_tracks({7: track}, fps=25)
+        tracks = Track.query.filter_by(job_id=job_id).all()
+        assert [row.track_id for row in tracks] == [7]
+        assert (tracks[0].first_seconds, tracks[0].last_seconds) == (1.0, 3.0)
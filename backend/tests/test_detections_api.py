@@ -0,0 +1,79 @@
+import uuid
+import pytest
+from models import db
+from models.video_job import JobOwner
+from utils.detection_store import DetectionWriter
+
+
+@pytest.fixture
+def stored_job(app, login):
+    """A video job of a new user with detections at 1 s intervals: (job_id, headers)."""
+    user_id, headers = login()
+    job_id = str(uuid.uuid4())
+    with app.app_context():
+        db.session.add(JobOwner(id=job_id, user_id=user_id))
+        writer = DetectionWriter(job_id)
+        for second, (class_name, confidence, track_id) in enumerate([
+            ('rifle', 0.95, 1), ('rifle', 0.6, 1), ('pistol', 0.85, 2), ('rifle', 0.9, 3), ('person', 0.99, 4)
+        ]):
+            writer.add([{'class': class_name, 'confidence': confidence, 'bbox': [0, 0, 10, 10], 'track_id': track_id}],
+                       frame=second * 25, seconds=second * 60.0)
+        writer.flush()
+        writer.save_tracks({
+            1: {'class': 'rifle', 'first_seen_frame': 0, 'last_seen_frame': 25, 'max_confidence': 0.95, 'detection_count': 2},
+            2: {'class': 'pistol', 'first_seen_frame': 50, 'last_seen_frame': 50, 'max_confidence': 0.85, 'detection_count': 1}
+        }, fps=25 / 60)
+    return job_id, headers
+
+
+def query(client, headers, path='/api/detections/', **params):
+    response = client.get(path, query_string=params, headers=headers)
+    return response.status_code, response.get_json()
+
+
+def test_filters_by_class_confidence_and_time_range(client, stored_job):
+    job_id, headers = stored_job
+    status, page = query(client, headers, job_id=job_id, **{'class': 'rifle,pistol'}, min_confidence=0.8,
+                         start='00:01:00', end='03:00')
+    assert status == 200
+    assert [(item['class'], item['seconds']) for item in page['items']] == [('pistol', 120.0), ('rifle', 180.0)]
+    assert page['items'][1]['timestamp'].startswith('00:03:00')
+
+
+def test_filters_by_track_and_max_confidence(client, stored_job):
+    job_id, headers = stored_job
+    _, page = query(client, headers, job_id=job_id, track_id=1, max_confidence=0.7)
+    assert [item['confidence'] for item in page['items']] == [0.6]
+
+
+def test_paginates(client, stored_job):
+    job_id, headers = stored_job
+    _, first = query(client, headers, job_id=job_id, per_page=2)
+    _, last = query(client, headers, job_id=job_id, per_page=2, page=3)
+    assert (first['total'], first['pages'], len(first['items'])) == (5, 3, 2)
+    assert [item['class'] for item in last['items']] == ['person']
+
+
+@pytest.mark.parametrize('params', [{'min_confidence': 'high'}, {'start': '1:2:3:4'}, {'track_id': 'x'}])
+def test_rejects_invalid_filters(client, stored_job, params):
+    job_id, headers = stored_job
+    status, body = query(client, headers, job_id=job_id, **params)
+    assert status == 400 and 'Invalid value' in body['error']
+
+
+def test_tracks_overlapping_the_time_range(client, stored_job):
+    job_id, headers = stored_job
+    _, page = query(client, headers, '/api/detections/tracks', job_id=job_id, start='00:01:30')
+    assert [item['track_id'] for item in page['items']] == [2]
+
+
+def test_results_are_limited_to_the_caller(client, login, stored_job):
+    job_id, headers = stored_job
+    _, other_headers = login()
+    assert query(client, {})[0] == 401
+    assert query(client, other_headers, job_id=job_id)[0] == 404
+    assert query(client, other_headers, '/api/detections/tracks', job_id=job_id)[0] == 404
+    _, page = query(client, other_headers)
+    assert page['total'] == 0
+    _, page = query(client, headers)
+    assert page['total'] == 5
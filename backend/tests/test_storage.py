@@ -0,0 +1,122 @@
+import os
+import time
+import pytest
+from utils.storage import StorageArea, StorageManager
+
+HOUR = 3600
+
+
+@pytest.fixture
+def areas(tmp_path):
+    """Empty uploads/ and results/ roots, each with one folder of entries: (uploads, results)."""
+    for folder in ('uploads/videos', 'results/videos'):
+        (tmp_path / folder).mkdir(parents=True)
+    return StorageArea('uploads', str(tmp_path / 'uploads')), StorageArea('results', str(tmp_path / 'results'))
+
+
+@pytest.fixture
+def storage(areas):
+    return StorageManager(*areas, dedupe=True, min_age=0)
+
+
+def write(area, name, size, age=0):
+    """A file of `size` bytes under `area`'s videos/ folder, last used `age` seconds ago."""
+    path = os.path.join(area.root, 'videos', name)
+    with open(path, 'wb') as f:
+        f.write(os.urandom(size))
+    used = time.time() - age
+    os.utime(path, (used, used))
+    return path
+
+
+def test_identical_uploads_share_one_blob(storage, areas):
+    uploads, _ = areas
+    first, second = (os.path.join(uploads.root, 'videos', name) for name in ('a.mp4', 'b.mp4'))
+    storage.store(b'same bytes', first)
+    storage.store(b'same bytes', second)
+    assert os.path.samefile(first, second) and os.stat(first).st_nlink == 3  # Both uploads and the blob
+    usage = storage.usage()['uploads']
+    assert (usage['bytes'], usage['logical_bytes'], usage['dedupe']['blobs']) == (10, 20, 1)
+
+
+def test_dedupe_links_a_complete_upload_to_an_earlier_copy(storage, areas):
+    uploads, _ = areas
+    first = write(uploads, 'a.mp4', 100)
+    with open(first, 'rb') as f:
+        second = os.path.join(uploads.root, 'videos', 'b.mp4')
+        with open(second, 'wb') as copy:
+            copy.write(f.read())
+    assert storage.dedupe(first) is False  # The first copy becomes the blob
+    assert storage.dedupe(second) is True
+    assert os.path.samefile(first, second)
+    assert StorageManager(*areas, dedupe=False).dedupe(second) is False
+
+
+def test_expired_entries_are_removed(storage, areas):
+    uploads, results = areas
+    uploads.max_age = results.max_age = HOUR
+    old = write(uploads, 'old.mp4', 10, age=2 * HOUR)
+    new = write(uploads, 'new.mp4', 10)
+    result_dir = os.path.join(results.root, 'videos', 'job')
+    os.mkdir(result_dir)
+    write(results, os.path.join('job', 'result.mp4'), 10, age=2 * HOUR)
+    report = storage.sweep()
+    assert report['removed'] == 2 and report['freed_bytes'] == 20
+    assert not os.path.exists(old) and not os.path.exists(result_dir) and os.path.exists(new)
+
+
+def test_least_recently_used_entries_go_first_until_the_area_fits(storage, areas):
+    uploads, _ = areas
+    uploads.max_bytes = 250
+    paths = [write(uploads, f"{index}.mp4", 100, age=(3 - index) * HOUR) for index in range(3)]
+    storage.sweep()
+    assert [os.path.exists(path) for path in paths] == [False, True, True]
+
+
+def test_recently_used_entries_are_spared(areas):
+    uploads, _ = areas
+    uploads.max_bytes = 50
+    storage = StorageManager(*areas, min_age=HOUR)
+    old, new = write(uploads, 'old.mp4', 100, age=2 * HOUR), write(uploads, 'new.mp4', 100)
+    storage.sweep()
+    assert not os.path.exists(old) and os.path.exists(new)
+
+
+def test_pinned_entries_are_kept(storage, areas):
+    uploads, results = areas
+    uploads.max_age = results.max_age = HOUR
+    active = write(uploads, 'active.mp4', 10, age=2 * HOUR)
+    storage.add_pin_provider(lambda: [active, None])
+    result_dir = os.path.join(results.root, 'videos', 'job')
+    os.mkdir(result_dir)
+    playing = write(results, os.path.join('job', 'result.mp4'), 10, age=2 * HOUR)
+    storage.pin(playing)  # A file inside a pinned entry keeps the whole entry
+    report = storage.sweep()
+    assert report['removed'] == 0 and report['skipped_pinned'] == 2
+    storage.unpin(playing)
+    storage.sweep()
+    assert os.path.exists(active) and not os.path.exists(result_dir)
+
+
+def test_files_being_sent_are_pinned_and_marked_as_used(app, storage, areas):
+    _, results = areas
+    results.max_age = HOUR
+    path = write(results, 'result.mp4', 10, age=2 * HOUR)
+    with app.test_request_context():
+        response = storage.send_file(path)
+        assert storage.usage()['files_being_sent'] == 1
+        response.close()
+    assert storage.usage()['files_being_sent'] == 0
+    assert storage.sweep()['removed'] == 0  # Sending it made it recently used
+
+
+def test_blobs_no_upload_links_to_are_removed(storage, areas):
+    uploads, _ = areas
+    uploads.max_age = HOUR
+    path = os.path.join(uploads.root, 'videos', 'a.mp4')
+    storage.store(b'bytes', path)
+    old = time.time() - 2 * HOUR
+    os.utime(path, (old, old))
+    report = storage.sweep()
+    assert report['removed'] == 1 and report['orphan_blobs'] == 1 and report['freed_bytes'] == 5
+    assert storage.usage()['uploads']['dedupe']['blobs'] == 0
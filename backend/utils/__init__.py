@@ -1,4 +1,4 @@
 # This file makes the utils directory a Python package
-from .helpers import format_datetime, parse_json, validate_request_data
+from .helpers import format_datetime, parse_json, validate_request_data, parse_bool
 
-__all__ = ['format_datetime', 'parse_json', 'validate_request_data']
+__all__ = ['format_datetime', 'parse_json', 'validate_request_data', 'parse_bool']
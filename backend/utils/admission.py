@@ -0,0 +1,147 @@
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from eventlet import patcher
+from jwt import ExpiredSignatureError
+from utils.jwt_utils import decode_token
+
+# Shared by request green threads; nothing blocks while these locks are held
+_threading = patcher.original('threading')
+
+
+class TokenCache:
+    """
+    Decoded JWT payloads by token, so a client sending many requests with the same token has its
+    signature checked once. Entries are dropped when the token expires, least recently used first
+    when the cache is full. Invalid tokens are not cached.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = _threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def decode(self, token):
+        """Return the token's payload; raises ExpiredSignatureError or InvalidTokenError like decode_token."""
+        now = time.time()
+        with self._lock:
+            payload = self._entries.get(token)
+            if payload is not None:
+                if payload.get('exp') is not None and payload['exp'] <= now:
+                    del self._entries[token]
+                    raise ExpiredSignatureError("Signature has expired")
+                self._entries.move_to_end(token)
+                self.hits += 1
+                return payload
+        payload = decode_token(token)
+        with self._lock:
+            self.misses += 1
+            self._entries[token] = payload
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return payload
+
+
+class TokenBucket:
+    """Holds up to `burst` tokens, refilled at `rate` tokens per second."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+
+    def take(self):
+        """Take a token; returns 0 if there was one, else the seconds until there will be."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def full(self):
+        return self.tokens + (time.monotonic() - self.updated) * self.rate >= self.burst
+
+
+class RateLimiter:
+    """A token bucket per key (user), `per_minute` requests per minute with bursts of `burst`; 0 is unlimited."""
+
+    def __init__(self, per_minute, burst, max_keys=10000):
+        self.rate = per_minute / 60.0
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = {}
+        self._lock = _threading.Lock()
+
+    def take(self, key):
+        """Returns 0 if the request may go ahead, else the seconds until `key` may send another."""
+        if self.rate <= 0:
+            return 0
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.max_keys:
+                    # Full buckets hold no state worth keeping
+                    self._buckets = {k: b for k, b in self._buckets.items() if not b.full()}
+                bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+            return bucket.take()
+
+
+class LoadShedder:
+    """
+    Admission check for a class of requests: refuse new ones while `max_inflight` are already being
+    served, or while the 90th percentile duration of those that finished in the last `window` seconds
+    is above `max_latency` seconds (after at least `min_samples`). Refused requests add no samples, so
+    the window empties and requests are admitted again once the backlog has cleared.
+    """
+
+    def __init__(self, max_inflight=0, max_latency=0, window=10.0, min_samples=5):
+        self.max_inflight = max_inflight
+        self.max_latency = max_latency
+        self.window = window
+        self.min_samples = min_samples
+        self.inflight = 0
+        self._samples = deque()
+        self._lock = _threading.Lock()
+
+    def overloaded(self):
+        """The reason to refuse a request now ('inflight' or 'latency'), or None."""
+        with self._lock:
+            if self.max_inflight and self.inflight >= self.max_inflight:
+                return 'inflight'
+            if self.max_latency and self._p90() > self.max_latency:
+                return 'latency'
+        return None
+
+    @contextmanager
+    def track(self):
+        """Count an admitted request as in flight and record its duration."""
+        started = time.monotonic()
+        with self._lock:
+            self.inflight += 1
+        try:
+            yield
+        finally:
+            finished = time.monotonic()
+            with self._lock:
+                self.inflight -= 1
+                self._samples.append((finished, finished - started))
+
+    def stats(self):
+        with self._lock:
+            p90 = self._p90()
+            return {'inflight': self.inflight, 'recent_requests': len(self._samples), 'p90_seconds': round(p90, 3)}
+
+    def _p90(self):
+        cutoff = time.monotonic() - self.window
+        while self._samples and self._samples[0][0] < cutoff:
+            self._samples.popleft()
+        if len(self._samples) < self.min_samples:
+            return 0.0
+        durations = sorted(duration for _, duration in self._samples)
+        return durations[min(len(durations) - 1, math.ceil(0.9 * len(durations)) - 1)]
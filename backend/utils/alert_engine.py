@@ -0,0 +1,204 @@
+import time
+import uuid
+from collections import deque
+import cv2
+from eventlet import patcher
+
+# Cooldowns are checked from pipeline worker threads of several jobs at once
+_threading = patcher.original('threading')
+
+
+class AlertCooldowns:
+    """
+    Per-session cooldown: after an alert opens, further alerts for that session are suppressed for a while.
+
+    Time is measured on the clock of the job or stream that raised the last alert (media seconds for a
+    video, which may be processed faster or slower than real time), so the same job gets the same window
+    at any processing speed. Another job of the session has its own time base; for it the cooldown runs
+    in wall-clock time from the moment that alert was raised.
+    """
+
+    def __init__(self, cooldown_seconds=10.0):
+        self.cooldown_seconds = cooldown_seconds
+        self._last_alert = {}  # session_id -> (clock, clock time, wall time) of its last alert
+        self._lock = _threading.Lock()
+
+    def try_acquire(self, session_id, now, clock):
+        """Return True (and start the cooldown) if the session may raise an alert at time `now` of `clock`."""
+        wall_now = time.time()
+        with self._lock:
+            last = self._last_alert.get(session_id)
+            if last is not None:
+                last_clock, last_time, last_wall = last
+                elapsed = now - last_time if last_clock == clock else wall_now - last_wall
+                if elapsed < self.cooldown_seconds:
+                    return False
+            self._last_alert[session_id] = (clock, now, wall_now)
+            return True
+
+
+class _TrackAlertState:
+    __slots__ = ('track_id', 'class_name', 'hits', 'best_confidence', 'best_bbox', 'best_frame', 'best_time',
+                 'best_crop', 'state', 'cooling_down', 'alert_id', 'opened_at', 'last_seen', 'last_frame', 'detections')
+
+    def __init__(self, track_id, window):
+        self.track_id = track_id
+        self.class_name = None
+        self.hits = deque(maxlen=window)
+        self.best_confidence = 0.0
+        self.best_bbox = None
+        self.best_frame = None
+        self.best_time = None
+        self.best_crop = None
+        self.state = 'pending'  # pending -> open -> closed
+        self.cooling_down = False  # Confirmed while the session was cooling down; opens once it is over
+        self.alert_id = None
+        self.opened_at = None
+        self.last_seen = None
+        self.last_frame = None
+        self.detections = 0
+
+
+class AlertEngine:
+    """
+    Turns per-frame weapon detections into one alert per weapon track.
+
+    A track is confirmed once `confirm_frames` of its last `window_frames` observations were a
+    weapon class at `min_confidence` or more. Confirming opens an alert ('open' event, with a
+    JPEG crop of the track's best detection so far); the alert closes ('close' event) when the
+    track has not been seen for `close_after` seconds, or when the job ends. A track confirmed
+    while its session is cooling down stays pending ('suppressed' event, once) and opens its alert
+    as soon as the cooldown is over, if it is still confirmed then. Times are media seconds for
+    video jobs and capture time for live streams. One engine per job/stream.
+    """
+
+    def __init__(self, session_id, is_weapon, cooldowns, confirm_frames=3, window_frames=5,
+                 min_confidence=0.7, close_after=2.0, crop_max_size=256):
+        self.session_id = session_id
+        self.is_weapon = is_weapon
+        self.cooldowns = cooldowns
+        self.window_frames = max(1, window_frames)
+        self.confirm_frames = min(max(1, confirm_frames), self.window_frames)
+        self.min_confidence = min_confidence
+        self.close_after = close_after
+        self.crop_max_size = crop_max_size
+        self.opened = 0
+        self.suppressed = 0
+        self._clock = str(uuid.uuid4())  # The time base of `now` in update(), for the session cooldown
+        self._tracks = {}
+
+    def update(self, now, frame_index, timestamp, track_ids, class_names, confidences, bboxes, frame, observed=True):
+        """
+        Feed one processed frame (parallel lists for its tracked boxes) and return the alert
+        events it caused, as ('open' | 'close' | 'suppressed', payload) tuples. With observed=False
+        the boxes were carried over from an earlier frame (e.g. skipped by the motion gate): they
+        keep their tracks alive, but are not new evidence and do not count toward confirmation.
+        """
+        events = []
+        for track_id, class_name, confidence, bbox in zip(track_ids, class_names, confidences, bboxes):
+            if track_id is None:
+                continue
+            weapon = self.is_weapon(class_name)
+            track = self._tracks.get(track_id)
+            if track is None:
+                if not weapon or not observed:
+                    continue  # Only weapon tracks are followed, from a real observation on
+                track = self._tracks[track_id] = _TrackAlertState(track_id, self.window_frames)
+            track.last_seen = now
+            track.last_frame = frame_index
+            if observed:
+                track.detections += 1
+                hit = weapon and confidence >= self.min_confidence
+                track.hits.append(hit)
+                if hit and confidence > track.best_confidence:
+                    track.class_name = class_name
+                    track.best_confidence = confidence
+                    track.best_bbox = bbox
+                    track.best_frame = frame_index
+                    track.best_time = timestamp
+                    if track.state == 'pending':
+                        track.best_crop = self._crop(frame, bbox)  # Only needed until the alert opens
+            if track.state == 'pending' and sum(track.hits) >= self.confirm_frames:
+                if self.cooldowns.try_acquire(self.session_id, now, self._clock):
+                    events.append(self._open(track, now, frame_index, timestamp))
+                elif not track.cooling_down:
+                    # Checked again on every later frame of the track, so it alerts once the cooldown is over
+                    track.cooling_down = True
+                    self.suppressed += 1
+                    events.append(('suppressed', {'track_id': track_id, 'class': track.class_name}))
+        events.extend(self._expire(now))
+        return events
+
+    def close_all(self, now):
+        """Close every open alert, e.g. when the video ends or the stream stops."""
+        return [self._close(track, now) for track in self._tracks.values() if track.state == 'open']
+
+    def to_dict(self):
+        """Counters for the completion event."""
+        return {
+            'alertsOpened': self.opened,
+            'alertsSuppressed': self.suppressed,
+            'openAlerts': sum(1 for track in self._tracks.values() if track.state == 'open'),
+            'confirmFrames': self.confirm_frames,
+            'windowFrames': self.window_frames,
+            'minConfidence': self.min_confidence
+        }
+
+    def _open(self, track, now, frame_index, timestamp):
+        track.state = 'open'
+        track.alert_id = str(uuid.uuid4())
+        track.opened_at = now
+        self.opened += 1
+        payload = {
+            'alert_id': track.alert_id,
+            'session_id': self.session_id,
+            'track_id': track.track_id,
+            'class': track.class_name,
+            'confidence': track.best_confidence,
+            'bbox': track.best_bbox,
+            'frame_index': frame_index,
+            'timestamp': timestamp,
+            'best_frame_index': track.best_frame,
+            'best_timestamp': track.best_time,
+            'crop': track.best_crop  # JPEG bytes, sent as a binary attachment
+        }
+        track.best_crop = None
+        return ('open', payload)
+
+    def _close(self, track, now):
+        track.state = 'closed'
+        return ('close', {
+            'alert_id': track.alert_id,
+            'session_id': self.session_id,
+            'track_id': track.track_id,
+            'class': track.class_name,
+            'max_confidence': track.best_confidence,
+            'detections': track.detections,
+            'last_frame_index': track.last_frame,
+            'duration': round(track.last_seen - track.opened_at, 3)
+        })
+
+    def _expire(self, now):
+        """Close alerts of tracks that disappeared and forget stale tracks."""
+        events = []
+        for track_id in list(self._tracks):
+            track = self._tracks[track_id]
+            if now - track.last_seen <= self.close_after:
+                continue
+            if track.state == 'open':
+                events.append(self._close(track, now))
+            del self._tracks[track_id]
+        return events
+
+    def _crop(self, frame, bbox):
+        x1, y1, x2, y2 = (int(value) for value in bbox)
+        height, width = frame.shape[:2]
+        crop = frame[max(0, y1):min(height, y2), max(0, x1):min(width, x2)]
+        if crop.size == 0:
+            return None
+        scale = self.crop_max_size / max(crop.shape[:2])
+        if scale < 1:
+            crop = cv2.resize(crop, (max(1, int(crop.shape[1] * scale)), max(1, int(crop.shape[0] * scale))),
+                              interpolation=cv2.INTER_AREA)
+        ok, buffer = cv2.imencode('.jpg', crop, [cv2.IMWRITE_JPEG_QUALITY, 85])
+        return buffer.tobytes() if ok else None
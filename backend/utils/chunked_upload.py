@@ -0,0 +1,208 @@
+import struct
+import time
+from collections import deque
+import cv2
+from eventlet import patcher
+
+# Chunks are written by request greenlets while the decoder of an early-started job,
+# a real OS thread, waits for them
+_threading = patcher.original('threading')
+
+MP4_EXTENSIONS = {'mp4', 'mov'}
+MATROSKA_EXTENSIONS = {'mkv', 'webm'}
+EBML_MAGIC = b'\x1a\x45\xdf\xa3'
+
+
+def mp4_index_first(path, received):
+    """
+    Walk the top-level boxes of a partially received MP4/MOV file.
+
+    Returns True when a complete 'moov' box (the sample index) comes before the media data,
+    as in fast-start and fragmented files, False when 'mdat' comes first (index at the end),
+    and None when the received bytes do not tell yet.
+    """
+    offset = 0
+    with open(path, 'rb') as f:
+        while offset + 8 <= received:
+            f.seek(offset)
+            header = f.read(16)
+            size, box_type = struct.unpack('>I4s', header[:8])
+            if box_type in (b'mdat', b'moof'):
+                return False
+            if size == 1:
+                if len(header) < 16:
+                    return None
+                size = struct.unpack('>Q', header[8:16])[0]
+            if box_type == b'moov':
+                return True if size and offset + size <= received else None
+            if size < 8:
+                return False  # Box running to the end of the file, or not an MP4 at all
+            offset += size
+    return None
+
+
+def is_streamable(path, extension, received):
+    """
+    Whether a partially received video can be decoded before it is complete.
+
+    True for fast-start/fragmented MP4/MOV and for Matroska, False for everything else
+    (AVI, MP4 with the index at the end), None while the header has not arrived yet.
+    """
+    extension = extension.lower()
+    if extension in MP4_EXTENSIONS:
+        return mp4_index_first(path, received)
+    if extension in MATROSKA_EXTENSIONS:
+        if received < len(EBML_MAGIC):
+            return None
+        with open(path, 'rb') as f:
+            return f.read(len(EBML_MAGIC)) == EBML_MAGIC
+    return False
+
+
+class GrowingUpload:
+    """Receive state of one chunked upload, shared by the upload routes and the job decoding it."""
+
+    def __init__(self, upload_id, received, size, stall_timeout=600.0):
+        self.upload_id = upload_id
+        self.size = size
+        self.received = received
+        self.complete = received >= size
+        self.aborted = False
+        self.stall_timeout = stall_timeout
+        self.last_received_at = time.monotonic()
+        self._condition = _threading.Condition()
+
+    def advance(self, received):
+        """Record that the file now holds `received` contiguous bytes."""
+        with self._condition:
+            if received > self.received:
+                self.last_received_at = time.monotonic()
+            self.received = received
+            self.complete = received >= self.size
+            self._condition.notify_all()
+
+    def abort(self):
+        with self._condition:
+            self.aborted = True
+            self._condition.notify_all()
+
+    def wait_for(self, received, min_growth, should_stop=None, poll_interval=0.5):
+        """
+        Block until `min_growth` bytes past `received` (or the rest of the file) have arrived.
+
+        Returns False if the upload was aborted or should_stop() became true, and raises
+        RuntimeError when no data arrived for `stall_timeout` seconds.
+        """
+        target = min(received + min_growth, self.size)
+        with self._condition:
+            while self.received < target and not self.aborted:
+                if should_stop is not None and should_stop():
+                    return False
+                stalled_for = time.monotonic() - self.last_received_at
+                if stalled_for >= self.stall_timeout:
+                    raise RuntimeError(f"Upload {self.upload_id} stalled: no data for {stalled_for:.0f}s")
+                self._condition.wait(min(poll_interval, self.stall_timeout - stalled_for))
+            return not self.aborted
+
+
+class UploadRegistry:
+    """In-process GrowingUpload objects of the uploads still in progress, by upload ID."""
+
+    def __init__(self, stall_timeout=600.0):
+        self.stall_timeout = stall_timeout
+        self._uploads = {}
+        self._lock = _threading.Lock()
+
+    def track(self, upload_id, received, size):
+        """Return the upload's GrowingUpload, creating it (e.g. after a restart) if needed."""
+        with self._lock:
+            upload = self._uploads.get(upload_id)
+            if upload is None:
+                upload = self._uploads[upload_id] = GrowingUpload(upload_id, received, size, self.stall_timeout)
+            return upload
+
+    def get(self, upload_id):
+        with self._lock:
+            return self._uploads.get(upload_id)
+
+    def discard(self, upload_id):
+        """Forget a finished upload; a job still decoding it keeps its reference."""
+        with self._lock:
+            self._uploads.pop(upload_id, None)
+
+
+class GrowingVideoReader:
+    """
+    cv2.VideoCapture-like reader (read / get / set / release) for a video that is still being uploaded.
+
+    Frames are handed out `holdback` frames behind the decoder, because the frames decoded just
+    before the end of the received data may come from a truncated packet. When the decoder runs
+    out of data, the held-back frames are dropped, the reader waits for `min_growth` more bytes,
+    reopens the file and seeks to the first frame not handed out yet. Once the upload is complete
+    the file is read to the end.
+    """
+
+    def __init__(self, path, upload, holdback=8, min_growth=1024 * 1024, should_stop=None):
+        self.path = path
+        self.upload = upload
+        self.holdback = max(0, holdback)
+        self.min_growth = min_growth
+        self.should_stop = should_stop
+        self.reopens = 0
+        self._position = 0  # Frames handed out so far
+        self._buffer = deque()
+        self._cap = None
+        self._open()
+        while not self._cap.isOpened() and not self._complete_at_open:
+            # The header is not decodable yet
+            if not self.upload.wait_for(self._received_at_open, self.min_growth, self.should_stop):
+                break
+            self._reopen()
+
+    def _open(self):
+        self._complete_at_open = self.upload.complete
+        self._received_at_open = self.upload.received
+        self._at_end = False
+        self._cap = cv2.VideoCapture(self.path)
+        if self._position and self._cap.isOpened():
+            self._cap.set(cv2.CAP_PROP_POS_FRAMES, self._position)
+
+    def _reopen(self):
+        self._cap.release()
+        self._buffer.clear()
+        self.reopens += 1
+        self._open()
+
+    def isOpened(self):
+        return self._cap.isOpened()
+
+    def get(self, prop):
+        return self._cap.get(prop)
+
+    def set(self, prop, value):
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            self._position = int(value)
+            self._buffer.clear()
+        return self._cap.set(prop, value)
+
+    def read(self):
+        while True:
+            if self._buffer and (len(self._buffer) > self.holdback or self._at_end):
+                self._position += 1
+                return True, self._buffer.popleft()
+            if self._at_end:
+                return False, None
+            ret, frame = self._cap.read()
+            if ret and frame is not None:
+                self._buffer.append(frame)
+                continue
+            if self._complete_at_open:
+                self._at_end = True
+                continue
+            # Out of received data: wait for more, then re-read from the first frame not handed out
+            if not self.upload.wait_for(self._received_at_open, self.min_growth, self.should_stop):
+                return False, None
+            self._reopen()
+
+    def release(self):
+        self._cap.release()
@@ -0,0 +1,80 @@
+from models import db
+from models.detection import Detection, Track
+
+
+class DetectionWriter:
+    """
+    Buffers the detections of one job and writes them to the detections table in batches.
+
+    add() only appends to a list; rows are inserted with a single executemany INSERT once
+    `batch_size` of them are waiting (or on flush()), so storing detections costs one
+    statement per batch instead of one ORM object per box. Must be used from a thread with an
+    app context (the job's green thread), not from the pipeline's worker threads.
+    """
+
+    def __init__(self, job_id, source='video', batch_size=500):
+        self.job_id = job_id
+        self.source = source
+        self.batch_size = max(1, batch_size)
+        self.rows_written = 0
+        self._rows = []
+
+    def add(self, detections, frame=0, seconds=0.0):
+        """Queue the detection dicts of one frame ({"class", "confidence", "bbox", "track_id"})."""
+        for detection in detections:
+            x1, y1, x2, y2 = detection["bbox"]
+            self._rows.append({
+                "job_id": self.job_id,
+                "source": self.source,
+                "frame": frame,
+                "seconds": seconds,
+                "class_name": detection["class"],
+                "confidence": detection["confidence"],
+                "x1": x1, "y1": y1, "x2": x2, "y2": y2,
+                "track_id": detection.get("track_id")
+            })
+        if len(self._rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._rows:
+            return
+        rows, self._rows = self._rows, []
+        db.session.execute(db.insert(Detection), rows)
+        db.session.commit()
+        self.rows_written += len(rows)
+
+    def discard_from(self, frame):
+        """Delete stored detections at or after `frame`, which a resumed job is about to process again."""
+        self._rows = [row for row in self._rows if row["frame"] < frame]
+        Detection.query.filter(Detection.job_id == self.job_id, Detection.frame >= frame).delete()
+        db.session.commit()
+
+    def save_tracks(self, tracks, fps):
+        """Replace the job's track summaries with `tracks` (the unique_tracks dict of a video job)."""
+        Track.query.filter_by(job_id=self.job_id).delete()
+        rows = [{
+            "job_id": self.job_id,
+            "track_id": int(track_id),
+            "class_name": track["class"],
+            "first_frame": track["first_seen_frame"],
+            "last_frame": track["last_seen_frame"],
+            "first_seconds": track["first_seen_frame"] / fps if fps else 0.0,
+            "last_seconds": track["last_seen_frame"] / fps if fps else 0.0,
+            "max_confidence": track["max_confidence"],
+            "detection_count": track["detection_count"]
+        } for track_id, track in tracks.items()]
+        if rows:
+            db.session.execute(db.insert(Track), rows)
+        db.session.commit()
+
+
+def parse_seconds(value):
+    """Parse a video position given as seconds ("185.5") or as "MM:SS" / "HH:MM:SS[.mmm]"."""
+    parts = str(value).strip().split(':')
+    if len(parts) > 3:
+        raise ValueError(f"Invalid time: {value}")
+    seconds = 0.0
+    for part in parts:
+        seconds = seconds * 60 + float(part)
+    return seconds
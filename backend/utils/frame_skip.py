@@ -0,0 +1,129 @@
+import math
+import time
+from eventlet import patcher
+
+_threading = patcher.original('threading')
+
+
+class AdaptiveFrameSkipController:
+    """
+    Chooses how many source frames to advance between inferences (and optionally the
+    inference size) so that a video is processed at least at target_speed x real-time.
+
+    The decoder asks should_process() for every frame, the inference stage reports its
+    measured latency through record_inference(), the annotator reports its own per-frame
+    cost through record_stage() and flags active weapon tracks through set_weapon_active().
+    The skip is planned from the slowest of these stages, since that one sets the pace. While a weapon is being tracked the controller
+    accepts running slower than the target (active_speed) so it samples more densely.
+    """
+
+    def __init__(self, fps, target_speed=1.0, min_skip=1, max_skip=8, initial_skip=2,
+                 inference_sizes=(480,), active_speed=0.5, smoothing=0.3, headroom=1.1, start_frame=0):
+        self.fps = fps
+        self.target_speed = target_speed
+        self.active_speed = min(active_speed, target_speed)
+        self.min_skip = max(1, min_skip)
+        self.max_skip = max(self.min_skip, max_skip)
+        self.inference_sizes = list(inference_sizes) or [480]
+        self.smoothing = smoothing
+        self.headroom = headroom
+        self.skip = min(max(initial_skip, self.min_skip), self.max_skip)
+        self.size_index = 0
+        self.latency = None  # Smoothed seconds of inference per processed frame
+        self.stage_latency = {}  # Smoothed seconds per processed frame of the other pipeline stages
+        self.weapon_active = False
+        self.decisions = 0
+        self.start_frame = start_frame  # First frame of this run, non-zero when a job is resumed
+        self._next_frame = start_frame + self.skip
+        self._started = None
+        self._lock = _threading.Lock()
+
+    @property
+    def inference_size(self):
+        return self.inference_sizes[self.size_index]
+
+    def should_process(self, frame_idx):
+        """Return True if frame_idx (1-based) should be sent to the model."""
+        with self._lock:
+            if self._started is None:
+                self._started = time.time()
+            if frame_idx < self._next_frame:
+                return False
+            self._next_frame = frame_idx + self.skip
+            return True
+
+    def record_inference(self, seconds, frames=1, frame_idx=None):
+        """Feed the latency of one inference call covering `frames` frames and re-plan."""
+        if frames <= 0:
+            return
+        per_frame = seconds / frames
+        with self._lock:
+            if self.latency is None:
+                self.latency = per_frame
+            else:
+                self.latency = self.smoothing * per_frame + (1 - self.smoothing) * self.latency
+            self._plan(frame_idx)
+
+    def record_stage(self, name, seconds, frames=1):
+        """Feed the per-frame cost of another pipeline stage (e.g. annotate/encode); re-planned on the next inference."""
+        if frames <= 0:
+            return
+        per_frame = seconds / frames
+        with self._lock:
+            previous = self.stage_latency.get(name)
+            self.stage_latency[name] = per_frame if previous is None else (
+                self.smoothing * per_frame + (1 - self.smoothing) * previous)
+
+    @property
+    def bottleneck_latency(self):
+        """Per-frame cost of the slowest stage (inference or any recorded stage)"""
+        if self.latency is None:
+            return None
+        return max([self.latency] + list(self.stage_latency.values()))
+
+    def set_weapon_active(self, active):
+        """Mark whether a weapon track is currently visible."""
+        with self._lock:
+            if active != self.weapon_active:
+                self.weapon_active = active
+                self._plan(None)
+
+    def lag_seconds(self, frame_idx):
+        """How far processing is behind the target schedule, in seconds of wall-clock time."""
+        if self._started is None or not self.fps:
+            return 0.0
+        expected = (frame_idx - self.start_frame) / self.fps / self.target_speed
+        return (time.time() - self._started) - expected
+
+    def _plan(self, frame_idx):
+        if self.latency is None:
+            return
+        speed = self.active_speed if self.weapon_active else self.target_speed
+        # To keep up, each inference may cost at most skip / (fps * speed) seconds
+        required = self.fps * speed * self.bottleneck_latency * self.headroom
+        skip = max(self.min_skip, math.ceil(required))
+        if frame_idx is not None and not self.weapon_active and self.lag_seconds(frame_idx) > 1.0:
+            skip += 1  # Already behind schedule: catch up instead of only keeping pace
+        if skip > self.max_skip:
+            # Still too slow at the largest skip: fall back to a smaller input size if allowed
+            if self.size_index < len(self.inference_sizes) - 1:
+                self.size_index += 1
+            skip = self.max_skip
+        elif required < self.min_skip * 0.5 and self.size_index > 0:
+            # Plenty of spare capacity at the smallest skip: restore a larger input size
+            self.size_index -= 1
+        if skip != self.skip:
+            self.decisions += 1
+        self.skip = skip
+
+    def to_dict(self):
+        """Current decision, for progress events."""
+        return {
+            'frameSkip': self.skip,
+            'inferenceSize': self.inference_size,
+            'inferenceLatencyMs': round(self.latency * 1000, 1) if self.latency is not None else None,
+            'bottleneckLatencyMs': round(self.bottleneck_latency * 1000, 1) if self.latency is not None else None,
+            'targetSpeed': self.target_speed,
+            'weaponActive': self.weapon_active,
+            'skipChanges': self.decisions
+        }
@@ -33,3 +33,23 @@ def validate_request_data(data, required_fields):
         return False, f"Missing required fields: {', '.join(missing_fields)}"
     
     return True, None
+
+def parse_bool(value, default=False):
+    """
+    Parse a boolean form/query value such as "true", "1", "no" or "off".
+
+    Args:
+        value (str): The raw value, or None if it was not provided
+        default (bool): Returned when the value is missing or unrecognized
+
+    Returns:
+        bool: The parsed value
+    """
+    if value is None:
+        return default
+    value = str(value).strip().lower()
+    if value in ('1', 'true', 'yes', 'on'):
+        return True
+    if value in ('0', 'false', 'no', 'off'):
+        return False
+    return default
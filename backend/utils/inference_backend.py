@@ -0,0 +1,264 @@
+import os
+import sys
+import json
+import glob
+import shutil
+import hashlib
+import argparse
+import threading
+import datetime
+import numpy as np
+
+# Backends that can serve the detection model, and the precisions each supports
+SUPPORTED_BACKENDS = {
+    'torch': ('fp32',),
+    'onnx': ('fp32', 'int8'),
+    'openvino': ('fp32', 'int8'),
+}
+
+# Fixed export arguments so the same weights always produce the same artifact
+EXPORT_OPSET = 18
+EXPORT_IMGSZ = 640
+
+_export_lock = threading.Lock()
+
+
+def file_sha256(path):
+    """Return the SHA-256 hex digest of a file."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_detection_model(weights, backend='torch', precision='fp32', export_dir=None, calibration_data=None):
+    """
+    Load the detection model for the configured backend.
+
+    'torch' loads the .pt weights directly. 'onnx' and 'openvino' load an exported copy
+    of the same weights, exporting it first if needed (see export_model). Every backend
+    is returned as an ultralytics YOLO object, so predict()/plot() behave the same.
+    """
+    from ultralytics import YOLO
+
+    if backend not in SUPPORTED_BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}', expected one of {sorted(SUPPORTED_BACKENDS)}")
+    if precision not in SUPPORTED_BACKENDS[backend]:
+        raise ValueError(f"Backend '{backend}' does not support precision '{precision}'")
+    if backend == 'torch':
+        return YOLO(weights)
+    artifact = export_model(weights, backend, precision, export_dir, calibration_data)
+    return YOLO(artifact, task='detect')
+
+
+def model_memory_bytes(detection_model):
+    """Approximate memory of one model instance: tensor sizes for PyTorch, file size for exported models."""
+    import torch
+
+    if isinstance(detection_model.model, torch.nn.Module):
+        tensors = list(detection_model.model.parameters()) + list(detection_model.model.buffers())
+        return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+    path = str(detection_model.model)
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+def export_model(weights, backend, precision='fp32', export_dir=None, calibration_data=None):
+    """
+    Export weights to `backend` at `precision` and return the artifact path.
+
+    Artifacts are cached under export_dir/<weights sha256>/<backend>-<precision>/ with a
+    manifest of the export settings; an existing artifact is reused only if its manifest
+    matches, so re-exports happen exactly when the weights or settings change.
+    """
+    export_dir = export_dir or os.path.join(os.path.dirname(os.path.abspath(weights)), 'exports')
+    weights_hash = file_sha256(weights)
+    target_dir = os.path.join(export_dir, weights_hash[:16], f"{backend}-{precision}")
+    manifest = {
+        'weights': os.path.basename(weights),
+        'weights_sha256': weights_hash,
+        'backend': backend,
+        'precision': precision,
+        'imgsz': EXPORT_IMGSZ,
+        'dynamic': True,
+        'opset': EXPORT_OPSET if backend == 'onnx' else None,
+        'calibration_data': calibration_data if backend == 'openvino' and precision == 'int8' else None,
+    }
+
+    with _export_lock:
+        cached = _read_manifest(target_dir)
+        if cached and all(cached.get(key) == value for key, value in manifest.items()):
+            artifact = os.path.join(target_dir, cached['artifact'])
+            if os.path.exists(artifact):
+                return artifact
+
+        print(f"Exporting {weights} to {backend} ({precision}), this happens once per weights file")
+        shutil.rmtree(target_dir, ignore_errors=True)
+        os.makedirs(target_dir, exist_ok=True)
+        if backend == 'onnx':
+            artifact_name = _export_onnx(weights, target_dir, precision)
+        else:
+            artifact_name = _export_openvino(weights, target_dir, precision, calibration_data)
+
+        from ultralytics import __version__ as ultralytics_version
+        manifest.update({
+            'artifact': artifact_name,
+            'ultralytics_version': ultralytics_version,
+            'created_at': datetime.datetime.utcnow().isoformat()
+        })
+        with open(os.path.join(target_dir, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        return os.path.join(target_dir, artifact_name)
+
+
+def _read_manifest(target_dir):
+    try:
+        with open(os.path.join(target_dir, 'manifest.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _export_onnx(weights, target_dir, precision):
+    from ultralytics import YOLO
+
+    # ultralytics writes the export next to the weights; move it into the cache directory
+    exported = YOLO(weights).export(format='onnx', imgsz=EXPORT_IMGSZ, dynamic=True,
+                                    opset=EXPORT_OPSET, simplify=False, verbose=False)
+    fp32_path = os.path.join(target_dir, 'model.onnx')
+    shutil.move(exported, fp32_path)
+    if precision == 'fp32':
+        return 'model.onnx'
+
+    # Dynamic INT8 quantization: int8 weights, activations quantized at run time. No
+    # calibration data is needed and the result is deterministic for a given model.
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    int8_path = os.path.join(target_dir, 'model-int8.onnx')
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QUInt8)
+    # Keep the class-name metadata ultralytics stored in the fp32 model
+    _copy_onnx_metadata(fp32_path, int8_path)
+    os.remove(fp32_path)
+    return 'model-int8.onnx'
+
+
+def _copy_onnx_metadata(source_path, target_path):
+    import onnx
+
+    source = onnx.load(source_path, load_external_data=False)
+    target = onnx.load(target_path)
+    existing = {prop.key for prop in target.metadata_props}
+    for prop in source.metadata_props:
+        if prop.key not in existing:
+            target.metadata_props.append(prop)
+    onnx.save(target, target_path)
+
+
+def _export_openvino(weights, target_dir, precision, calibration_data):
+    from ultralytics import YOLO
+
+    if precision == 'int8' and not calibration_data:
+        raise ValueError("OpenVINO INT8 export needs calibration data (INT8_CALIBRATION_DATA dataset yaml)")
+    export_args = {'format': 'openvino', 'imgsz': EXPORT_IMGSZ, 'dynamic': True, 'verbose': False}
+    if precision == 'int8':
+        export_args.update({'int8': True, 'data': calibration_data})
+    exported = YOLO(weights).export(**export_args)
+    # The directory name must end in _openvino_model for ultralytics to recognise it
+    artifact_name = os.path.basename(os.path.normpath(exported))
+    shutil.move(exported, os.path.join(target_dir, artifact_name))
+    return artifact_name
+
+
+def box_iou(box_a, box_b):
+    """IoU of two [x1, y1, x2, y2] boxes."""
+    x1, y1 = max(box_a[0], box_b[0]), max(box_a[1], box_b[1])
+    x2, y2 = min(box_a[2], box_b[2]), min(box_a[3], box_b[3])
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = (box_a[2] - box_a[0]) * (box_a[3] - box_a[1]) + (box_b[2] - box_b[0]) * (box_b[3] - box_b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def parity_check(candidate, reference, images, iou_threshold=0.9, conf_tolerance=0.05, conf=0.25, imgsz=640):
+    """
+    Compare a candidate backend's detections with the reference (PyTorch) model.
+
+    Every reference box above `conf` must be matched by a candidate box of the same class
+    with IoU >= iou_threshold and |confidence difference| <= conf_tolerance, and vice versa.
+    Returns a report dict whose 'passed' field is the overall verdict.
+    """
+    report = {'images': 0, 'reference_boxes': 0, 'candidate_boxes': 0, 'unmatched': 0,
+              'max_conf_delta': 0.0, 'min_iou': 1.0, 'failures': []}
+    for image in images:
+        ref_boxes = _boxes(reference, image, conf, imgsz)
+        cand_boxes = _boxes(candidate, image, conf, imgsz)
+        report['images'] += 1
+        report['reference_boxes'] += len(ref_boxes)
+        report['candidate_boxes'] += len(cand_boxes)
+        unused = list(range(len(cand_boxes)))
+        for ref in ref_boxes:
+            best, best_iou = None, 0.0
+            for index in unused:
+                cand = cand_boxes[index]
+                if cand[5] != ref[5]:
+                    continue
+                iou = box_iou(ref[:4], cand[:4])
+                if iou > best_iou:
+                    best, best_iou = index, iou
+            if best is None or best_iou < iou_threshold or abs(cand_boxes[best][4] - ref[4]) > conf_tolerance:
+                report['unmatched'] += 1
+                report['failures'].append({'image': _image_name(image), 'reference_box': [round(v, 3) for v in ref]})
+                continue
+            unused.remove(best)
+            report['min_iou'] = min(report['min_iou'], best_iou)
+            report['max_conf_delta'] = max(report['max_conf_delta'], abs(cand_boxes[best][4] - ref[4]))
+        for index in unused:
+            report['unmatched'] += 1
+            report['failures'].append({'image': _image_name(image), 'candidate_box': [round(v, 3) for v in cand_boxes[index]]})
+    report['max_conf_delta'] = round(report['max_conf_delta'], 4)
+    report['min_iou'] = round(report['min_iou'], 4)
+    report['passed'] = report['unmatched'] == 0
+    return report
+
+
+def _boxes(model, image, conf, imgsz):
+    result = model.predict(image, conf=conf, imgsz=imgsz, verbose=False)[0]
+    if result.boxes is None or len(result.boxes) == 0:
+        return []
+    return result.boxes.data.cpu().numpy()[:, :6].astype(float).tolist()
+
+
+def _image_name(image):
+    return image if isinstance(image, str) else f"array{tuple(np.shape(image))}"
+
+
+def main(argv=None):
+    """Export the configured weights and check the exported model against PyTorch."""
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from config import MODEL_WEIGHTS, IMAGE_UPLOAD_FOLDER, EXPORT_FOLDER, INT8_CALIBRATION_DATA
+
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('--weights', default=MODEL_WEIGHTS)
+    parser.add_argument('--backend', default='onnx', choices=[b for b in SUPPORTED_BACKENDS if b != 'torch'])
+    parser.add_argument('--precision', default='fp32', choices=['fp32', 'int8'])
+    parser.add_argument('--images', nargs='*', help='Images to compare on (default: uploads/images)')
+    parser.add_argument('--iou', type=float, default=0.9, help='Minimum IoU between matched boxes')
+    parser.add_argument('--conf-tolerance', type=float, default=0.05, help='Maximum confidence difference')
+    parser.add_argument('--conf', type=float, default=0.25, help='Confidence threshold for both models')
+    args = parser.parse_args(argv)
+
+    images = args.images or sorted(glob.glob(os.path.join(IMAGE_UPLOAD_FOLDER, '*')))
+    if not images:
+        parser.error('No images to compare on')
+    reference = load_detection_model(args.weights, 'torch')
+    candidate = load_detection_model(args.weights, args.backend, args.precision,
+                                     EXPORT_FOLDER, INT8_CALIBRATION_DATA)
+    report = parity_check(candidate, reference, images, iou_threshold=args.iou,
+                          conf_tolerance=args.conf_tolerance, conf=args.conf)
+    report.update({'backend': args.backend, 'precision': args.precision})
+    print(json.dumps(report, indent=2))
+    return 0 if report['passed'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,357 @@
+"""
+Detection models served by a pool of worker processes.
+
+The web process monkey-patches everything for eventlet, so a model call made there holds the
+GIL (and, from a green thread, the whole hub) for the length of the forward pass. Each worker
+is a separate `python -m utils.inference_workers` process that loads the model once and serves
+predict() calls; frames are passed through a per-worker shared-memory block and only the
+detection arrays come back. WorkerModel mimics the parts of the ultralytics YOLO object the
+app uses (predict(), __call__, names), so pools, the tiler and the tracker work unchanged.
+"""
+import os
+import sys
+import json
+import time
+import atexit
+import multiprocessing.connection
+from multiprocessing import shared_memory, resource_tracker
+import numpy as np
+from eventlet import patcher
+
+# Callers are pipeline OS threads and (through tpool) green threads; the workers themselves are
+# plain subprocesses, because multiprocessing's spawn would re-import app.py in every child
+_threading = patcher.original('threading')
+_socket = patcher.original('socket')
+_subprocess = patcher.original('subprocess')
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class WorkerError(RuntimeError):
+    """A worker failed a request."""
+
+
+class WorkerExited(WorkerError):
+    """A worker process died, or never became ready; the pool restarts it."""
+
+
+def call_off_hub(fn, *args):
+    """Call a blocking fn(*args); from the eventlet hub, in a native thread so other green threads keep running."""
+    if _threading.current_thread() is _threading.main_thread():
+        from eventlet import tpool
+        return tpool.execute(fn, *args)
+    return fn(*args)
+
+
+class _Worker:
+    """Parent-side handle on one worker process and its shared-memory frame buffer."""
+
+    def __init__(self, index, model_args):
+        self.index = index
+        self.model_args = model_args
+        self.process = None
+        self.conn = None
+        self.info = None
+        self.shm = None
+        self.requests = 0
+
+    def spawn(self):
+        parent_socket, child_socket = _socket.socketpair()
+        # Same working directory as the web process, so relative weight paths resolve the same way
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [BACKEND_DIR, os.environ.get('PYTHONPATH')])))
+        self.process = _subprocess.Popen(
+            [sys.executable, '-m', 'utils.inference_workers', str(child_socket.fileno()), json.dumps(self.model_args)],
+            pass_fds=(child_socket.fileno(),),
+            env=env
+        )
+        child_socket.close()
+        self.conn = multiprocessing.connection.Connection(parent_socket.detach())
+        self.info = None
+
+    def wait_ready(self, timeout):
+        """Block until the worker has loaded its model; raises WorkerExited if it could not."""
+        if self.info is not None:
+            return
+        if not self.conn.poll(timeout):
+            raise WorkerExited(f"Inference worker {self.index} did not load its model within {timeout:.0f}s")
+        kind, payload = self._recv()
+        if kind != 'ready':
+            raise WorkerExited(f"Inference worker {self.index} failed to start: {payload}")
+        self.info = payload
+        print(f"Inference worker {self.index} ready (pid {payload['pid']}, model loaded in {payload['load_seconds']}s)")
+
+    def predict(self, frames, predict_args):
+        """Copy frames into shared memory, run predict() in the worker, return [(boxes, speed)]."""
+        layout = []
+        offset = 0
+        for frame in frames:
+            layout.append((offset, frame.shape))
+            offset += frame.nbytes
+        if self.shm is None or self.shm.size < offset:
+            self._resize(offset)
+        buffer = self.shm.buf
+        for (start, shape), frame in zip(layout, frames):
+            np.ndarray(shape, np.uint8, buffer, start)[...] = frame
+        self.conn.send(('predict', self.shm.name, layout, predict_args))
+        kind, payload = self._recv()
+        if kind != 'ok':
+            raise WorkerError(f"Inference worker {self.index}: {payload}")
+        self.requests += 1
+        return payload
+
+    def stop(self, timeout=5):
+        try:
+            self.conn.send(('stop',))
+        except (OSError, AttributeError):
+            pass
+        self.close(timeout)
+
+    def close(self, timeout=5):
+        if self.process is not None:
+            try:
+                self.process.wait(timeout)
+            except _subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        if self.conn is not None:
+            self.conn.close()
+        self._release_shm()
+
+    def _recv(self):
+        try:
+            return self.conn.recv()
+        except (EOFError, OSError) as e:
+            raise WorkerExited(f"Inference worker {self.index} exited ({type(e).__name__})") from e
+
+    def _resize(self, size):
+        # Grow geometrically so a few larger frames do not cause a resize per batch
+        previous_size = self.shm.size if self.shm is not None else 0
+        self._release_shm()
+        self.shm = shared_memory.SharedMemory(create=True, size=max(size, 2 * previous_size))
+
+    def _release_shm(self):
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+
+class InferenceWorkerPool:
+    """
+    `size` worker processes, each holding one model loaded with `model_args`
+    (load_detection_model keyword arguments).
+
+    Any caller checks out whichever worker is idle for one predict() call, so video jobs,
+    streams and image requests share the workers; a worker that dies is restarted and the
+    request it was serving fails with WorkerExited.
+    """
+
+    def __init__(self, size, model_args, startup_timeout=300.0):
+        self.size = max(1, size)
+        self.model_args = model_args
+        self.startup_timeout = startup_timeout
+        self._workers = [_Worker(index, model_args) for index in range(self.size)]
+        self._idle = []
+        self._started = False
+        self._restarts = 0
+        self._waits = 0
+        self._condition = _threading.Condition()
+
+    def start(self):
+        """Spawn the workers; they load their models in parallel. Safe to call more than once."""
+        with self._condition:
+            if self._started:
+                return
+            self._started = True
+            if self.model_args.get('backend', 'torch') != 'torch':
+                # Export once here rather than racing the same export in every worker
+                from utils.inference_backend import export_model
+                export_model(self.model_args['weights'], self.model_args['backend'], self.model_args.get('precision', 'fp32'),
+                             self.model_args.get('export_dir'), self.model_args.get('calibration_data'))
+            for worker in self._workers:
+                worker.spawn()
+            self._idle = list(self._workers)
+            self._condition.notify_all()
+        atexit.register(self.stop)
+
+    def stop(self):
+        with self._condition:
+            workers, self._idle, self._started = self._workers, [], False
+        for worker in workers:
+            worker.stop()
+
+    def model(self):
+        """A WorkerModel handle: what create_model() returns when inference runs in workers."""
+        return WorkerModel(self)
+
+    def predict(self, frames, predict_args):
+        """Run predict() on a list of uint8 frames in an idle worker (blocking the calling OS thread)."""
+        self.start()
+        worker = self._checkout()
+        try:
+            worker.wait_ready(self.startup_timeout)
+            return worker.predict(frames, predict_args)
+        except WorkerExited:
+            self._restart(worker)
+            raise
+        finally:
+            self._checkin(worker)
+
+    def names(self):
+        """Class names of the served model (waits for a worker to be ready)."""
+        for worker in self._workers:
+            if worker.info:
+                return worker.info['names']
+        self.start()
+        worker = self._checkout()
+        try:
+            worker.wait_ready(self.startup_timeout)
+            return worker.info['names']
+        except WorkerExited:
+            self._restart(worker)
+            raise
+        finally:
+            self._checkin(worker)
+
+    def wait_ready(self):
+        """Start the workers and block until every one has loaded its model and run its warm-up pass."""
+        self.start()
+        workers = [self._checkout() for _ in range(self.size)]
+        try:
+            for worker in workers:
+                try:
+                    worker.wait_ready(self.startup_timeout)
+                except WorkerExited:
+                    self._restart(worker)
+                    raise
+        finally:
+            for worker in workers:
+                self._checkin(worker)
+
+    def memory_bytes(self):
+        """Model memory reported by the workers that are up."""
+        return sum(worker.info['memory_bytes'] for worker in self._workers if worker.info)
+
+    def busy(self):
+        with self._condition:
+            return len(self._workers) - len(self._idle) if self._started else 0
+
+    def stats(self):
+        with self._condition:
+            return {
+                'size': self.size,
+                'busy': len(self._workers) - len(self._idle) if self._started else 0,
+                'ready': sum(1 for worker in self._workers if worker.info),
+                'requests': sum(worker.requests for worker in self._workers),
+                'waits': self._waits,
+                'restarts': self._restarts
+            }
+
+    def _checkout(self):
+        with self._condition:
+            if not self._idle:
+                self._waits += 1
+            while not self._idle:
+                self._condition.wait()
+            return self._idle.pop()
+
+    def _checkin(self, worker):
+        with self._condition:
+            if self._started:
+                self._idle.append(worker)
+                self._condition.notify()
+
+    def _restart(self, worker):
+        print(f"Restarting inference worker {worker.index}")
+        worker.close(timeout=1)
+        with self._condition:
+            self._restarts += 1
+            if not self._started:
+                return
+        worker.spawn()
+
+
+class WorkerModel:
+    """Stand-in for a YOLO model whose predict() runs in the InferenceWorkerPool."""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self._names = None
+
+    @property
+    def names(self):
+        if self._names is None:
+            self._names = call_off_hub(self.pool.names)
+        return self._names
+
+    def predict(self, source, **predict_args):
+        """Same call as YOLO.predict for one frame or a list of frames; returns ultralytics Results."""
+        frames = list(source) if isinstance(source, (list, tuple)) else [source]
+        return call_off_hub(self._predict, frames, predict_args)
+
+    __call__ = predict
+
+    def _predict(self, frames, predict_args):
+        import torch
+        from ultralytics.engine.results import Results
+        predict_args = {key: value for key, value in predict_args.items() if key != 'verbose'}
+        contiguous = [np.ascontiguousarray(frame, dtype=np.uint8) for frame in frames]
+        outputs = self.pool.predict(contiguous, predict_args)
+        names = self.names
+        return [
+            Results(orig_img=frame, path='', names=names, boxes=torch.from_numpy(boxes), speed=speed)
+            for frame, (boxes, speed) in zip(frames, outputs)
+        ]
+
+
+def worker_main(fd, model_args):
+    """Worker process: load the model, then serve predict requests until told to stop."""
+    from utils.inference_backend import load_detection_model, model_memory_bytes
+
+    conn = multiprocessing.connection.Connection(fd)
+    started = time.time()
+    try:
+        model = load_detection_model(**model_args)
+        # One forward pass so the first real request does not pay for lazy initialization
+        model.predict(np.zeros((64, 64, 3), dtype=np.uint8), verbose=False)
+        conn.send(('ready', {
+            'pid': os.getpid(),
+            'names': model.names,
+            'memory_bytes': model_memory_bytes(model),
+            'load_seconds': round(time.time() - started, 2)
+        }))
+    except Exception as e:
+        conn.send(('error', f"{type(e).__name__}: {e}"))
+        return
+
+    shm = None
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break  # The web process went away
+        if message[0] == 'stop':
+            break
+        _, shm_name, layout, predict_args = message
+        try:
+            if shm is None or shm.name != shm_name:
+                # The parent created (and will unlink) the block; keep this process's tracker out of it.
+                # The previous block is left to the garbage collector, since the predictor may still reference it
+                shm = shared_memory.SharedMemory(name=shm_name)
+                resource_tracker.unregister(shm._name, 'shared_memory')
+            frames = [np.ndarray(shape, np.uint8, shm.buf, offset) for offset, shape in layout]
+            results = model.predict(source=frames, verbose=False, **predict_args)
+            reply = [
+                (result.boxes.data.cpu().numpy() if result.boxes is not None else np.zeros((0, 6), np.float32),
+                 result.speed)
+                for result in results
+            ]
+            del frames, results
+            conn.send(('ok', reply))
+        except Exception as e:
+            conn.send(('error', f"{type(e).__name__}: {e}"))
+
+
+if __name__ == '__main__':
+    sys.path.insert(0, BACKEND_DIR)
+    worker_main(int(sys.argv[1]), json.loads(sys.argv[2]))
@@ -0,0 +1,222 @@
+import datetime
+import itertools
+import os
+import socket
+import time
+from sqlalchemy.exc import IntegrityError
+from models import db
+from models.video_job import VideoJob, JobClaim
+from models.upload import UploadSession
+from utils.job_scheduler import ScheduledJob
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class DatabaseJobQueue:
+    """
+    Video job queue kept in the database, drained by detection workers (JOB_BROKER=database).
+
+    In the web process it stands in for VideoJobScheduler: jobs are already persisted as queued
+    VideoJob rows, so submit() has nothing left to do, and positions, cancellation and priorities
+    are read from and written to the database. Workers claim jobs with claim_next() and keep their
+    claims alive with heartbeat(). All methods must be called inside an app context.
+    """
+
+    def __init__(self, lease_timeout=60.0):
+        self.lease_timeout = lease_timeout
+        self._seq = itertools.count()
+        self._cancel_requested = set()
+
+    def submit(self, fn, args=(), session_id=None, priority=0, job_id=None):
+        """The persisted job is picked up by a worker; returns a ScheduledJob for the caller's response."""
+        return ScheduledJob(job_id, fn, args, session_id, priority, next(self._seq))
+
+    def cancel(self, job_id):
+        """
+        Cancel a job. A queued job gets a claim without a worker, so no worker can pick it up;
+        a claimed job is flagged and its worker stops it at the next heartbeat.
+        """
+        db.session.add(JobClaim(job_id=job_id, cancel_requested=True))
+        try:
+            db.session.commit()
+            return True
+        except IntegrityError:
+            db.session.rollback()
+        flagged = JobClaim.query.filter_by(job_id=job_id).update({'cancel_requested': True})
+        db.session.commit()
+        return flagged > 0
+
+    def is_cancel_requested(self, job_id):
+        """Whether this worker's job was cancelled (as of the last heartbeat)."""
+        return job_id in self._cancel_requested
+
+    def reprioritize(self, job_id, priority):
+        """Workers read the priority from the job row, which the caller has already updated."""
+        return self.position(job_id) not in (None, 0)
+
+    def position(self, job_id):
+        """1-based queue position of a job, 0 if a worker has claimed it, None if it is not waiting."""
+        claim = db.session.get(JobClaim, job_id)
+        if claim is not None:
+            return 0 if claim.worker_id is not None else None
+        for index, (queued_id,) in enumerate(self._queued().with_entities(VideoJob.id)):
+            if queued_id == job_id:
+                return index + 1
+        return None
+
+    def stats(self):
+        """Return queue depth, claimed jobs and the workers that heartbeat within the lease."""
+        claims = JobClaim.query.filter(JobClaim.worker_id.isnot(None))
+        return {
+            'broker': 'database',
+            'running': claims.count(),
+            'queued': self._queued().count(),
+            'workers': claims.filter(JobClaim.heartbeat_at >= self._lease_cutoff())
+                             .with_entities(JobClaim.worker_id).distinct().count()
+        }
+
+    def claim_next(self, worker_id):
+        """
+        Claim a job for `worker_id`: one whose worker stopped heartbeating, else the next queued
+        job by priority and age. Returns the job ID, or None if there is nothing to do.
+        """
+        now = datetime.datetime.utcnow()
+        stale = JobClaim.query.filter(JobClaim.worker_id.isnot(None), JobClaim.heartbeat_at < self._lease_cutoff())
+        for claim in stale.all():
+            job_id, previous_worker, cancel_requested = claim.job_id, claim.worker_id, claim.cancel_requested
+            # Conditional on the old heartbeat, so only one of the workers noticing it takes over
+            taken = JobClaim.query.filter_by(job_id=job_id, heartbeat_at=claim.heartbeat_at).update(
+                {'worker_id': worker_id, 'claimed_at': now, 'heartbeat_at': now}, synchronize_session=False
+            )
+            db.session.commit()
+            if taken:
+                print(f"Worker {worker_id} took over video job {job_id} from {previous_worker}")
+                if cancel_requested:
+                    self._cancel_requested.add(job_id)
+                return job_id
+        for (job_id,) in self._queued().with_entities(VideoJob.id).limit(10):
+            db.session.add(JobClaim(job_id=job_id, worker_id=worker_id, claimed_at=now, heartbeat_at=now))
+            try:
+                db.session.commit()
+                return job_id
+            except IntegrityError:
+                db.session.rollback()  # Another worker claimed it first
+        return None
+
+    def heartbeat(self, worker_id, job_ids):
+        """Renew this worker's claims and pick up cancellations of its jobs."""
+        if not job_ids:
+            return
+        claims = JobClaim.query.filter(JobClaim.job_id.in_(job_ids), JobClaim.worker_id == worker_id)
+        claims.update({'heartbeat_at': datetime.datetime.utcnow()}, synchronize_session=False)
+        db.session.commit()
+        self._cancel_requested.update(
+            job_id for (job_id,) in claims.filter(JobClaim.cancel_requested.is_(True)).with_entities(JobClaim.job_id)
+        )
+
+    def release(self, job_id):
+        """Drop a finished job's claim."""
+        JobClaim.query.filter_by(job_id=job_id).delete()
+        db.session.commit()
+        self._cancel_requested.discard(job_id)
+
+    def _queued(self):
+        return VideoJob.query.outerjoin(JobClaim, JobClaim.job_id == VideoJob.id).filter(
+            VideoJob.state.in_(VideoJob.RESUMABLE_STATES), JobClaim.job_id.is_(None)
+        ).order_by(VideoJob.priority.desc(), VideoJob.created_at)
+
+    def _lease_cutoff(self):
+        return datetime.datetime.utcnow() - datetime.timedelta(seconds=self.lease_timeout)
+
+
+class JobWorker:
+    """
+    A detection worker process's main loop: claim jobs from a DatabaseJobQueue and run up to
+    `concurrency` of them at a time as background tasks, heartbeating their claims.
+
+    Jobs started before their chunked upload finished learn about new chunks by polling the
+    upload rows, since the chunks arrive at a web process.
+    """
+
+    def __init__(self, app, queue, run_job, socketio, upload_registry=None, worker_id=None, concurrency=1,
+                 poll_interval=1.0, heartbeat_interval=5.0):
+        self.app = app
+        self.queue = queue
+        self.run_job = run_job
+        self.socketio = socketio
+        self.upload_registry = upload_registry
+        self.worker_id = worker_id or default_worker_id()
+        self.concurrency = max(1, concurrency)
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.completed = []
+        self._running = {}
+        self._stopping = False
+
+    def run(self, exit_when_idle=None):
+        """Work until stop() is called or, with `exit_when_idle`, nothing was left to do for that many seconds."""
+        print(f"Detection worker {self.worker_id} started (concurrency {self.concurrency})")
+        last_heartbeat = 0.0
+        idle_since = time.monotonic()
+        while not self._stopping:
+            with self.app.app_context():
+                if time.monotonic() - last_heartbeat >= self.heartbeat_interval:
+                    last_heartbeat = time.monotonic()
+                    self.queue.heartbeat(self.worker_id, list(self._running))
+                self._refresh_uploads()
+                while len(self._running) < self.concurrency:
+                    job_id = self.queue.claim_next(self.worker_id)
+                    if job_id is None:
+                        break
+                    self._start(job_id)
+            if self._running:
+                idle_since = time.monotonic()
+            elif exit_when_idle is not None and time.monotonic() - idle_since >= exit_when_idle:
+                break
+            self.socketio.sleep(self.poll_interval)
+        print(f"Detection worker {self.worker_id} stopped after {len(self.completed)} job(s)")
+
+    def stop(self):
+        """Stop claiming jobs; jobs still running keep their claims until they finish."""
+        self._stopping = True
+
+    def _start(self, job_id):
+        video_job = db.session.get(VideoJob, job_id)
+        print(f"Worker {self.worker_id} claimed video job {job_id}")
+        if video_job is not None:
+            self.socketio.emit("video_queue_position", {
+                "job_id": job_id,
+                "position": 0,
+                "state": 'running',
+                "worker_id": self.worker_id,
+                "session_id": video_job.session_id
+            }, room=video_job.session_id)
+        self._running[job_id] = self.socketio.start_background_task(self._run, job_id)
+
+    def _run(self, job_id):
+        try:
+            self.run_job(self.app, job_id)
+        except Exception as e:
+            print(f"Error in video job {job_id}: {str(e)}")
+        finally:
+            with self.app.app_context():
+                self.queue.release(job_id)
+            self._running.pop(job_id, None)
+            self.completed.append(job_id)
+
+    def _refresh_uploads(self):
+        if self.upload_registry is None or not self._running:
+            return
+        uploads = UploadSession.query.filter(UploadSession.job_id.in_(list(self._running)))
+        for upload in uploads:
+            growing_upload = self.upload_registry.get(upload.id)
+            if growing_upload is None:
+                continue
+            if upload.state == 'aborted':
+                growing_upload.abort()
+            else:
+                growing_upload.advance(upload.received)
+            if upload.state in UploadSession.FINAL_STATES:
+                self.upload_registry.discard(upload.id)
@@ -0,0 +1,224 @@
+import heapq
+import itertools
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+
+class ModelPool:
+    """
+    A fixed-size pool of model instances.
+
+    Models are created lazily by `factory` the first time they are needed, and each
+    running video job checks one out for its whole duration, so no instance (and none of
+    its predictor state) is ever used by two jobs at once.
+    """
+
+    def __init__(self, factory, size):
+        self._factory = factory
+        self.size = max(1, size)
+        self._idle = []
+        self._created = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def acquire(self):
+        """Check out a model instance for the duration of a with-block."""
+        model = None
+        create = False
+        with self._lock:
+            if self._idle:
+                model = self._idle.pop()
+            elif self._created < self.size:
+                self._created += 1
+                create = True
+        if create:
+            try:
+                model = self._factory()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        if model is None:
+            raise RuntimeError("Model pool exhausted")
+        try:
+            yield model
+        finally:
+            with self._lock:
+                self._idle.append(model)
+
+    def stats(self):
+        """Return pool usage counters."""
+        with self._lock:
+            return {'size': self.size, 'created': self._created, 'idle': len(self._idle)}
+
+
+class ScheduledJob:
+    """A video job waiting in, or started by, the VideoJobScheduler."""
+
+    def __init__(self, job_id, fn, args, session_id, priority, seq):
+        self.job_id = job_id
+        self.fn = fn
+        self.args = args
+        self.session_id = session_id
+        self.priority = priority
+        self.seq = seq
+        self.state = 'queued'
+        self.cancel_requested = False
+        self.submitted_at = time.time()
+        self.started_at = None
+
+    def sort_key(self):
+        # Higher priority first, FIFO within the same priority
+        return (-self.priority, self.seq)
+
+    def to_dict(self):
+        """Convert the job to a dictionary."""
+        return {
+            'job_id': self.job_id,
+            'session_id': self.session_id,
+            'priority': self.priority,
+            'state': self.state,
+            'submitted_at': self.submitted_at,
+            'started_at': self.started_at
+        }
+
+
+class VideoJobScheduler:
+    """
+    Runs video jobs as Socket.IO background tasks with at most `max_concurrent` at a time.
+
+    Extra jobs wait in a priority queue (FIFO among equal priorities). Every queued job's
+    room receives a `video_queue_position` event whenever its position changes, with
+    position 0 meaning the job has started.
+    """
+
+    def __init__(self, socketio, max_concurrent=2):
+        self.socketio = socketio
+        self.max_concurrent = max(1, max_concurrent)
+        self._queue = []
+        self._running = {}
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def submit(self, fn, args=(), session_id=None, priority=0, job_id=None):
+        """Queue `fn(*args)` and start it as soon as a slot is free. Returns the ScheduledJob."""
+        job = ScheduledJob(job_id or str(uuid.uuid4()), fn, args, session_id, priority, next(self._seq))
+        with self._lock:
+            heapq.heappush(self._queue, (job.sort_key(), job))
+        self._dispatch()
+        return job
+
+    def cancel(self, job_id):
+        """
+        Cancel a job. A queued job is removed at once; a running job is flagged and
+        must stop itself by polling is_cancel_requested(). Returns False if unknown.
+        """
+        with self._lock:
+            running = self._running.get(job_id)
+            if running is not None:
+                running.cancel_requested = True
+                return True
+            for index, (_, job) in enumerate(self._queue):
+                if job.job_id == job_id:
+                    job.state = 'cancelled'
+                    self._queue.pop(index)
+                    heapq.heapify(self._queue)
+                    break
+            else:
+                return False
+        self._emit_positions()
+        return True
+
+    def is_cancel_requested(self, job_id):
+        """Check whether a running job has been asked to stop."""
+        job = self._running.get(job_id)
+        return job is not None and job.cancel_requested
+
+    def reprioritize(self, job_id, priority):
+        """Change the priority of a queued job. Returns False if the job is not queued."""
+        with self._lock:
+            for index, (_, job) in enumerate(self._queue):
+                if job.job_id == job_id:
+                    job.priority = priority
+                    self._queue[index] = (job.sort_key(), job)
+                    heapq.heapify(self._queue)
+                    break
+            else:
+                return False
+        self._emit_positions()
+        return True
+
+    def queued_jobs(self):
+        """Return queued jobs in the order they will start."""
+        with self._lock:
+            return [job for _, job in sorted(self._queue, key=lambda entry: entry[0])]
+
+    def running_jobs(self):
+        """Return the jobs currently running."""
+        with self._lock:
+            return list(self._running.values())
+
+    def position(self, job_id):
+        """1-based queue position of a job, 0 if running, None if unknown."""
+        if job_id in self._running:
+            return 0
+        for index, job in enumerate(self.queued_jobs()):
+            if job.job_id == job_id:
+                return index + 1
+        return None
+
+    def stats(self):
+        """Return queue depth and concurrency counters."""
+        with self._lock:
+            return {
+                'max_concurrent': self.max_concurrent,
+                'running': len(self._running),
+                'queued': len(self._queue)
+            }
+
+    def _dispatch(self):
+        started = []
+        with self._lock:
+            while self._queue and len(self._running) < self.max_concurrent:
+                _, job = heapq.heappop(self._queue)
+                job.state = 'running'
+                job.started_at = time.time()
+                self._running[job.job_id] = job
+                started.append(job)
+        for job in started:
+            self.socketio.start_background_task(self._run, job)
+        self._emit_positions(started)
+
+    def _run(self, job):
+        try:
+            job.fn(*job.args)
+        except Exception as e:
+            print(f"Error in scheduled video job {job.job_id}: {str(e)}")
+        finally:
+            job.state = 'finished'
+            with self._lock:
+                self._running.pop(job.job_id, None)
+            self._dispatch()
+
+    def _emit_positions(self, started=()):
+        queued = self.queued_jobs()
+        try:
+            for job in started:
+                self._emit_position(job, 0, len(queued))
+            for index, job in enumerate(queued):
+                self._emit_position(job, index + 1, len(queued))
+        except Exception as e:
+            print(f"Error emitting queue positions: {str(e)}")
+
+    def _emit_position(self, job, position, queue_length):
+        if not job.session_id:
+            return
+        self.socketio.emit("video_queue_position", {
+            "job_id": job.job_id,
+            "position": position,
+            "queueLength": queue_length,
+            "state": job.state,
+            "session_id": job.session_id
+        }, room=job.session_id)
@@ -2,12 +2,16 @@ import jwt
 from flask import current_app
 from jwt import ExpiredSignatureError, InvalidTokenError
 
+def signing_key():
+    """The HS256 key tokens are signed and verified with (app.config is None for an unset SECRET_KEY)"""
+    return str(current_app.config.get("SECRET_KEY") or "supersecretkey")
+
 def decode_token(token):
     """
     Decodes a JWT token and returns the payload if valid.
     Raises ExpiredSignatureError or InvalidTokenError if invalid/expired.
     """
-    secret = current_app.config.get("SECRET_KEY", "supersecretkey")
+    secret = signing_key()
     try:
         payload = jwt.decode(token, secret, algorithms=["HS256"])
         return payload
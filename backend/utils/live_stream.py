@@ -0,0 +1,222 @@
+import time
+import uuid
+import cv2
+from eventlet import patcher
+from utils.metrics import DROPPED_FRAMES
+
+# The reader must run on a real OS thread: VideoCapture.read() blocks without yielding to eventlet
+_threading = patcher.original('threading')
+
+
+def parse_stream_source(source):
+    """Return what cv2.VideoCapture should open: an int for a device index, otherwise the URL/path."""
+    source = str(source).strip()
+    return int(source) if source.isdigit() else source
+
+
+class LatestFrameReader:
+    """
+    Reads a live source on its own thread and keeps only the newest frame.
+
+    Consumers call read_latest(); any frame that was overwritten before being read is
+    counted as dropped, so a slow consumer always works on the freshest frame and latency
+    never builds up in a queue. A failed source is reopened with exponential backoff. A
+    local file is played back at its native FPS so it behaves like a camera (optionally
+    looping), which is how the stream mode is exercised without real hardware.
+    """
+
+    def __init__(self, source, is_file=False, loop=False, reconnect_delay=1.0,
+                 max_reconnect_delay=30.0, max_reconnects=0):
+        self.source = source
+        self.is_file = is_file
+        self.loop = loop
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.max_reconnects = max_reconnects  # 0 = keep trying until stopped
+        self.state = 'connecting'
+        self.error = None
+        self.fps = None
+        self.frames_read = 0
+        self.frames_dropped = 0
+        self.reconnects = 0
+        self._frame = None
+        self._seq = 0
+        self._captured_at = None
+        self._consumed_seq = 0
+        self._connected_once = False
+        self._stop = _threading.Event()
+        self._condition = _threading.Condition()
+        self._thread = None
+
+    @property
+    def finished(self):
+        """True once the source has ended or failed for good (or the reader was stopped)."""
+        return self.state in ('ended', 'failed', 'stopped')
+
+    def start(self):
+        self._thread = _threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        with self._condition:
+            self._condition.notify_all()
+
+    def join(self, timeout=5):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def read_latest(self, after_seq=0, timeout=0.5):
+        """
+        Return (seq, frame, captured_at) for the newest frame with seq > after_seq, or None if
+        no such frame arrives within timeout (or the reader finishes).
+        """
+        deadline = time.time() + timeout
+        with self._condition:
+            while self._seq <= after_seq and not self.finished:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None
+                self._condition.wait(remaining)
+            if self._seq <= after_seq:
+                return None
+            self._consumed_seq = self._seq
+            return self._seq, self._frame, self._captured_at
+
+    def stats(self):
+        """Return reader counters."""
+        return {
+            'state': self.state,
+            'fps': self.fps,
+            'framesRead': self.frames_read,
+            'framesDropped': self.frames_dropped,
+            'reconnects': self.reconnects,
+            'error': self.error
+        }
+
+    def _publish(self, frame):
+        with self._condition:
+            if self._seq > self._consumed_seq:
+                self.frames_dropped += 1  # The previous frame was never read: it is stale now
+                DROPPED_FRAMES.inc(reason='stream_stale')
+            self._seq += 1
+            self._frame = frame
+            self._captured_at = time.time()
+            self.frames_read += 1
+            self._condition.notify_all()
+
+    def _set_state(self, state, error=None):
+        with self._condition:
+            self.state = state
+            if error is not None:
+                self.error = error
+            self._condition.notify_all()
+
+    def _open(self):
+        cap = cv2.VideoCapture(self.source)
+        if not cap.isOpened():
+            cap.release()
+            return None
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        self.fps = fps if fps and fps > 1 else 25.0
+        return cap
+
+    def _run(self):
+        delay = self.reconnect_delay
+        failures = 0
+        while not self._stop.is_set():
+            cap = self._open()
+            if cap is None:
+                failures += 1
+                if self.is_file or (self.max_reconnects and failures > self.max_reconnects):
+                    self._set_state('failed', f"Could not open stream source {self.source}")
+                    return
+                self._set_state('reconnecting', f"Could not open stream source {self.source}")
+                self._stop.wait(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+                continue
+            if self._connected_once:
+                self.reconnects += 1
+            self._connected_once = True
+            failures = 0
+            delay = self.reconnect_delay
+            self._set_state('streaming')
+            ended = self._read_until_failure(cap)
+            cap.release()
+            if self._stop.is_set():
+                break
+            if ended:
+                self._set_state('ended')
+                return
+            self._set_state('reconnecting', f"Lost stream source {self.source}")
+        self._set_state('stopped')
+
+    def _read_until_failure(self, cap):
+        """Read frames until the source fails (returns False) or a non-looping file ends (returns True)."""
+        frame_interval = 1.0 / self.fps
+        next_frame_at = time.time()
+        while not self._stop.is_set():
+            ret, frame = cap.read()
+            if not ret or frame is None:
+                if not self.is_file:
+                    return False
+                if not self.loop:
+                    return True
+                cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                continue
+            if self.is_file:
+                # Pace a file to its native frame rate so it behaves like a live camera
+                next_frame_at += frame_interval
+                wait = next_frame_at - time.time()
+                if wait > 0:
+                    self._stop.wait(wait)
+                else:
+                    next_frame_at = time.time()
+            self._publish(frame)
+        return False
+
+
+class StreamSession:
+    """A live stream being processed for one Socket.IO room."""
+
+    def __init__(self, session_id, source, reader, display_source=None, user_id=None):
+        self.stream_id = str(uuid.uuid4())
+        self.session_id = session_id
+        self.user_id = user_id  # Who started it; only they can see and stop it
+        self.source = display_source or str(source)
+        self.reader = reader
+        self.state = 'starting'
+        self.error = None
+        self.started_at = time.time()
+        self.stopped_at = None
+        self.frames_processed = 0
+        self.frames_late = 0
+        self.detections = 0
+        self.last_latency = None
+        self.total_latency = 0.0
+        self.stop_requested = False
+
+    def request_stop(self):
+        self.stop_requested = True
+        self.reader.stop()
+
+    def to_dict(self):
+        """Convert the session to a dictionary."""
+        elapsed = (self.stopped_at or time.time()) - self.started_at
+        return {
+            'stream_id': self.stream_id,
+            'session_id': self.session_id,
+            'source': self.source,
+            'state': self.state,
+            'error': self.error,
+            'started_at': self.started_at,
+            'stopped_at': self.stopped_at,
+            'framesProcessed': self.frames_processed,
+            'framesLate': self.frames_late,
+            'detections': self.detections,
+            'processingFps': round(self.frames_processed / elapsed, 2) if elapsed > 0 else 0,
+            'latencyMs': round(self.last_latency * 1000, 1) if self.last_latency is not None else None,
+            'avgLatencyMs': round(self.total_latency / self.frames_processed * 1000, 1) if self.frames_processed else None,
+            'reader': self.reader.stats()
+        }
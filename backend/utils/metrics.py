@@ -0,0 +1,245 @@
+import os
+import math
+import time
+from contextlib import contextmanager
+from eventlet import patcher
+
+# Metrics are updated from the video pipeline's OS threads as well as from green threads
+_threading = patcher.original('threading')
+
+# Default histogram buckets, in seconds: sub-millisecond encodes up to multi-second inferences
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class MetricsRegistry:
+    """Holds every metric and renders them in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = _threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if any(existing.name == metric.name for existing in self._metrics):
+                raise ValueError(f"Metric '{metric.name}' is already registered")
+            self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Return all metrics as Prometheus text (format version 0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {_escape_help(metric.documentation)}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+
+class _Metric:
+    type = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = _threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _label_dict(self, key):
+        return dict(zip(self.labelnames, key))
+
+
+class Counter(_Metric):
+    """A value that only goes up (requests, frames, detections...)."""
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        if amount < 0:
+            raise ValueError("Counters can only be incremented")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [(f"{self.name}_total", self._label_dict(key), value) for key, value in items]
+
+
+class Gauge(_Metric):
+    """A value that goes up and down. set_function() makes it read its value at scrape time."""
+    type = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        super().__init__(name, documentation, labelnames, registry)
+        self._function = None
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function):
+        """Compute the (unlabelled) value by calling function() on every scrape."""
+        self._function = function
+
+    def samples(self):
+        if self._function is not None:
+            try:
+                return [(self.name, {}, self._function())]
+            except Exception as e:
+                print(f"Error collecting metric {self.name}: {str(e)}")
+                return []
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, self._label_dict(key), value) for key, value in items]
+
+
+class Histogram(_Metric):
+    """Counts observations (usually durations in seconds) into cumulative buckets."""
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['counts'][index] += 1
+                    break
+            state['sum'] += value
+            state['count'] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of a with-block."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(state['counts']), state['sum'], state['count']) for key, state in self._values.items()]
+        samples = []
+        for key, counts, total, count in items:
+            labels = self._label_dict(key)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                samples.append((f"{self.name}_bucket", {**labels, 'le': _format_value(bound)}, cumulative))
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, count))
+        return samples
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(f'{name}="{_escape_label(value)}"' for name, value in labels.items())
+    return f'{{{pairs}}}'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return f"{value:.1f}"
+    return str(value)
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _escape_help(text):
+    return text.replace('\\', '\\\\').replace('\n', '\\n')
+
+
+# Metrics recorded by the detection hot paths.
+# Stages: upload_save, decode, preprocess, inference, postprocess, tracking, plot,
+# video_write, jpeg_encode, base64_encode, emit, and tile_inference / tile_nms in tiled mode. Per-frame stages are observed once per frame.
+STAGE_SECONDS = Histogram(
+    'detection_stage_seconds',
+    'Time spent in each detection stage, per frame (video) or per request (image).',
+    ['pipeline', 'stage']
+)
+FRAMES = Counter(
+    'detection_frames',
+    'Video frames by outcome: decoded, processed (sent through the model), gated (unchanged, previous '
+    'detections reused) or skipped.',
+    ['status']
+)
+DROPPED_FRAMES = Counter(
+    'detection_dropped_frames',
+    'Frames not delivered in full: preview frames rate-limited or dropped for slow clients, '
+    'frames whose inference failed, live stream frames replaced by a newer one or too old to process.',
+    ['reason']
+)
+DETECTIONS = Counter(
+    'detection_detections',
+    'Objects detected, by pipeline and class.',
+    ['pipeline', 'class_name']
+)
+TILES = Counter(
+    'detection_tiles',
+    'Tiles considered by tiled inference: run through the model, or skipped as empty or static.',
+    ['status']
+)
+ALERTS = Counter(
+    'detection_alerts',
+    'Weapon track alerts by pipeline and event: opened, closed, or suppressed by the session cooldown.',
+    ['pipeline', 'event']
+)
+REQUESTS = Counter(
+    'detection_requests',
+    'Detection requests by endpoint and outcome, including those refused before any work: unauthorized, '
+    'shed (overloaded), rate_limited and over_quota.',
+    ['endpoint', 'outcome']
+)
+VIDEO_JOBS_QUEUED = Gauge('detection_video_jobs_queued', 'Video jobs waiting for a processing slot.')
+VIDEO_JOBS_ACTIVE = Gauge('detection_video_jobs_active', 'Video jobs currently being processed.')
+MODEL_MEMORY_BYTES = Gauge(
+    'detection_model_memory_bytes',
+    'Approximate memory held by loaded model instances (parameters and buffers, or exported weights).'
+)
+IMAGE_REQUESTS_INFLIGHT = Gauge('detection_image_requests_inflight', 'Image detection requests being processed.')
+INFERENCE_WORKERS_BUSY = Gauge('detection_inference_workers_busy', 'Inference worker processes serving a request.')
+PROCESS_RSS_BYTES = Gauge('process_resident_memory_bytes', 'Resident memory size of this process.')
+
+
+def _resident_memory_bytes():
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+if os.path.exists('/proc/self/statm'):
+    PROCESS_RSS_BYTES.set_function(_resident_memory_bytes)
@@ -0,0 +1,111 @@
+import time
+from eventlet import patcher
+from utils.inference_workers import call_off_hub, WorkerExited
+
+# Loaded from request green threads, pipeline OS threads and the warm-up thread
+_threading = patcher.original('threading')
+
+
+class LazyModel:
+    """
+    The shared detection model, created on first use instead of when the app is imported.
+
+    Attribute access and calls are forwarded to the loaded model, so it stands in for the
+    ultralytics YOLO object (or a WorkerModel). warm_up() loads it and runs `warmup(model)`,
+    e.g. a dummy forward pass, so the first real request pays neither; start_warmup() does
+    that on a background thread. status() reports progress for the readiness endpoint.
+
+    When the factory only returns a handle (inference workers load the weights themselves),
+    `loaded()` tells whether the weights behind it are actually loaded; the model is only reported
+    ready while it returns True, and a warm-up failure while it returns False is a load failure.
+    """
+
+    def __init__(self, factory, warmup=None, loaded=None):
+        self._factory = factory
+        self._warmup = warmup
+        self._weights_loaded = loaded
+        self._model = None
+        self._lock = _threading.Lock()
+        self._thread = None
+        self.state = 'not_loaded'  # -> 'loading' -> 'warming_up' -> 'ready', or 'failed' if loading fails
+        self.error = None
+        self.load_seconds = None
+        self.warmup_seconds = None
+
+    @property
+    def loaded(self):
+        return self._model is not None
+
+    def get(self):
+        """The loaded model, loading it now (off the eventlet hub) if nothing has yet."""
+        if self._model is None or self.state == 'warming_up':
+            # While warming up, wait rather than share the model with the warm-up pass
+            call_off_hub(self._load, False)
+        return self._model
+
+    def warm_up(self):
+        """Load the model if needed and run the warm-up; raises if the weights could not be loaded (other warm-up errors are only logged)."""
+        call_off_hub(self._load, True)
+
+    def start_warmup(self):
+        """Warm up on a background thread; requests are served meanwhile and readiness turns true when done."""
+        with self._lock:
+            if self._thread is not None or self.state == 'ready':
+                return
+            self._thread = _threading.Thread(target=self._warm_up_in_background, name='model-warmup', daemon=True)
+        self._thread.start()
+
+    def status(self):
+        return {
+            'ready': self.state == 'ready' and (self._weights_loaded is None or self._weights_loaded()),
+            'state': self.state,
+            'error': self.error,
+            'load_seconds': self.load_seconds,
+            'warmup_seconds': self.warmup_seconds
+        }
+
+    def __call__(self, *args, **kwargs):
+        return self.get()(*args, **kwargs)
+
+    def __getattr__(self, name):
+        # Only reached for attributes LazyModel does not define itself
+        return getattr(self.get(), name)
+
+    def _load(self, warm):
+        with self._lock:
+            if self._model is None:
+                self.state, self.error = 'loading', None
+                started = time.perf_counter()
+                try:
+                    self._model = self._factory()
+                except Exception as e:
+                    self.state, self.error = 'failed', f"{type(e).__name__}: {e}"
+                    raise
+                self.load_seconds = round(time.perf_counter() - started, 3)
+                print(f"Detection model loaded in {self.load_seconds}s")
+                self.state = 'ready'
+            if not warm or self.warmup_seconds is not None or self._warmup is None:
+                return
+            self.state = 'warming_up'
+            started = time.perf_counter()
+            try:
+                self._warmup(self._model)
+            except Exception as e:
+                if isinstance(e, WorkerExited) or self._weights_loaded is not None and not self._weights_loaded():
+                    # The weights never loaded (e.g. the workers could not start): nothing can be served.
+                    # warmup_seconds stays None, so the next warm_up() tries again
+                    self.state, self.error = 'failed', f"{type(e).__name__}: {e}"
+                    raise
+                # The weights are loaded and usable; only the first request loses the head start
+                self.state, self.error = 'ready', f"Warm-up failed: {type(e).__name__}: {e}"
+                print(f"Detection model warm-up failed, serving without it: {type(e).__name__}: {e}")
+                return
+            self.warmup_seconds = round(time.perf_counter() - started, 3)
+            print(f"Detection model warmed up in {self.warmup_seconds}s")
+            self.state = 'ready'
+
+    def _warm_up_in_background(self):
+        try:
+            self._load(True)
+        except Exception as e:
+            print(f"Detection model warm-up failed: {self.error or e}")
@@ -0,0 +1,65 @@
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """
+    Cheap scene-change detector placed in front of the model.
+
+    Each frame is shrunk to `width` pixels wide, blurred and compared with the last frame that
+    went through the model. If fewer than `min_changed_fraction` of its pixels changed by more
+    than `pixel_delta` grey levels, the frame is gated: the caller reuses the previous
+    detections instead of running inference. After `max_gated` consecutive gated frames the
+    next frame is always let through, so slow changes and tracker drift are corrected.
+    """
+
+    def __init__(self, min_changed_fraction=0.002, pixel_delta=25, max_gated=10, width=160):
+        self.min_changed_fraction = min_changed_fraction
+        self.pixel_delta = pixel_delta
+        self.max_gated = max(0, max_gated)
+        self.width = width
+        self.frames_checked = 0
+        self.frames_gated = 0
+        self.forced = 0
+        self.last_changed_fraction = None
+        self._reference = None
+        self._gated_in_a_row = 0
+
+    def should_infer(self, frame):
+        """Return True if the frame must go through the model, False to reuse the previous detections."""
+        self.frames_checked += 1
+        small = self._small(frame)
+        if self._reference is None or self._reference.shape != small.shape:
+            return self._accept(small)
+        changed = np.count_nonzero(cv2.absdiff(small, self._reference) > self.pixel_delta) / small.size
+        self.last_changed_fraction = changed
+        if changed >= self.min_changed_fraction:
+            return self._accept(small)
+        if self._gated_in_a_row >= self.max_gated:
+            self.forced += 1
+            return self._accept(small)
+        self._gated_in_a_row += 1
+        self.frames_gated += 1
+        return False
+
+    def to_dict(self):
+        """Counters for progress / completion events."""
+        return {
+            'framesChecked': self.frames_checked,
+            'framesGated': self.frames_gated,
+            'forcedInferences': self.forced,
+            'gatedFraction': round(self.frames_gated / self.frames_checked, 3) if self.frames_checked else 0,
+            'maxGatedFrames': self.max_gated
+        }
+
+    def _accept(self, small):
+        # Compare later frames with the last inferred one, so gradual changes still add up
+        self._reference = small
+        self._gated_in_a_row = 0
+        return True
+
+    def _small(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        height = max(1, int(gray.shape[0] * self.width / gray.shape[1]))
+        small = cv2.resize(gray, (self.width, height), interpolation=cv2.INTER_AREA)
+        return cv2.GaussianBlur(small, (5, 5), 0)
@@ -0,0 +1,134 @@
+import time
+from functools import partial
+import cv2
+from eventlet import patcher
+from config import (
+    PREVIEW_DEFAULT_MAX_WIDTH, PREVIEW_DEFAULT_QUALITY,
+    PREVIEW_DEFAULT_FPS, PREVIEW_ACK_TIMEOUT
+)
+from utils.metrics import STAGE_SECONDS, DROPPED_FRAMES
+
+_threading = patcher.original('threading')
+
+# Preview settings requested by clients, keyed by Socket.IO room (the upload's session_id)
+_settings = {}
+_settings_lock = _threading.Lock()
+
+
+def set_preview_settings(room, max_width=None, quality=None, fps=None):
+    """Store a room's requested preview resolution, JPEG quality and rate; returns the clamped settings."""
+    settings = get_preview_settings(room)
+    if max_width is not None:
+        settings['max_width'] = min(max(int(max_width), 64), 3840)
+    if quality is not None:
+        settings['quality'] = min(max(int(quality), 10), 95)
+    if fps is not None:
+        settings['fps'] = min(max(float(fps), 0.0), 30.0)  # 0 disables the preview
+    with _settings_lock:
+        _settings[room] = settings
+    return dict(settings)
+
+
+def get_preview_settings(room):
+    """Return a room's preview settings, falling back to the configured defaults."""
+    with _settings_lock:
+        settings = _settings.get(room)
+        if settings is not None:
+            return dict(settings)
+    return {
+        'max_width': PREVIEW_DEFAULT_MAX_WIDTH,
+        'quality': PREVIEW_DEFAULT_QUALITY,
+        'fps': PREVIEW_DEFAULT_FPS
+    }
+
+
+class PreviewEncoder:
+    """
+    Downscales and JPEG-encodes annotated frames for the live preview of one job.
+
+    Runs on the annotate thread and only encodes when the room's preview rate allows it,
+    so frames that would be dropped anyway never pay for the resize and JPEG encode.
+    """
+
+    def __init__(self, room):
+        self.room = room
+        self.encoded = 0
+        self.rate_limited = 0
+        self._last_encoded = 0.0
+
+    def encode(self, frame):
+        """Return (jpeg_bytes, width, height) or None if the frame is not due for the preview."""
+        settings = get_preview_settings(self.room)
+        if settings['fps'] <= 0:
+            return None
+        now = time.time()
+        if now - self._last_encoded < 1.0 / settings['fps']:
+            self.rate_limited += 1
+            DROPPED_FRAMES.inc(reason='preview_rate_limited')
+            return None
+        self._last_encoded = now
+        encode_started = time.perf_counter()
+        height, width = frame.shape[:2]
+        if width > settings['max_width']:
+            scale = settings['max_width'] / width
+            width, height = settings['max_width'], max(1, int(height * scale))
+            frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+        ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, settings['quality']])
+        STAGE_SECONDS.observe(time.perf_counter() - encode_started, pipeline='video', stage='jpeg_encode')
+        if not ok:
+            return None
+        self.encoded += 1
+        return buffer.tobytes(), width, height
+
+
+class PreviewChannel:
+    """
+    Sends binary preview frames to every client in a room.
+
+    Each client may have at most one unacknowledged preview in flight; newer frames are
+    dropped for that client until it acks (or ack_timeout passes), so a slow client always
+    gets the latest frame instead of a growing backlog.
+
+    With `acks=False` (detection workers, whose clients are connected to another process through
+    the message queue) each frame is emitted to the room and only the encoder's rate limit applies.
+    """
+
+    def __init__(self, socketio, room, ack_timeout=PREVIEW_ACK_TIMEOUT, event='frame_preview', acks=True):
+        self.socketio = socketio
+        self.room = room
+        self.ack_timeout = ack_timeout
+        self.event = event
+        self.acks = acks
+        self.sent = 0
+        self.dropped = 0
+        self._inflight = {}
+
+    def send(self, payload):
+        """Emit payload to each client in the room that is ready for a new frame."""
+        if not self.acks:
+            self.socketio.emit(self.event, payload, room=self.room)
+            self.sent += 1
+            return
+        now = time.time()
+        for sid in self._participants():
+            sent_at = self._inflight.get(sid)
+            if sent_at is not None and now - sent_at < self.ack_timeout:
+                self.dropped += 1
+                DROPPED_FRAMES.inc(reason='preview_backpressure')
+                continue
+            self._inflight[sid] = now
+            self.socketio.emit(self.event, payload, to=sid, callback=partial(self._ack, sid))
+            self.sent += 1
+
+    def stats(self):
+        """Return sent/dropped counters."""
+        return {'sent': self.sent, 'dropped': self.dropped}
+
+    def _ack(self, sid, *args):
+        self._inflight.pop(sid, None)
+
+    def _participants(self):
+        try:
+            return [sid for sid, _ in self.socketio.server.manager.get_participants('/', self.room)]
+        except Exception:
+            return []
@@ -0,0 +1,202 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class DetectionResultCache:
+    """
+    Content-addressed cache of image detection results.
+
+    Entries are keyed by a hash of the image bytes, the weights file fingerprint and the
+    inference parameters, so a changed weights file or parameter set can never return a
+    stale result. Each entry holds the detections, the annotated JPEG and the name of the
+    persisted result image (if any). Recently used entries live in an in-memory LRU; all
+    entries are also written under `cache_dir`, whose total size is capped by evicting the
+    least recently used files.
+    """
+
+    def __init__(self, cache_dir, weights_path, memory_entries=256, disk_max_bytes=512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.weights_path = weights_path
+        self.memory_entries = max(0, memory_entries)
+        self.disk_max_bytes = max(0, disk_max_bytes)
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._weights_stat = None
+        self._weights_fingerprint = None
+        os.makedirs(cache_dir, exist_ok=True)
+        self._disk_bytes = self._scan_disk_usage()
+
+    def make_key(self, image_bytes, params):
+        """Return the cache key for an image and its inference parameters."""
+        digest = hashlib.sha256()
+        digest.update(self.weights_fingerprint().encode('utf-8'))
+        digest.update(json.dumps(params, sort_keys=True).encode('utf-8'))
+        digest.update(image_bytes)
+        return digest.hexdigest()
+
+    def weights_fingerprint(self):
+        """Fingerprint of the weights file; a change drops every existing entry."""
+        try:
+            stat = os.stat(self.weights_path)
+            weights_stat = (stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            weights_stat = None
+        with self._lock:
+            if weights_stat != self._weights_stat:
+                if self._weights_stat is not None:
+                    self.invalidations += 1
+                    self._clear_locked()
+                self._weights_stat = weights_stat
+                self._weights_fingerprint = f"{os.path.abspath(self.weights_path)}:{weights_stat}"
+            return self._weights_fingerprint
+
+    def get(self, key):
+        """Return the cached entry ({"detections", "image", "result_filename"}) or None."""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return entry
+        entry = self._read_disk(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember_locked(key, entry)
+        return entry
+
+    def put(self, key, detections, image, result_filename=None):
+        """Store a result; `image` is the annotated JPEG as bytes."""
+        entry = {'detections': detections, 'image': image, 'result_filename': result_filename}
+        with self._lock:
+            self._remember_locked(key, entry)
+        self._write_disk(key, entry)
+        self._evict_disk()
+
+    def set_result_filename(self, key, entry, result_filename):
+        """Record where the annotated image of a cached entry has been persisted."""
+        entry['result_filename'] = result_filename
+        self._write_disk(key, entry, write_image=False)
+
+    def stats(self):
+        """Return hit/miss counters and tier sizes."""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': round((self.memory_hits + self.disk_hits) / lookups, 3) if lookups else 0,
+                'invalidations': self.invalidations,
+                'memory_entries': len(self._memory),
+                'disk_bytes': self._disk_bytes,
+                'disk_max_bytes': self.disk_max_bytes
+            }
+
+    def _paths(self, key):
+        shard = os.path.join(self.cache_dir, key[:2])
+        return os.path.join(shard, f"{key}.json"), os.path.join(shard, f"{key}.jpg")
+
+    def _remember_locked(self, key, entry):
+        if self.memory_entries == 0:
+            return
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _read_disk(self, key):
+        meta_path, image_path = self._paths(key)
+        try:
+            with open(meta_path, 'r') as meta_file:
+                meta = json.load(meta_file)
+            with open(image_path, 'rb') as image_file:
+                image = image_file.read()
+            # Touch the entry so size-based eviction treats it as recently used
+            os.utime(meta_path)
+        except (OSError, ValueError):
+            return None
+        return {'detections': meta['detections'], 'image': image, 'result_filename': meta.get('result_filename')}
+
+    def _write_disk(self, key, entry, write_image=True):
+        meta_path, image_path = self._paths(key)
+        try:
+            os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+            added = 0
+            if write_image:
+                added += self._replace_file(image_path, entry['image'])
+            meta = json.dumps({'detections': entry['detections'], 'result_filename': entry['result_filename']})
+            added += self._replace_file(meta_path, meta.encode('utf-8'))
+            with self._lock:
+                self._disk_bytes += added
+        except OSError as e:
+            print(f"Error writing detection cache entry: {str(e)}")
+
+    def _replace_file(self, path, data):
+        """Atomically write data to path and return the change in disk usage."""
+        previous = os.path.getsize(path) if os.path.exists(path) else 0
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as tmp_file:
+            tmp_file.write(data)
+        os.replace(tmp_path, path)
+        return len(data) - previous
+
+    def _entries_on_disk(self):
+        """Yield (mtime, size, meta_path, image_path) for each entry on disk."""
+        for shard in os.scandir(self.cache_dir):
+            if not shard.is_dir():
+                continue
+            for item in os.scandir(shard.path):
+                if not item.name.endswith('.json'):
+                    continue
+                image_path = item.path[:-len('.json')] + '.jpg'
+                try:
+                    stat = item.stat()
+                    size = stat.st_size + (os.path.getsize(image_path) if os.path.exists(image_path) else 0)
+                except OSError:
+                    continue
+                yield stat.st_mtime, size, item.path, image_path
+
+    def _scan_disk_usage(self):
+        return sum(size for _, size, _, _ in self._entries_on_disk())
+
+    def _evict_disk(self):
+        with self._lock:
+            if self._disk_bytes <= self.disk_max_bytes:
+                return
+        entries = sorted(self._entries_on_disk())
+        total = sum(size for _, size, _, _ in entries)
+        for _, size, meta_path, image_path in entries:
+            if total <= self.disk_max_bytes:
+                break
+            for path in (meta_path, image_path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+            key = os.path.basename(meta_path)[:-len('.json')]
+            with self._lock:
+                self._memory.pop(key, None)
+        with self._lock:
+            self._disk_bytes = total
+
+    def _clear_locked(self):
+        """Drop both tiers; called with the lock held when the weights change."""
+        self._memory.clear()
+        for _, _, meta_path, image_path in list(self._entries_on_disk()):
+            for path in (meta_path, image_path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        self._disk_bytes = 0
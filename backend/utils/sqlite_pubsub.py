@@ -0,0 +1,67 @@
+import json
+import sqlite3
+import time
+from eventlet import patcher
+from socketio.pubsub_manager import PubSubManager
+
+# Events are published from green threads and from pipeline OS threads
+_threading = patcher.original('threading')
+
+
+class SQLitePubSubManager(PubSubManager):
+    """
+    Socket.IO client manager that shares events between processes through a SQLite file.
+
+    A stand-in for the Redis/AMQP message queues on a single machine (or nodes sharing a
+    file system with working locks): every published message is a row, and each server
+    polls for rows newer than the last one it has seen. Rows older than `retention`
+    seconds are pruned by the listeners.
+    """
+    name = 'sqlite'
+
+    def __init__(self, url='sqlite:///socketio.db', channel='flask-socketio', write_only=False, logger=None,
+                 poll_interval=0.05, retention=60.0):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.path = url[len('sqlite:///'):] if url.startswith('sqlite:///') else url
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._connection = None
+        self._lock = _threading.Lock()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS socketio_messages ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT NOT NULL, '
+            'payload TEXT NOT NULL, created_at REAL NOT NULL)'
+        )
+        return connection
+
+    def _publish(self, data):
+        payload = json.dumps(data)
+        with self._lock:
+            if self._connection is None:
+                self._connection = self._connect()
+            self._connection.execute(
+                'INSERT INTO socketio_messages (channel, payload, created_at) VALUES (?, ?, ?)',
+                (self.channel, payload, time.time())
+            )
+
+    def _listen(self):
+        connection = self._connect()
+        # Only messages published after this server started are delivered
+        last_id = connection.execute('SELECT COALESCE(MAX(id), 0) FROM socketio_messages').fetchone()[0]
+        last_pruned = time.monotonic()
+        while True:
+            rows = connection.execute(
+                'SELECT id, payload FROM socketio_messages WHERE id > ? AND channel = ? ORDER BY id',
+                (last_id, self.channel)
+            ).fetchall()
+            for last_id, payload in rows:
+                yield payload
+            if time.monotonic() - last_pruned >= self.retention:
+                last_pruned = time.monotonic()
+                connection.execute('DELETE FROM socketio_messages WHERE created_at < ?', (time.time() - self.retention,))
+            if not rows:
+                self.server.sleep(self.poll_interval)
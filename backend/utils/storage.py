@@ -0,0 +1,306 @@
+import os
+import time
+import uuid
+import shutil
+import hashlib
+from eventlet import patcher
+from utils.inference_workers import call_off_hub
+
+# Pins are taken by request green threads and read by the sweep, which runs in a native thread
+_threading = patcher.original('threading')
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+class StorageArea:
+    """
+    A storage root (uploads/ or results/) with its limits. Each child of its subdirectories is an
+    entry evicted as a whole (a file, or a video's result directory); subdirectories in `skip` are
+    managed elsewhere and only reported. 0 means no limit.
+    """
+
+    def __init__(self, name, root, max_bytes=0, max_age=0, skip=()):
+        self.name = name
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.skip = set(skip)
+
+
+class StorageManager:
+    """
+    Keeps uploads/ and results/ within their size and age limits.
+
+    Uploads are deduplicated by content: every uploaded file is a hard link to a blob named after
+    its SHA-256 under uploads/blobs, so identical uploads share their bytes while each keeps its own
+    path. sweep() removes entries unused for longer than their area's max age, then the least
+    recently used ones until the area fits its max size (recently modified entries are spared), and
+    finally blobs no upload links to any more. "Used" is the later of the modification time and the
+    access time, which send_file() bumps explicitly, so it works on noatime mounts too.
+
+    Entries are never removed while pinned: paths returned by the pin providers (e.g. files of active
+    jobs, uploads and streams) and files being sent by send_file(). Providers are called in the
+    caller's app context; the file system work runs off the eventlet hub.
+    """
+
+    def __init__(self, upload_area, result_area, dedupe=True, min_age=600):
+        self.areas = [upload_area, result_area]
+        self.upload_area = upload_area
+        self.blob_dir = os.path.join(upload_area.root, 'blobs')
+        upload_area.skip.add('blobs')
+        self.dedupe_enabled = dedupe
+        # Entries used this recently are never evicted for size, e.g. a new upload not yet linked to a job
+        self.min_age = min_age
+        self.last_sweep = None
+        self._pin_providers = []
+        self._pins = {}
+        self._lock = _threading.Lock()
+        self._sweep_lock = _threading.Lock()
+
+    # Deduplicated uploads
+
+    def store(self, data, path):
+        """Write an upload's bytes to `path`, sharing them with an identical earlier upload if there is one."""
+        call_off_hub(self._store, data, path)
+
+    def dedupe(self, path):
+        """Replace a complete upload at `path` by a link to an identical earlier one; True if there was one."""
+        if not self.dedupe_enabled:
+            return False
+        return call_off_hub(self._dedupe, path)
+
+    def _blob_path(self, digest):
+        return os.path.join(self.blob_dir, digest[:2], digest)
+
+    def _store(self, data, path):
+        if self.dedupe_enabled:
+            blob = self._blob_path(hashlib.sha256(data).hexdigest())
+            try:
+                if not os.path.exists(blob):
+                    os.makedirs(os.path.dirname(blob), exist_ok=True)
+                    temp_path = f"{blob}.{uuid.uuid4().hex}.tmp"
+                    with open(temp_path, 'wb') as f:
+                        f.write(data)
+                    os.replace(temp_path, blob)
+                os.link(blob, path)
+                os.utime(path)  # The inode is shared: mark these bytes as just used, not as old as the blob
+                return
+            except OSError as e:
+                print(f"Upload deduplication failed for {path}, storing a copy: {str(e)}")
+        with open(path, 'wb') as f:
+            f.write(data)
+
+    def _dedupe(self, path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+                digest.update(block)
+        blob = self._blob_path(digest.hexdigest())
+        try:
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            try:
+                os.link(path, blob)
+                return False  # The first upload with these bytes becomes the blob
+            except FileExistsError:
+                pass
+            if os.path.samefile(blob, path):
+                return False
+            # Swap the path over to the blob atomically; readers that have the old file open keep it
+            temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            os.link(blob, temp_path)
+            os.replace(temp_path, path)
+            os.utime(path)
+            return True
+        except OSError as e:
+            print(f"Upload deduplication failed for {path}: {str(e)}")
+            return False
+
+    # Pins
+
+    def add_pin_provider(self, provider):
+        """Register provider() -> paths that must not be removed (called at the start of every sweep)."""
+        self._pin_providers.append(provider)
+
+    def pin(self, path):
+        path = os.path.abspath(path)
+        with self._lock:
+            self._pins[path] = self._pins.get(path, 0) + 1
+
+    def unpin(self, path):
+        path = os.path.abspath(path)
+        with self._lock:
+            if self._pins.get(path, 0) <= 1:
+                self._pins.pop(path, None)
+            else:
+                self._pins[path] -= 1
+
+    def send_file(self, path, **kwargs):
+        """flask.send_file(path), with the file pinned until the response is closed and marked as used."""
+        from flask import send_file
+        response = send_file(path, **kwargs)
+        self.pin(path)
+        response.call_on_close(lambda: self.unpin(path))
+        try:
+            os.utime(path, (time.time(), os.stat(path).st_mtime))
+        except OSError:
+            pass
+        return response
+
+    def _is_pinned(self, entry_path, pinned):
+        with self._lock:
+            live = list(self._pins)
+        prefix = entry_path + os.sep
+        return any(path == entry_path or path.startswith(prefix) for path in list(pinned) + live)
+
+    # Sweeping
+
+    def sweep(self):
+        """Apply the age and size limits now; returns what was removed."""
+        pinned = set()
+        for provider in self._pin_providers:
+            pinned.update(os.path.abspath(path) for path in provider() if path)
+        report = call_off_hub(self._sweep, pinned)
+        self.last_sweep = report
+        if report['removed']:
+            print(f"Storage sweep removed {report['removed']} entries ({report['freed_bytes']} bytes)")
+        return report
+
+    def start_sweeper(self, app, socketio, interval):
+        """Sweep every `interval` seconds in a background task of this process."""
+        def sweep_forever():
+            while True:
+                socketio.sleep(interval)
+                try:
+                    with app.app_context():
+                        self.sweep()
+                except Exception as e:
+                    print(f"Storage sweep failed: {str(e)}")
+        return socketio.start_background_task(sweep_forever)
+
+    def _sweep(self, pinned):
+        with self._sweep_lock:
+            return self._sweep_locked(pinned)
+
+    def _sweep_locked(self, pinned):
+        now = time.time()
+        report = {'time': now, 'removed': 0, 'freed_bytes': 0, 'skipped_pinned': 0, 'orphan_blobs': 0}
+        for area in self.areas:
+            entries, names = self._scan(area)
+            usage = sum(size for size, _ in names.values())
+            entries.sort(key=lambda entry: entry['last_used'])
+            for entry in entries:
+                expired = area.max_age and now - entry['last_used'] > area.max_age
+                too_big = area.max_bytes and usage > area.max_bytes and now - entry['last_used'] >= self.min_age
+                if not (expired or too_big):
+                    continue
+                if self._is_pinned(entry['path'], pinned):
+                    report['skipped_pinned'] += 1
+                    continue
+                try:
+                    if entry['is_dir']:
+                        shutil.rmtree(entry['path'])
+                    else:
+                        os.remove(entry['path'])
+                except OSError as e:
+                    print(f"Could not remove {entry['path']}: {str(e)}")
+                    continue
+                report['removed'] += 1
+                for inode in entry['inodes']:
+                    size, count = names[inode]
+                    names[inode] = (size, count - 1)
+                    if count == 1:
+                        # The last name of these bytes (a deduplicated upload's blob goes below)
+                        usage -= size
+                        report['freed_bytes'] += size
+        for blob in self._blobs():
+            try:
+                if os.stat(blob).st_nlink == 1:
+                    os.remove(blob)
+                    report['orphan_blobs'] += 1
+            except OSError:
+                pass
+        return report
+
+    def _scan(self, area):
+        """Entries of an area (path, last_used, inodes) and, per inode, (size, names in the area)."""
+        entries = []
+        names = {}
+        for folder in self._folders(area):
+            for name in os.listdir(folder):
+                path = os.path.join(folder, name)
+                files = self._files(path)
+                if name.endswith('.tmp') or not files and not os.path.isdir(path):
+                    continue
+                inodes = []
+                last_used = 0.0
+                for stat in files:
+                    inode = (stat.st_dev, stat.st_ino)
+                    inodes.append(inode)
+                    names[inode] = (stat.st_size, names.get(inode, (0, 0))[1] + 1)
+                    last_used = max(last_used, stat.st_atime, stat.st_mtime)
+                if not files:
+                    last_used = os.stat(path).st_mtime
+                entries.append({'path': path, 'is_dir': os.path.isdir(path), 'last_used': last_used, 'inodes': inodes})
+        return entries, names
+
+    def _folders(self, area):
+        if not os.path.isdir(area.root):
+            return []
+        return [os.path.join(area.root, name) for name in sorted(os.listdir(area.root))
+                if name not in area.skip and os.path.isdir(os.path.join(area.root, name))]
+
+    @staticmethod
+    def _files(path):
+        """os.stat results of a file, or of every file under a directory."""
+        try:
+            if not os.path.isdir(path):
+                return [os.stat(path)]
+            stats = []
+            for folder, _, filenames in os.walk(path):
+                for filename in filenames:
+                    stats.append(os.stat(os.path.join(folder, filename)))
+            return stats
+        except OSError:
+            return []  # Removed while scanning
+
+    def _blobs(self):
+        for folder, _, filenames in os.walk(self.blob_dir):
+            for filename in filenames:
+                if not filename.endswith('.tmp'):
+                    yield os.path.join(folder, filename)
+
+    # Reporting
+
+    def usage(self):
+        """Bytes and entries per area and folder, deduplication savings, pins and free disk space."""
+        return call_off_hub(self._usage)
+
+    def _usage(self):
+        report = {}
+        for area in self.areas:
+            entries, names = self._scan(area)
+            folders = {}
+            for name in sorted(os.listdir(area.root)) if os.path.isdir(area.root) else []:
+                path = os.path.join(area.root, name)
+                if os.path.isdir(path):
+                    folders[name] = sum(stat.st_size for stat in self._files(path))
+            report[area.name] = {
+                'bytes': sum(size for size, _ in names.values()),
+                'logical_bytes': sum(size * count for size, count in names.values()),
+                'entries': len(entries),
+                'folders': folders,
+                'max_bytes': area.max_bytes or None,
+                'max_age_seconds': area.max_age or None
+            }
+        uploads = report[self.upload_area.name]
+        uploads['dedupe'] = {
+            'enabled': self.dedupe_enabled,
+            'blobs': sum(1 for _ in self._blobs()),
+            'saved_bytes': uploads['logical_bytes'] - uploads['bytes']
+        }
+        with self._lock:
+            report['files_being_sent'] = len(self._pins)
+        disk = shutil.disk_usage(self.upload_area.root)
+        report['disk'] = {'total_bytes': disk.total, 'free_bytes': disk.free}
+        report['last_sweep'] = self.last_sweep
+        return report
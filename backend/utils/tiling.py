@@ -0,0 +1,209 @@
+import time
+import cv2
+import numpy as np
+from utils.metrics import STAGE_SECONDS, TILES
+
+
+def tile_grid(width, height, tile_size, overlap):
+    """
+    Return (x1, y1, x2, y2) tiles of at most tile_size covering the frame, overlapping by
+    `overlap` (a fraction of the tile size). Edge tiles are shifted inwards so every tile
+    keeps the full size whenever the frame is large enough.
+    """
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        stride = max(1, int(tile_size * (1 - overlap)))
+        positions = list(range(0, length - tile_size, stride))
+        positions.append(length - tile_size)
+        return positions
+
+    tile_w, tile_h = min(tile_size, width), min(tile_size, height)
+    return [(x, y, x + tile_w, y + tile_h) for y in starts(height) for x in starts(width)]
+
+
+def merge_boxes(boxes, match_threshold=0.5):
+    """
+    Class-aware greedy NMS over an (N, 6) array of [x1, y1, x2, y2, conf, cls] boxes.
+
+    Boxes are matched on intersection over the smaller box rather than IoU, so the part of an
+    object cut off at a tile border is merged into the full detection from the next tile.
+    """
+    if len(boxes) == 0:
+        return boxes
+    order = np.argsort(-boxes[:, 4])
+    areas = (boxes[:, 2] - boxes[:, 0]).clip(0) * (boxes[:, 3] - boxes[:, 1]).clip(0)
+    keep = []
+    while len(order):
+        best, rest = order[0], order[1:]
+        keep.append(best)
+        xx1 = np.maximum(boxes[best, 0], boxes[rest, 0])
+        yy1 = np.maximum(boxes[best, 1], boxes[rest, 1])
+        xx2 = np.minimum(boxes[best, 2], boxes[rest, 2])
+        yy2 = np.minimum(boxes[best, 3], boxes[rest, 3])
+        inter = (xx2 - xx1).clip(0) * (yy2 - yy1).clip(0)
+        smaller = np.minimum(areas[best], areas[rest])
+        overlap = np.where(smaller > 0, inter / np.maximum(smaller, 1e-9), 0)
+        same_class = boxes[rest, 5] == boxes[best, 5]
+        order = rest[~(same_class & (overlap > match_threshold))]
+    return boxes[keep]
+
+
+class TiledDetector:
+    """
+    Sliced inference for small objects in high-resolution frames.
+
+    Each frame is cut into overlapping tiles that are batched through the model at their
+    native resolution, optionally together with one downscaled full-frame pass for large
+    objects, and the boxes are merged with cross-tile NMS into one ultralytics Results object,
+    so plotting and tracking work unchanged. Tiles that are flat (no content) are skipped, and
+    in video, tiles without motion since the last processed frame reuse their previous boxes
+    until they are refreshed every `refresh_interval` frames. One instance belongs to one
+    image request or video job.
+    """
+
+    def __init__(self, tile_size=640, overlap=0.2, full_frame=True, min_content_std=4.0,
+                 motion_threshold=2.0, refresh_interval=15, merge_threshold=0.5, pipeline='image'):
+        self.tile_size = tile_size
+        self.overlap = min(max(overlap, 0.0), 0.9)
+        self.full_frame = full_frame
+        self.min_content_std = min_content_std
+        self.motion_threshold = motion_threshold
+        self.refresh_interval = max(1, refresh_interval)
+        self.merge_threshold = merge_threshold
+        self.pipeline = pipeline
+        self.frames = 0
+        self.tiles_run = 0
+        self.tiles_skipped_empty = 0
+        self.tiles_skipped_static = 0
+        self._previous_gray = None
+        self._tile_boxes = {}  # Last boxes found in each tile, reused while the tile is static
+        self._tile_age = {}    # Frames since each tile last went through the model
+        self._tile_stats = {}  # Per-tile run count and total milliseconds
+
+    def detect(self, model, frame, conf=0.25, iou=0.7, imgsz=640, track_motion=False, **predict_args):
+        """
+        Detect on `frame` tile by tile and return (result, report).
+
+        imgsz is used for the full-frame pass; tiles always run at tile_size. With
+        track_motion=True (video) static tiles are skipped against the previous call's frame.
+        """
+        self.frames += 1
+        height, width = frame.shape[:2]
+        tiles = tile_grid(width, height, self.tile_size, self.overlap)
+        gray = self._small_gray(frame)
+        run, report_tiles = [], []
+        for index, tile in enumerate(tiles):
+            status = self._tile_status(index, tile, gray, width, height, track_motion)
+            if status == 'run':
+                run.append((index, tile))
+            else:
+                report_tiles.append({'tile': list(tile), 'status': status, 'ms': 0.0, 'detections': 0})
+        if track_motion:
+            self._previous_gray = gray
+
+        all_boxes = []
+        tile_ms = 0.0
+        if run:
+            crops = [frame[y1:y2, x1:x2] for _, (x1, y1, x2, y2) in run]
+            started = time.perf_counter()
+            tile_results = model.predict(crops, conf=conf, iou=iou, imgsz=self.tile_size, verbose=False, **predict_args)
+            tile_ms = (time.perf_counter() - started) * 1000
+            # One batched forward pass: the per-tile time is the batch time amortised over its tiles
+            per_tile_ms = tile_ms / len(run)
+            for (index, (x1, y1, _, _)), tile_result in zip(run, tile_results):
+                boxes = tile_result.boxes.data.cpu().numpy() if tile_result.boxes is not None else np.zeros((0, 6))
+                boxes = boxes[:, :6].copy()
+                boxes[:, [0, 2]] += x1
+                boxes[:, [1, 3]] += y1
+                self._tile_boxes[index] = boxes
+                self._tile_age[index] = 0
+                stats = self._tile_stats.setdefault(index, {'tile': list(tiles[index]), 'runs': 0, 'total_ms': 0.0})
+                stats['runs'] += 1
+                stats['total_ms'] += per_tile_ms
+                report_tiles.append({'tile': list(tiles[index]), 'status': 'run',
+                                     'ms': round(per_tile_ms, 2), 'detections': len(boxes)})
+            STAGE_SECONDS.observe(tile_ms / 1000, pipeline=self.pipeline, stage='tile_inference')
+        self.tiles_run += len(run)
+        TILES.inc(len(run), status='run')
+        for index, _ in enumerate(tiles):
+            if index in self._tile_boxes:
+                all_boxes.append(self._tile_boxes[index])
+
+        full_frame_ms = 0.0
+        if self.full_frame and len(tiles) > 1:
+            started = time.perf_counter()
+            full_result = model.predict(frame, conf=conf, iou=iou, imgsz=imgsz, verbose=False, **predict_args)[0]
+            full_frame_ms = (time.perf_counter() - started) * 1000
+            if full_result.boxes is not None:
+                all_boxes.append(full_result.boxes.data.cpu().numpy()[:, :6])
+
+        started = time.perf_counter()
+        merged = merge_boxes(np.concatenate(all_boxes) if all_boxes else np.zeros((0, 6)), self.merge_threshold)
+        nms_ms = (time.perf_counter() - started) * 1000
+        STAGE_SECONDS.observe(nms_ms / 1000, pipeline=self.pipeline, stage='tile_nms')
+
+        import torch
+        from ultralytics.engine.results import Results
+        result = Results(orig_img=frame, path='', names=model.names,
+                         boxes=torch.as_tensor(merged, dtype=torch.float32).reshape(-1, 6))
+        result.speed = {'tiles': round(tile_ms, 2), 'full_frame': round(full_frame_ms, 2), 'nms': round(nms_ms, 2)}
+        report = {
+            'tiles': len(tiles),
+            'tiles_run': len(run),
+            'tiles_skipped': len(tiles) - len(run),
+            'tile_size': self.tile_size,
+            'tile_inference_ms': round(tile_ms, 2),
+            'full_frame_ms': round(full_frame_ms, 2),
+            'nms_ms': round(nms_ms, 2),
+            'per_tile': sorted(report_tiles, key=lambda item: (item['tile'][1], item['tile'][0]))
+        }
+        return result, report
+
+    def summary(self):
+        """Totals over every frame seen by this detector, with average time per tile position."""
+        considered = self.tiles_run + self.tiles_skipped_empty + self.tiles_skipped_static
+        return {
+            'frames': self.frames,
+            'tile_size': self.tile_size,
+            'tiles_run': self.tiles_run,
+            'tiles_skipped_empty': self.tiles_skipped_empty,
+            'tiles_skipped_static': self.tiles_skipped_static,
+            'skipped_fraction': round(1 - self.tiles_run / considered, 3) if considered else 0,
+            'per_tile': [
+                {'tile': stats['tile'], 'runs': stats['runs'], 'avg_ms': round(stats['total_ms'] / stats['runs'], 2)}
+                for _, stats in sorted(self._tile_stats.items())
+            ]
+        }
+
+    def _small_gray(self, frame):
+        """Grayscale copy at 1/8 scale: enough to judge content and motion cheaply."""
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        return cv2.resize(gray, (max(1, gray.shape[1] // 8), max(1, gray.shape[0] // 8)),
+                          interpolation=cv2.INTER_AREA).astype(np.int16)
+
+    def _tile_status(self, index, tile, gray, width, height, track_motion):
+        """Return 'run', 'skipped_empty' or 'skipped_static' for one tile."""
+        x1, y1, x2, y2 = tile
+        scale_x, scale_y = gray.shape[1] / width, gray.shape[0] / height
+        sx1, sy1 = int(x1 * scale_x), int(y1 * scale_y)
+        sx2, sy2 = max(sx1 + 1, int(x2 * scale_x)), max(sy1 + 1, int(y2 * scale_y))
+        region = gray[sy1:sy2, sx1:sx2]
+        if region.std() < self.min_content_std:
+            # A flat tile (sky, wall, black bars) cannot contain an object
+            self._tile_boxes.pop(index, None)
+            self.tiles_skipped_empty += 1
+            TILES.inc(status='skipped_empty')
+            return 'skipped_empty'
+        if not track_motion or self._previous_gray is None or self._previous_gray.shape != gray.shape:
+            return 'run'
+        age = self._tile_age.get(index)
+        if age is None or age + 1 >= self.refresh_interval:
+            return 'run'
+        motion = np.abs(region - self._previous_gray[sy1:sy2, sx1:sx2]).mean()
+        if motion >= self.motion_threshold:
+            return 'run'
+        self._tile_age[index] = age + 1
+        self.tiles_skipped_static += 1
+        TILES.inc(status='skipped_static')
+        return 'skipped_static'
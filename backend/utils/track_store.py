@@ -0,0 +1,113 @@
+import numpy as np
+
+
+def result_arrays(result):
+    """
+    Copy a result's boxes to numpy in one transfer and split the columns.
+
+    Returns (xyxy float (N, 4), confidence (N,), class_id int (N,), track_id int (N,) or None).
+    Tracked boxes carry an ID column: [x1, y1, x2, y2, id, conf, cls], untracked ones do not.
+    """
+    if result.boxes is None or len(result.boxes) == 0:
+        empty = np.zeros((0,))
+        return np.zeros((0, 4)), empty, empty.astype(int), None
+    # float64 so rounded confidences match Python's round() on the same values
+    data = result.boxes.data.cpu().numpy().astype(np.float64)
+    track_ids = data[:, 4].astype(int) if data.shape[1] == 7 else None
+    return data[:, :4], data[:, -2], data[:, -1].astype(int), track_ids
+
+
+class TrackRecord:
+    """Summary of one track; the last `history_size` boxes are kept in a fixed ring buffer."""
+
+    __slots__ = ('track_id', 'class_name', 'first_frame', 'first_timestamp', 'last_frame', 'last_timestamp',
+                 'max_confidence', 'detection_count', 'history', 'history_next', 'history_len')
+
+    def __init__(self, track_id, class_name, frame_idx, timestamp, history_size):
+        self.track_id = track_id
+        self.class_name = class_name
+        self.first_frame = self.last_frame = frame_idx
+        self.first_timestamp = self.last_timestamp = timestamp
+        self.max_confidence = 0.0
+        self.detection_count = 0
+        self.history = np.zeros((history_size, 4), dtype=np.int32)
+        self.history_next = 0
+        self.history_len = 0
+
+    def add(self, frame_idx, timestamp, confidence, box):
+        self.last_frame = frame_idx
+        self.last_timestamp = timestamp
+        if confidence > self.max_confidence:
+            self.max_confidence = confidence
+        self.detection_count += 1
+        self.history[self.history_next] = box
+        self.history_next = (self.history_next + 1) % len(self.history)
+        self.history_len = min(self.history_len + 1, len(self.history))
+
+    def bbox_history(self):
+        """Boxes oldest first."""
+        start = (self.history_next - self.history_len) % len(self.history)
+        return np.roll(self.history, -start, axis=0)[:self.history_len].tolist()
+
+
+class TrackStore:
+    """
+    Per-job track summaries, updated once per frame from numpy arrays.
+
+    to_dict() produces the same JSON shape the checkpoint and detection store use
+    ({track_id: {"track_id", "class", "first_seen_frame", ...}}), and from_dict() restores it.
+    """
+
+    def __init__(self, history_size=5):
+        self.history_size = history_size
+        self._tracks = {}
+
+    def __len__(self):
+        return len(self._tracks)
+
+    def max_id(self):
+        return max(self._tracks) if self._tracks else 0
+
+    def update(self, frame_idx, timestamp, track_ids, class_names, confidences, boxes):
+        """
+        Apply one frame's tracked boxes: track_ids / confidences as lists, class_names as a list,
+        boxes as an (N, 4) int array.
+        """
+        tracks = self._tracks
+        for index, track_id in enumerate(track_ids):
+            record = tracks.get(track_id)
+            if record is None:
+                record = tracks[track_id] = TrackRecord(
+                    track_id, class_names[index], frame_idx, timestamp, self.history_size
+                )
+            record.add(frame_idx, timestamp, confidences[index], boxes[index])
+
+    def to_dict(self):
+        return {
+            track_id: {
+                "track_id": track_id,
+                "class": record.class_name,
+                "first_seen_frame": record.first_frame,
+                "first_seen_timestamp": record.first_timestamp,
+                "last_seen_frame": record.last_frame,
+                "last_seen_timestamp": record.last_timestamp,
+                "max_confidence": record.max_confidence,
+                "detection_count": record.detection_count,
+                "bbox_history": record.bbox_history()
+            }
+            for track_id, record in self._tracks.items()
+        }
+
+    @classmethod
+    def from_dict(cls, tracks, history_size=5):
+        """Rebuild a store from a checkpointed to_dict() snapshot."""
+        store = cls(history_size)
+        for track_id, track in tracks.items():
+            record = TrackRecord(int(track_id), track["class"], track["first_seen_frame"],
+                                 track["first_seen_timestamp"], history_size)
+            for box in track.get("bbox_history", [])[-history_size:]:
+                record.add(track["last_seen_frame"], track["last_seen_timestamp"], 0.0, box)
+            record.max_confidence = track["max_confidence"]
+            record.detection_count = track["detection_count"]
+            store._tracks[record.track_id] = record
+        return store
@@ -0,0 +1,43 @@
+# torch and ultralytics are imported when a job first needs them, not when the app starts
+
+
+class JobTracker:
+    """
+    ByteTrack state owned by a single video job.
+
+    model.track(persist=True) keeps the tracker on the model object, so two jobs sharing a
+    model would mix their track IDs. Each job creates its own JobTracker instead and feeds
+    it the plain model.predict() results in frame order.
+    """
+
+    def __init__(self, tracker_config='bytetrack.yaml', frame_rate=30, id_offset=0):
+        from ultralytics.trackers.byte_tracker import BYTETracker
+        from ultralytics.utils import IterableSimpleNamespace, yaml_load
+        from ultralytics.utils.checks import check_yaml
+
+        cfg = IterableSimpleNamespace(**yaml_load(check_yaml(tracker_config)))
+        if cfg.tracker_type != 'bytetrack':
+            raise ValueError(f"Only ByteTrack is supported, got '{cfg.tracker_type}'")
+        self.tracker = BYTETracker(args=cfg, frame_rate=frame_rate)
+        # Added to every track ID, so a resumed job never reuses IDs from before its checkpoint
+        self.id_offset = id_offset
+
+    def update(self, result, frame):
+        """Assign track IDs to a detection result and return the tracked result (mirrors ultralytics' track callback)."""
+        det = result.boxes.cpu().numpy()
+        if len(det) == 0:
+            return result
+        tracks = self.tracker.update(det, frame)
+        if len(tracks) == 0:
+            return result
+        if self.id_offset:
+            tracks[:, 4] += self.id_offset
+        import torch
+        idx = tracks[:, -1].astype(int)
+        result = result[idx]
+        result.update(boxes=torch.as_tensor(tracks[:, :-1]))
+        return result
+
+    def reset(self):
+        """Drop all tracks, e.g. when a job restarts from the beginning."""
+        self.tracker.reset()
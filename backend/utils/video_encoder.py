@@ -0,0 +1,348 @@
+import os
+import math
+import time
+import cv2
+from eventlet import patcher
+
+# Frames are written from the annotate stage's OS thread, so the pipe must be a real (non-green) one
+_subprocess = patcher.original('subprocess')
+
+# Container used for each codec; OpenCV fourccs and ffmpeg encoder names
+CODEC_CONTAINERS = {
+    'VP90': 'webm', 'VP80': 'webm', 'mp4v': 'mp4', 'avc1': 'mp4',
+    'libvpx-vp9': 'webm', 'libvpx': 'webm',
+    'libx264': 'mp4', 'libx265': 'mp4', 'h264_nvenc': 'mp4', 'h264_qsv': 'mp4', 'h264_vaapi': 'mp4',
+}
+VIDEO_MIMETYPES = {'webm': 'video/webm', 'mp4': 'video/mp4', 'avi': 'video/x-msvideo', 'mov': 'video/quicktime'}
+SEGMENT_MIMETYPES = {'m3u8': 'application/vnd.apple.mpegurl', 'ts': 'video/mp2t', **VIDEO_MIMETYPES}
+ENCODER_BACKENDS = ('opencv', 'ffmpeg', 'none')
+PLAYLIST_NAME = 'index.m3u8'
+
+
+def output_extension(backend, codec):
+    """File extension the encoder produces, or None when no video is written."""
+    if backend == 'none':
+        return None
+    return CODEC_CONTAINERS.get(codec, 'mp4' if backend == 'ffmpeg' else 'webm')
+
+
+def segment_extension(backend, codec):
+    """HLS segment container: MPEG-TS for ffmpeg with an MP4-family codec (H.264/H.265), else None (HLS
+    players cannot play the other encoders' WebM or OpenCV MP4 output as segments)."""
+    return 'ts' if backend == 'ffmpeg' and output_extension(backend, codec) == 'mp4' else None
+
+
+def segmented_output(backend, codec, segmented):
+    """Whether results are written as HLS segments: requested, and the encoder can produce them."""
+    return bool(segmented) and segment_extension(backend, codec) is not None
+
+
+def result_video_name(name, backend, codec, segmented=False):
+    """Result file a job produces, relative to the video results folder (None in detections-only mode)."""
+    extension = output_extension(backend, codec)
+    if extension is None:
+        return None
+    return f"{name}/{PLAYLIST_NAME}" if segmented_output(backend, codec, segmented) else f"{name}.{extension}"
+
+
+def find_video_output(result_dir, name):
+    """Path of an existing result video called `name` in result_dir, whatever container it was written in."""
+    for extension in VIDEO_MIMETYPES:
+        path = os.path.join(result_dir, f"{name}.{extension}")
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def listed_segments(playlist_path):
+    """Names of the segments a playlist lists; a segment is only listed once it is finished."""
+    try:
+        with open(playlist_path) as playlist:
+            return {line.strip() for line in playlist if line.strip() and not line.startswith('#')}
+    except OSError:
+        return set()
+
+
+class _VideoWriterBase:
+    """Common bookkeeping: optional downscaling and write timing."""
+
+    def __init__(self, path, fps, frame_size, scale=1.0):
+        self.path = path
+        self.fps = fps
+        self.scale = min(max(scale, 0.05), 1.0)
+        width, height = frame_size
+        # Even dimensions keep yuv420p encoders happy
+        self.size = (max(2, int(width * self.scale) // 2 * 2), max(2, int(height * self.scale) // 2 * 2))
+        self.frames_written = 0
+        self.write_seconds = 0.0
+
+    def write(self, frame):
+        started = time.perf_counter()
+        if (frame.shape[1], frame.shape[0]) != self.size:
+            frame = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        self._write(frame)
+        self.frames_written += 1
+        self.write_seconds += time.perf_counter() - started
+
+    def stats(self):
+        """Return encoder counters for the completion event."""
+        return {
+            'path': os.path.basename(self.path) if self.path else None,
+            'width': self.size[0],
+            'height': self.size[1],
+            'framesWritten': self.frames_written,
+            'avgWriteMs': round(self.write_seconds / self.frames_written * 1000, 2) if self.frames_written else 0
+        }
+
+    def _write(self, frame):
+        raise NotImplementedError
+
+
+class OpenCVVideoWriter(_VideoWriterBase):
+    """cv2.VideoWriter with a fourcc, e.g. the original VP90 .webm output."""
+
+    def __init__(self, path, fps, frame_size, fourcc='VP90', scale=1.0):
+        super().__init__(path, fps, frame_size, scale)
+        self._writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, self.size)
+
+    def _write(self, frame):
+        self._writer.write(frame)
+
+    def release(self):
+        self._writer.release()
+
+
+class FFmpegVideoWriter(_VideoWriterBase):
+    """
+    Pipes raw BGR frames into an ffmpeg subprocess.
+
+    H.264 goes into a fragmented MP4, so an interrupted file stays readable (a resumed job
+    can copy its frames) and browsers can start playing before it is finished. VP9 uses the
+    realtime deadline with row-based multithreading.
+    """
+
+    def __init__(self, path, fps, frame_size, codec='libx264', preset='ultrafast', crf=23, threads=0,
+                 scale=1.0, ffmpeg_binary='ffmpeg', start_time=0.0):
+        super().__init__(path, fps, frame_size, scale)
+        if path.endswith('.ts'):
+            # HLS segment: offset the timestamps so consecutive segments play back as one timeline
+            container_args = ['-f', 'mpegts', '-output_ts_offset', f'{start_time:.3f}']
+        elif path.endswith('.mp4'):
+            container_args = ['-movflags', '+frag_keyframe+empty_moov+default_base_moof']
+        else:
+            container_args = []
+        self.command = [
+            ffmpeg_binary, '-y', '-loglevel', 'error',
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{self.size[0]}x{self.size[1]}', '-r', f'{fps:g}',
+            '-i', '-', '-an', '-c:v', codec, *self._codec_args(codec, preset, crf, threads),
+            '-pix_fmt', 'yuv420p', *container_args, path
+        ]
+        self._stderr = open(f"{path}.log", 'w+b')
+        try:
+            self._process = _subprocess.Popen(self.command, stdin=_subprocess.PIPE,
+                                              stdout=_subprocess.DEVNULL, stderr=self._stderr)
+        except OSError as e:
+            self._stderr.close()
+            os.remove(f"{path}.log")
+            raise RuntimeError(f"Could not start ffmpeg ({ffmpeg_binary}): {str(e)}")
+
+    @staticmethod
+    def _codec_args(codec, preset, crf, threads):
+        if codec.startswith('libvpx'):
+            # -crf with -b:v 0 is constant quality; realtime + high cpu-used is the fast VP9 mode
+            speed = {'ultrafast': 8, 'superfast': 8, 'veryfast': 7, 'faster': 6, 'fast': 5}.get(preset, 5)
+            return ['-deadline', 'realtime', '-cpu-used', str(speed), '-row-mt', '1',
+                    '-threads', str(threads or os.cpu_count() or 1), '-crf', str(crf), '-b:v', '0']
+        args = ['-preset', preset, '-crf', str(crf)]
+        if threads:
+            args += ['-threads', str(threads)]
+        if codec in ('libx264', 'libx265'):
+            args += ['-tune', 'zerolatency']
+        return args
+
+    def _write(self, frame):
+        try:
+            self._process.stdin.write(frame.tobytes())
+        except (BrokenPipeError, OSError):
+            raise RuntimeError(f"ffmpeg stopped accepting frames: {self._error_output()}")
+
+    def release(self):
+        try:
+            self._process.stdin.close()
+        except OSError:
+            pass
+        returncode = self._process.wait()
+        error = self._error_output()
+        self._stderr.close()
+        os.remove(f"{self.path}.log")
+        if returncode != 0:
+            raise RuntimeError(f"ffmpeg exited with code {returncode}: {error}")
+
+    def _error_output(self):
+        self._stderr.seek(0)
+        return self._stderr.read().decode('utf-8', 'replace').strip()[-500:]
+
+
+class NullVideoWriter(_VideoWriterBase):
+    """Detections-only mode: frames are counted but no video file is produced."""
+
+    def __init__(self, fps, frame_size):
+        super().__init__(None, fps, frame_size)
+
+    def write(self, frame):
+        self.frames_written += 1
+
+    def release(self):
+        pass
+
+
+class SegmentedVideoWriter:
+    """
+    Progressive output: frames go into standalone segments of `segment_seconds` each, and an
+    HLS EVENT playlist in the same directory is rewritten whenever a segment is finished, so a
+    client can start watching while the job is still running. The playlist is closed with
+    #EXT-X-ENDLIST on release(). Segments are MPEG-TS with continuous timestamps (plain HLS),
+    so this needs the ffmpeg backend with an H.264/H.265 codec; see segmented_output().
+    """
+
+    def __init__(self, result_dir, fps, frame_size, segment_seconds=4.0, backend='opencv', **writer_args):
+        self.result_dir = result_dir
+        self.fps = fps
+        self.frame_size = frame_size
+        self.backend = backend
+        self.writer_args = writer_args
+        self.extension = segment_extension(backend, writer_args.get('codec', 'VP90'))
+        if self.extension is None:
+            raise ValueError("Segmented output needs the ffmpeg encoder with an H.264/H.265 codec (MPEG-TS segments)")
+        self.frames_per_segment = max(1, int(round(segment_seconds * fps)))
+        self.path = os.path.join(result_dir, PLAYLIST_NAME)
+        self.segments = []  # (filename, frame count) of finished segments
+        self.frames_written = 0
+        self.write_seconds = 0.0
+        self._current = None
+        self._current_frames = 0
+        self._previous_segments = self._read_playlist()  # Left by an interrupted run, see restore()
+        self._write_playlist()
+
+    def write(self, frame):
+        if self._current is None:
+            self._current = create_video_writer(
+                os.path.join(self.result_dir, self._segment_name(len(self.segments))), self.fps, self.frame_size,
+                backend=self.backend, extension=self.extension,
+                start_time=self.frames_written / self.fps, **self.writer_args
+            )
+        self._current.write(frame)
+        self._current_frames += 1
+        self.frames_written += 1
+        if self._current_frames >= self.frames_per_segment:
+            self._finish_segment()
+
+    def restore(self, max_frames):
+        """
+        Keep the output of an interrupted run up to max_frames: finished segments from the old
+        playlist are reused as they are, the frames of the segment that was being written are
+        copied into a new one and everything after is deleted. Returns the frames restored.
+        """
+        kept = 0
+        for filename, frames in self._previous_segments:
+            if kept + frames > max_frames or not os.path.exists(os.path.join(self.result_dir, filename)):
+                break
+            self.segments.append((filename, frames))
+            kept += frames
+        self.frames_written = kept
+        next_segment = os.path.join(self.result_dir, f"{self._segment_name(len(self.segments))}.{self.extension}")
+        if kept < max_frames and os.path.exists(next_segment):
+            partial_path = f"{next_segment}.partial"
+            os.replace(next_segment, partial_path)
+            partial = cv2.VideoCapture(partial_path)
+            try:
+                while self.frames_written < max_frames:
+                    ret, frame = partial.read()
+                    if not ret or frame is None:
+                        break
+                    self.write(frame)
+            finally:
+                partial.release()
+                os.remove(partial_path)
+        in_use = {filename for filename, _ in self.segments} | {PLAYLIST_NAME}
+        if self._current is not None:
+            in_use.add(os.path.basename(self._current.path))
+        for filename in os.listdir(self.result_dir):
+            if filename.startswith('segment_') and filename not in in_use:
+                os.remove(os.path.join(self.result_dir, filename))
+        self._write_playlist()
+        return self.frames_written
+
+    def release(self):
+        if self._current is not None:
+            self._finish_segment()
+        self._write_playlist(ended=True)
+
+    def stats(self):
+        """Return encoder counters for the completion event."""
+        return {
+            'path': PLAYLIST_NAME,
+            'segments': len(self.segments),
+            'segmentSeconds': round(self.frames_per_segment / self.fps, 2),
+            'framesWritten': self.frames_written,
+            'avgWriteMs': round(self.write_seconds / self.frames_written * 1000, 2) if self.frames_written else 0
+        }
+
+    def _segment_name(self, index):
+        return f"segment_{index:05d}"
+
+    def _finish_segment(self):
+        current, self._current = self._current, None
+        current.release()
+        self.write_seconds += current.write_seconds
+        self.segments.append((os.path.basename(current.path), self._current_frames))
+        self._current_frames = 0
+        self._write_playlist()
+
+    def _write_playlist(self, ended=False):
+        durations = [frames / self.fps for _, frames in self.segments]
+        lines = [
+            '#EXTM3U',
+            '#EXT-X-VERSION:3',
+            '#EXT-X-PLAYLIST-TYPE:EVENT',
+            f'#EXT-X-TARGETDURATION:{int(math.ceil(max(durations + [self.frames_per_segment / self.fps])))}',
+            '#EXT-X-MEDIA-SEQUENCE:0'
+        ]
+        for (filename, _), duration in zip(self.segments, durations):
+            lines += [f'#EXTINF:{duration:.3f},', filename]
+        if ended:
+            lines.append('#EXT-X-ENDLIST')
+        # Replace atomically so a client never reads a half-written playlist
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w') as playlist:
+            playlist.write('\n'.join(lines) + '\n')
+        os.replace(temp_path, self.path)
+
+    def _read_playlist(self):
+        """(filename, frames) entries of an existing playlist."""
+        if not os.path.exists(self.path):
+            return []
+        entries, duration = [], None
+        with open(self.path) as playlist:
+            for line in playlist:
+                line = line.strip()
+                if line.startswith('#EXTINF:'):
+                    duration = float(line[len('#EXTINF:'):].split(',')[0])
+                elif line and not line.startswith('#') and duration is not None:
+                    entries.append((line, int(round(duration * self.fps))))
+                    duration = None
+        return entries
+
+
+def create_video_writer(path_without_extension, fps, frame_size, backend='opencv', codec='VP90',
+                        preset='ultrafast', crf=23, threads=0, scale=1.0, ffmpeg_binary='ffmpeg',
+                        extension=None, start_time=0.0):
+    """Create the configured writer; its .path is the full output path (None for backend 'none')."""
+    if backend not in ENCODER_BACKENDS:
+        raise ValueError(f"Unknown video encoder '{backend}', expected one of {ENCODER_BACKENDS}")
+    if backend == 'none':
+        return NullVideoWriter(fps, frame_size)
+    path = f"{path_without_extension}.{extension or output_extension(backend, codec)}"
+    if backend == 'ffmpeg':
+        return FFmpegVideoWriter(path, fps, frame_size, codec, preset, crf, threads, scale, ffmpeg_binary, start_time)
+    return OpenCVVideoWriter(path, fps, frame_size, codec, scale)
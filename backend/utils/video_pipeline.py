@@ -0,0 +1,192 @@
+import time
+from eventlet import patcher
+
+# The app monkey-patches threading/queue with green versions; pipeline stages must run on
+# real OS threads so that decode, inference and encode actually overlap.
+_threading = patcher.original('threading')
+_queue = patcher.original('queue')
+
+_END = object()  # Sentinel passed down the queues once a stage has no more items
+
+
+class StageStats:
+    """Timing counters for a single pipeline stage."""
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.busy = 0.0      # Time spent doing the stage's own work
+        self.starved = 0.0   # Time spent waiting for input from the previous stage
+        self.blocked = 0.0   # Time spent waiting for room in the next stage's queue (backpressure)
+
+    def to_dict(self):
+        """Convert the stats to a dictionary."""
+        return {
+            'items': self.items,
+            'busy_seconds': round(self.busy, 3),
+            'starved_seconds': round(self.starved, 3),
+            'blocked_seconds': round(self.blocked, 3),
+            'avg_ms': round(self.busy / self.items * 1000, 2) if self.items else 0
+        }
+
+
+class VideoPipeline:
+    """
+    A chain of worker threads connected by bounded queues.
+
+    The first stage is a generator producing items, every following stage is a function
+    taking one item and returning an iterable of output items (empty to drop the item).
+    Results of the last stage are consumed on the calling thread through results(), so
+    Socket.IO emits stay on the eventlet hub. A full queue blocks the upstream stage,
+    which keeps memory bounded when a stage falls behind.
+    """
+
+    def __init__(self, queue_size=4, poll_interval=0.005):
+        self.queue_size = max(1, queue_size)
+        self.poll_interval = poll_interval
+        self.stop_event = _threading.Event()
+        self.stats = []
+        self.error = None
+        self._source = None
+        self._stages = []
+        self._threads = []
+        self._output = None
+
+    def source(self, name, generator):
+        """Set the generator feeding the pipeline."""
+        self._source = (name, generator)
+        return self
+
+    def stage(self, name, fn):
+        """Append a processing stage."""
+        self._stages.append((name, fn))
+        return self
+
+    def start(self):
+        """Start one thread per stage."""
+        name, generator = self._source
+        source_stats = StageStats(name)
+        self.stats.append(source_stats)
+        output = _queue.Queue(maxsize=self.queue_size)
+        self._spawn(self._run_source, generator, output, source_stats)
+        for name, fn in self._stages:
+            stage_stats = StageStats(name)
+            self.stats.append(stage_stats)
+            next_output = _queue.Queue(maxsize=self.queue_size)
+            self._spawn(self._run_stage, fn, output, next_output, stage_stats)
+            output = next_output
+        self._output = output
+        return self
+
+    def results(self, idle=time.sleep, name='emit'):
+        """Yield the items produced by the last stage, calling idle() while waiting for one."""
+        consumer_stats = StageStats(name)
+        self.stats.append(consumer_stats)
+        while True:
+            waited_at = time.time()
+            while True:
+                try:
+                    item = self._output.get_nowait()
+                    break
+                except _queue.Empty:
+                    idle(self.poll_interval)
+            consumer_stats.starved += time.time() - waited_at
+            if item is _END:
+                break
+            started = time.time()
+            yield item
+            consumer_stats.busy += time.time() - started
+            consumer_stats.items += 1
+        self.join()
+        if self.error is not None:
+            raise self.error
+
+    def stop(self):
+        """Ask every stage to stop as soon as possible."""
+        self.stop_event.set()
+
+    def join(self, timeout=5):
+        """Wait for the stage threads to exit."""
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def timings(self):
+        """Return per-stage timing stats keyed by stage name."""
+        return {stats.name: stats.to_dict() for stats in self.stats}
+
+    def _spawn(self, target, *args):
+        thread = _threading.Thread(target=target, args=args, daemon=True)
+        self._threads.append(thread)
+        thread.start()
+
+    def _put(self, output, item, stats):
+        """Put an item on the next queue, blocking while it is full."""
+        waited_at = time.time()
+        while not self.stop_event.is_set():
+            try:
+                output.put(item, timeout=0.1)
+                break
+            except _queue.Full:
+                continue
+        stats.blocked += time.time() - waited_at
+
+    def _finish(self, output):
+        """Pass the end sentinel downstream even if the queue is still full."""
+        while True:
+            try:
+                output.put(_END, timeout=0.1)
+                return
+            except _queue.Full:
+                if self.stop_event.is_set():
+                    # Make room: nobody downstream needs the remaining items anymore
+                    try:
+                        output.get_nowait()
+                    except _queue.Empty:
+                        pass
+
+    def _fail(self, error):
+        if self.error is None:
+            self.error = error
+        self.stop_event.set()
+
+    def _run_source(self, generator, output, stats):
+        try:
+            iterator = iter(generator)
+            while not self.stop_event.is_set():
+                started = time.time()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    stats.busy += time.time() - started
+                stats.items += 1
+                self._put(output, item, stats)
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._finish(output)
+
+    def _run_stage(self, fn, source, output, stats):
+        try:
+            while True:
+                waited_at = time.time()
+                item = source.get()
+                stats.starved += time.time() - waited_at
+                if item is _END:
+                    break
+                if self.stop_event.is_set():
+                    continue  # Drain upstream until its sentinel arrives
+                started = time.time()
+                produced = fn(item)
+                stats.busy += time.time() - started
+                stats.items += 1
+                for out_item in produced or ():
+                    self._put(output, out_item, stats)
+        except Exception as e:
+            self._fail(e)
+            # Keep draining so the upstream stage never blocks forever on a full queue
+            while source.get() is not _END:
+                pass
+        finally:
+            self._finish(output)
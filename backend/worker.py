@@ -0,0 +1,54 @@
+"""
+Detection worker: claims video jobs from the database queue and processes them.
+
+Run the web process with JOB_BROKER=database and any number of these, on this or other nodes,
+with the same DATABASE_URL, SOCKETIO_MESSAGE_QUEUE and STORAGE_ROOT:
+
+    JOB_BROKER=database SOCKETIO_MESSAGE_QUEUE=sqlite:////tmp/socketio.db python worker.py
+
+Events reach the clients' rooms through the message queue. A worker that is stopped or dies
+leaves its claims to expire; another worker then resumes those jobs from their checkpoints.
+"""
+import argparse
+from app import app  # Monkey-patches for eventlet and sets up the database and message queue
+from config import (
+    JOB_BROKER, SOCKETIO_MESSAGE_QUEUE, WORKER_CONCURRENCY, WORKER_POLL_INTERVAL, WORKER_HEARTBEAT_INTERVAL
+)
+from socketio_instance import socketio
+from routes.detection import video_scheduler, video_model_pool, run_video_job, upload_registry, inference_workers
+from utils.job_broker import JobWorker
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--worker-id', help='Name recorded in job claims (default host:pid)')
+    parser.add_argument('--concurrency', type=int, default=WORKER_CONCURRENCY, help='Jobs run at the same time')
+    parser.add_argument('--exit-when-idle', type=float, metavar='SECONDS',
+                        help='Exit once no job was left to claim for this long, instead of polling forever')
+    args = parser.parse_args()
+
+    if JOB_BROKER != 'database':
+        parser.error("JOB_BROKER must be 'database' for the web process to leave jobs to workers")
+    if not SOCKETIO_MESSAGE_QUEUE:
+        print("Warning: SOCKETIO_MESSAGE_QUEUE is not set, so clients will not receive this worker's events")
+    if inference_workers is not None:
+        inference_workers.start()
+    # Every job checks out its own model; MAX_CONCURRENT_VIDEO_JOBS only limits the web process
+    video_model_pool.size = max(1, args.concurrency)
+
+    worker = JobWorker(
+        app, video_scheduler, run_video_job, socketio,
+        upload_registry=upload_registry,
+        worker_id=args.worker_id,
+        concurrency=args.concurrency,
+        poll_interval=WORKER_POLL_INTERVAL,
+        heartbeat_interval=WORKER_HEARTBEAT_INTERVAL
+    )
+    try:
+        worker.run(exit_when_idle=args.exit_when_idle)
+    except KeyboardInterrupt:
+        worker.stop()
+
+
+if __name__ == '__main__':
+    main()
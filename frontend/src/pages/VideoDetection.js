@@ -2,7 +2,7 @@ import React, { useState, useEffect, useRef, useCallback } from 'react';
 import { useSocket } from "../services/useSocket";
 import { io } from "socket.io-client";
 import { useNavigate } from 'react-router-dom';
-import { authService, detectionService } from '../services/api';
+import { authService, detectionService, uploadService } from '../services/api';
 import axios from 'axios';
 
 const VideoDetection = () => {
@@ -26,11 +26,8 @@ const VideoDetection = () => {
   const [liveMeta, setLiveMeta] = useState({ frame: 0, timestamp: "", detections: 0 });
   const [frameHistory, setFrameHistory] = useState([]);
   const [detectionAlert, setDetectionAlert] = useState(null);
-  const audioCtxRef = useRef(null);
   const alertAudioRef = useRef(null);
-  const lastGunSoundAtRef = useRef(0);
   const [isMuted, setIsMuted] = useState(false);
-  const SOUND_COOLDOWN_MS = 4000;
 
   useEffect(() => {
     // Preload alert sound (served from public/)
@@ -53,46 +50,19 @@ const VideoDetection = () => {
       }
     } catch {}
   }, [isMuted]);
-  const lastAlertFrameRef = useRef(null);
-  const playAlarm = useCallback(() => {
-    try {
-      const AudioCtx = window.AudioContext || window.webkitAudioContext;
-      const ctx = audioCtxRef.current || new AudioCtx();
-      audioCtxRef.current = ctx;
-      let now = ctx.currentTime;
-      const beep = (freq, duration) => {
-        const o = ctx.createOscillator();
-        const g = ctx.createGain();
-        o.type = "sine";
-        o.frequency.setValueAtTime(freq, now);
-        o.connect(g);
-        g.connect(ctx.destination);
-        g.gain.setValueAtTime(0.0001, now);
-        g.gain.exponentialRampToValueAtTime(0.3, now + 0.02);
-        o.start(now);
-        o.stop(now + duration);
-        g.gain.exponentialRampToValueAtTime(0.0001, now + duration);
-        now += duration + 0.05;
-      };
-      // Two quick beeps
-      beep(1000, 0.18);
-      beep(1200, 0.18);
-    } catch (e) {
-      // Ignore audio errors 
-    }
-  }, []);
 
   // --- WebSocket integration ---
-  const { connected, messages, ping, broadcast, join, sendToRoom, wsStarted, wsFrame, wsProgress, wsComplete, wsError } = useSocket();
+  const { connected, messages, ping, broadcast, join, sendToRoom, setPreviewSettings, wsStarted, wsFrame, wsPreview, wsProgress, wsComplete, wsError, wsAlert, wsAlertClosed } = useSocket();
 
   // Join the room matching this sessionId as soon as the socket connects (guard against repeated joins)
   useEffect(() => {
     if (connected && sessionId && !joinedRef.current) {
       join(sessionId);
+      setPreviewSettings(sessionId, { max_width: 960, quality: 70, fps: 8 });
       joinedRef.current = true;
       console.log("Joined WS room:", sessionId);
     }
-  }, [connected, sessionId, join]);
+  }, [connected, sessionId, join, setPreviewSettings]);
 
   // Reset join guard on disconnect so we can rejoin after reconnects
   useEffect(() => {
@@ -109,18 +79,22 @@ const VideoDetection = () => {
     setLiveMeta({ frame: 0, timestamp: "", detections: 0 });
     setDetectionAlert(null);
     setFrameHistory([]);
-    lastAlertFrameRef.current = null;
     // Reset progress at start
     setProcessingProgress(0);
   }, [wsStarted]);
 
+  // Live preview arrives as binary JPEG; show it through an object URL and free the previous one
+  useEffect(() => {
+    if (!wsPreview || !wsPreview.image) return;
+    const url = URL.createObjectURL(new Blob([wsPreview.image], { type: 'image/jpeg' }));
+    setLiveImage(url);
+    return () => URL.revokeObjectURL(url);
+  }, [wsPreview]);
+
   useEffect(() => {
     if (!wsFrame) return;
     try {
-      const img = wsFrame.image_base64 ? `data:image/jpeg;base64,${wsFrame.image_base64}` : null;
-      if (img) setLiveImage(img);
       const detectionsCount = Array.isArray(wsFrame.detections) ? wsFrame.detections.length : 0;
-      const gunCount = (Array.isArray(wsFrame.detections) ? wsFrame.detections : []).filter(d => typeof d.class === 'string' && /gun/i.test(d.class)).length;
       setLiveMeta({
         frame: wsFrame.frame_index ?? 0,
         timestamp: wsFrame.timestamp ?? "",
@@ -128,40 +102,7 @@ const VideoDetection = () => {
       });
 
       if (detectionsCount > 0) {
-        // Raise alert banner and append to detection history (only when there are detections)
-        const classes = (wsFrame.detections || []).map(d => d.class);
-        const counts = classes.reduce((m, c) => {
-          m[c] = (m[c] || 0) + 1;
-          return m;
-        }, {});
-        const top = Object.entries(counts)
-          .sort((a, b) => b[1] - a[1])
-          .slice(0, 5)
-          .map(([c, n]) => `${c}(${n})`)
-          .join(", ");
-
-        if (lastAlertFrameRef.current !== wsFrame.frame_index) {
-          setDetectionAlert({
-            frame: wsFrame.frame_index ?? 0,
-            timestamp: wsFrame.timestamp ?? "",
-            count: detectionsCount,
-            summary: top,
-            isGun: gunCount > 0,
-            gunCount
-          });
-          lastAlertFrameRef.current = wsFrame.frame_index ?? 0;
-          if (gunCount > 0) {
-            const nowTs = Date.now();
-            if (nowTs - lastGunSoundAtRef.current > SOUND_COOLDOWN_MS) {
-              playGunSound();
-              lastGunSoundAtRef.current = nowTs;
-            }
-          } else {
-            // Fallback beep for non-gun detections
-            playAlarm();
-          }
-        }
-
+        // Append to detection history (only when there are detections)
         setFrameHistory((prev) => {
           const next = [
             ...prev,
@@ -178,6 +119,34 @@ const VideoDetection = () => {
     } catch {}
   }, [wsFrame]);
 
+  // The server confirms weapon tracks over several frames and sends one alert per track,
+  // so the banner and the sound follow alerts rather than individual frames
+  useEffect(() => {
+    if (!wsAlert) return;
+    const cropUrl = wsAlert.crop ? URL.createObjectURL(new Blob([wsAlert.crop], { type: 'image/jpeg' })) : null;
+    setDetectionAlert({
+      alertId: wsAlert.alert_id,
+      trackId: wsAlert.track_id,
+      className: wsAlert.class,
+      confidence: wsAlert.confidence,
+      frame: wsAlert.best_frame_index ?? wsAlert.frame_index ?? 0,
+      timestamp: wsAlert.best_timestamp ?? wsAlert.timestamp ?? "",
+      cropUrl,
+      closed: false
+    });
+    playGunSound();
+    return () => { if (cropUrl) URL.revokeObjectURL(cropUrl); };
+  }, [wsAlert]); // eslint-disable-line react-hooks/exhaustive-deps
+
+  useEffect(() => {
+    if (!wsAlertClosed) return;
+    setDetectionAlert((current) => (
+      current && current.alertId === wsAlertClosed.alert_id
+        ? { ...current, closed: true, duration: wsAlertClosed.duration }
+        : current
+    ));
+  }, [wsAlertClosed]);
+
   useEffect(() => {
     if (!wsProgress || typeof wsProgress.progress !== "number") return;
     setProcessingProgress(Math.min(99, wsProgress.progress));
@@ -287,50 +256,17 @@ const VideoDetection = () => {
     setError(null);
 
     try {
-      // Simulate progress while the API call is processing
-      const progressInterval = setInterval(() => {
-        setProcessingProgress(prev => {
-          const newProgress = prev + 5;
-          if (newProgress >= 95) {
-            clearInterval(progressInterval);
-            return 95;
-          }
-          return newProgress;
-        });
-      }, 300);
-
-      // Prepare FormData with video and session_id
-      const formData = new FormData();
-      formData.append('video', selectedFile);
-      formData.append('session_id', sessionId);
-
-      const apiUrl = process.env.REACT_APP_API_URL || 'http://localhost:5000';
-      const response = await axios.post(
-        `${apiUrl}/api/detect/video`,
-        formData,
-        {
-          headers: { 'Content-Type': 'multipart/form-data' }
-        }
-      );
-
-      clearInterval(progressInterval);
+      // Chunked upload: progress is the share of bytes sent, and detection can start before the last chunk
+      const response = await uploadService.uploadVideo(selectedFile, {
+        sessionId,
+        onUpload: (upload) => {
+          // A resumed upload reports to the room of the page that started it
+          if (upload.session_id && upload.session_id !== sessionId) join(upload.session_id);
+        },
+        onProgress: (fraction) => setProcessingProgress(Math.min(95, Math.round(fraction * 95))),
+      });
       setProcessingProgress(100);
-
-      // Process the response
-      // const detectionResult = {
-      //   detections: Object.values(response.data.detections) || [],
-      //   resultPath: response.data.result_path,
-      //   duration: response.data.duration || '00:00:00',
-      //   totalFrames: response.data.totalFrames || 0,
-      //   processedFrames: response.data.processedFrames || 0
-      // };
-
-      // setResult(detectionResult);
-      // setResultSource("rest");
-
-      if (response.data.result_path) {
-        setResultVideo(`${apiUrl}${response.data.result_path}`);
-      }
+      console.log('Upload complete', response.upload_id, response.job);
     } catch (err) {
       console.log(err);
       setError(err.response?.data?.error || 'Error processing video. Please try again.');
@@ -396,10 +332,13 @@ const VideoDetection = () => {
                   </div>
                   <div className="ml-3">
                     <p className="text-lg font-bold text-red-900">
-                      {detectionAlert.isGun ? `GUN DETECTED${detectionAlert.gunCount > 1 ? ` (${detectionAlert.gunCount})` : ''}!` : 'ALERT:'} {detectionAlert.count} detection(s) at frame {detectionAlert.frame} [{detectionAlert.timestamp}]
+                      {detectionAlert.closed ? 'Weapon out of view:' : 'WEAPON DETECTED:'} {detectionAlert.className} (track {detectionAlert.trackId}, {Math.round((detectionAlert.confidence || 0) * 100)}%) at frame {detectionAlert.frame} [{detectionAlert.timestamp}]
                     </p>
-                    {detectionAlert.summary && (
-                      <p className="text-sm text-red-800 mt-1">Classes: {detectionAlert.summary}</p>
+                    {detectionAlert.closed && typeof detectionAlert.duration === 'number' && (
+                      <p className="text-sm text-red-800 mt-1">Visible for {detectionAlert.duration.toFixed(1)}s</p>
+                    )}
+                    {detectionAlert.cropUrl && (
+                      <img src={detectionAlert.cropUrl} alt={`${detectionAlert.className} crop`} className="mt-2 max-h-32 rounded border border-red-300" />
                     )}
                     <div className="mt-2">
                       <button
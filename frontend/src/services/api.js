@@ -67,34 +67,41 @@ export const authService = {
 
 /**
  * Axios request interceptor to add JWT token to Authorization header.
+ * Applied to both instances: the detection endpoints require the token too.
  */
-api.interceptors.request.use(
-  (config) => {
-    const token = sessionStorage.getItem('token');
-    if (token && !config.url.includes('/auth/login') && !config.url.includes('/auth/register')) {
-      config.headers['Authorization'] = `Bearer ${token}`;
-    }
-    return config;
-  },
-  (error) => Promise.reject(error)
-);
+const addAuthHeader = (config) => {
+  const token = sessionStorage.getItem('token');
+  if (token && !config.url.includes('/auth/login') && !config.url.includes('/auth/register')) {
+    config.headers['Authorization'] = `Bearer ${token}`;
+  }
+  return config;
+};
 
 /**
  * Axios response interceptor to handle token expiration/invalid.
  * If a 401 error is received, clear session and redirect to login.
  */
-api.interceptors.response.use(
-  (response) => response,
-  (error) => {
-    if (error.response && error.response.status === 401) {
-      sessionStorage.removeItem('user');
-      sessionStorage.removeItem('token');
-      // Try to redirect to login page
-      window.location.href = '/login';
-    }
-    return Promise.reject(error);
+const handleUnauthorized = (error) => {
+  if (error.response && error.response.status === 401) {
+    sessionStorage.removeItem('user');
+    sessionStorage.removeItem('token');
+    // Try to redirect to login page
+    window.location.href = '/login';
   }
-);
+  return Promise.reject(error);
+};
+
+[api, apiForm].forEach((instance) => {
+  instance.interceptors.request.use(addAuthHeader, (error) => Promise.reject(error));
+  instance.interceptors.response.use((response) => response, handleUnauthorized);
+});
+
+// Seconds the server asked us to wait in a 429 (rate limited) or 503 (overloaded) response, or null
+export const retryAfterSeconds = (error) => {
+  if (!error.response || ![429, 503].includes(error.response.status)) return null;
+  const seconds = parseInt(error.response.headers['retry-after'], 10);
+  return Number.isNaN(seconds) ? null : seconds;
+};
 
 // Items services
 export const itemsService = {
@@ -178,4 +185,100 @@ export const detectionService = {
   }
 };
 
+// Chunked, resumable video uploads; the server can start detecting before the last chunk arrives
+export const uploadService = {
+  // Upload a video chunk by chunk. An interrupted upload of the same file (also after a page reload)
+  // resumes from the offset the server recorded. onUpload(upload) is called once the upload is known,
+  // so a resumed upload's Socket.IO room (its original session_id) can be joined.
+  uploadVideo: async (file, { sessionId, priority = 0, onUpload, onProgress } = {}) => {
+    const resumeKey = `upload:${file.name}:${file.size}:${file.lastModified}`;
+    let upload = null;
+    const savedId = localStorage.getItem(resumeKey);
+    if (savedId) {
+      try {
+        const response = await api.get(`/uploads/${savedId}`);
+        if (response.data.state === 'uploading') {
+          upload = response.data;
+        }
+      } catch (error) {
+        // Unknown or expired upload: start a new one
+      }
+    }
+    if (!upload) {
+      const response = await api.post('/uploads/', { filename: file.name, size: file.size, session_id: sessionId, priority });
+      upload = response.data;
+      localStorage.setItem(resumeKey, upload.upload_id);
+    }
+    if (onUpload) onUpload(upload);
+
+    let offset = upload.offset;
+    let job = upload.job_id ? { job_id: upload.job_id } : null;
+    let retries = 0;
+    while (offset < file.size) {
+      try {
+        const response = await api.patch(`/uploads/${upload.upload_id}`, file.slice(offset, offset + upload.chunk_size), {
+          headers: { 'Content-Type': 'application/offset+octet-stream', 'Upload-Offset': String(offset) },
+        });
+        offset = response.data.offset;
+        job = response.data.job || job;
+        retries = 0;
+      } catch (error) {
+        const retryAfter = retryAfterSeconds(error);
+        if (error.response && error.response.status < 500 && error.response.status !== 409 && retryAfter === null) throw error;
+        if (++retries > 5) throw error;
+        // Back off (as long as the server asks, if it does), then continue from wherever the server says the upload is
+        await new Promise((resolve) => setTimeout(resolve, 1000 * (retryAfter || retries)));
+        const response = await api.get(`/uploads/${upload.upload_id}`);
+        offset = response.data.offset;
+      }
+      if (onProgress) onProgress(offset / file.size);
+    }
+    localStorage.removeItem(resumeKey);
+    return { ...upload, offset, state: 'complete', job };
+  },
+
+  // Abort an upload (and a job that already started on it)
+  abortUpload: async (uploadId) => {
+    try {
+      const response = await api.delete(`/uploads/${uploadId}`);
+      return response.data;
+    } catch (error) {
+      throw error;
+    }
+  }
+};
+
+// Live stream services
+export const streamService = {
+  // Start detection on a live source (RTSP/HTTP URL or device index) or an uploaded video played as a camera
+  startStream: async ({ sessionId, source, file, loop = false }) => {
+    try {
+      const response = await api.post('/streams/', { session_id: sessionId, source, file, loop });
+      return response.data;
+    } catch (error) {
+      throw error;
+    }
+  },
+
+  // Get a stream's status
+  getStream: async (streamId) => {
+    try {
+      const response = await api.get(`/streams/${streamId}`);
+      return response.data;
+    } catch (error) {
+      throw error;
+    }
+  },
+
+  // Stop a stream
+  stopStream: async (streamId) => {
+    try {
+      const response = await api.post(`/streams/${streamId}/stop`);
+      return response.data;
+    } catch (error) {
+      throw error;
+    }
+  }
+};
+
 export default api;
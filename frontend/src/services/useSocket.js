@@ -11,9 +11,12 @@ export function useSocket() {
   // Expose latest event payloads for consumers (VideoDetection)
   const [wsStarted, setWsStarted] = useState(null);
   const [wsFrame, setWsFrame] = useState(null);
+  const [wsPreview, setWsPreview] = useState(null);
   const [wsProgress, setWsProgress] = useState(null);
   const [wsComplete, setWsComplete] = useState(null);
   const [wsError, setWsError] = useState(null);
+  const [wsAlert, setWsAlert] = useState(null);
+  const [wsAlertClosed, setWsAlertClosed] = useState(null);
 
   useEffect(() => {
     const socket = io(SOCKET_URL, { transports: ["websocket"] });
@@ -58,6 +61,12 @@ export function useSocket() {
       }
     });
 
+    // Binary live preview (rate-limited server-side); ack so the server sends the next one
+    socket.on("frame_preview", (payload, ack) => {
+      setWsPreview(payload);
+      if (typeof ack === "function") ack();
+    });
+
     // Processing complete
     socket.on("video_processing_complete", (payload) => {
       setWsComplete(payload);
@@ -70,6 +79,16 @@ export function useSocket() {
       setMessages((m) => [...m, `video_processing_progress: ${JSON.stringify(payload)}`]);
     });
 
+    // One event per confirmed weapon track (with a JPEG crop), and one when that track is gone
+    socket.on("weapon_alert", (payload) => {
+      setWsAlert(payload);
+      setMessages((m) => [...m, `weapon_alert: ${payload.class} track ${payload.track_id} (${payload.confidence})`]);
+    });
+    socket.on("weapon_alert_closed", (payload) => {
+      setWsAlertClosed(payload);
+      setMessages((m) => [...m, `weapon_alert_closed: track ${payload.track_id}`]);
+    });
+
     // Processing error
     socket.on("video_processing_error", (payload) => {
       setWsError(payload);
@@ -87,6 +106,9 @@ export function useSocket() {
   const sendToRoom = useCallback((room, text) => {
     socketRef.current?.emit("room_msg", { room, text });
   }, []);
+  const setPreviewSettings = useCallback((room, settings) => {
+    socketRef.current?.emit("preview_settings", { room, ...settings });
+  }, []);
 
   return {
     connected,
@@ -95,10 +117,14 @@ export function useSocket() {
     broadcast,
     join,
     sendToRoom,
+    setPreviewSettings,
     wsStarted,
     wsFrame,
+    wsPreview,
     wsProgress,
     wsComplete,
     wsError,
+    wsAlert,
+    wsAlertClosed,
   };
 }